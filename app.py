@@ -8,9 +8,15 @@ from flask_mail import Mail
 from flask_socketio import SocketIO
 from config import config
 from models.user import User
-from models import get_users_collection
+from models.connection import mongo_registry
+from models.count_cache import count_cache
+from services.activity_writer import activity_writer
+from services.user_session_cache import user_session_cache
+from services.coupon_catalog import coupon_catalog
+from services.plan_catalog import plan_catalog
+from services.form_link_cache import form_link_cache
+from utils import passwords, serialization
 from datetime import datetime
-from bson import ObjectId
 
 # Import services
 from services.auth_service import AuthService
@@ -23,12 +29,39 @@ def create_app(config_name='default'):
     app = Flask(__name__)
     app.config.from_object(config[config_name])
     
+    # orjson-backed JSON provider: jsonify() encodes ObjectId, datetime and models
+    serialization.init_app(app)
+    
+    # Shared MongoDB client registry (one pooled client per worker process)
+    mongo_registry.init_app(app)
+    
+    # Cached listing totals, invalidated by this process's writes
+    count_cache.init_app(app)
+    
     # Initialize Flask-Mail
     mail.init_app(app)
     
     # Initialize SocketIO
     socketio.init_app(app, cors_allowed_origins="*", async_mode='eventlet')
     
+    # bcrypt runs in a native thread pool so hashing never blocks the eventlet hub
+    passwords.init_app(app)
+    
+    # Cached user loader (Flask-Login / SocketIO current_user)
+    user_session_cache.init_app(app)
+    
+    # Coupon lookups for discount quotes
+    coupon_catalog.init_app(app)
+    
+    # Plans held in memory; invalidations reach other workers through Redis pub/sub
+    plan_catalog.init_app(app, socketio)
+    
+    # Public form-link lookups by token (unknown tokens cached too)
+    form_link_cache.init_app(app)
+    
+    # Buffered activity logging (flush loop runs as a SocketIO background task)
+    activity_writer.init_app(app, socketio)
+    
     # Create upload directories
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
     os.makedirs(app.config['PROFILE_UPLOAD_FOLDER'], exist_ok=True)
@@ -42,8 +75,7 @@ def create_app(config_name='default'):
     
     @login_manager.user_loader
     def load_user(user_id):
-        users = get_users_collection()
-        user_data = users.find_one({'_id': ObjectId(user_id)})
+        user_data = user_session_cache.get(user_id)
         return User(user_data) if user_data else None
     
     # Import controllers here to avoid circular imports
@@ -121,6 +153,27 @@ def create_app(config_name='default'):
         from services.live_progress_service import register_socketio_events
         register_socketio_events(socketio)
         
+        # Ensure collection indexes exist (idempotent)
+        if app.config.get('MONGO_ENSURE_INDEXES', True):
+            from models import get_db
+            from models.indexes import ensure_indexes
+            try:
+                for r in ensure_indexes(get_db()):
+                    if not r['ok']:
+                        print(f"❌ Index {r['collection']}.{r['name']} not created: {r['error']}")
+                    elif r.get('note'):
+                        print(f"ℹ️  Index {r['collection']}.{r['name']}: {r['note']}")
+            except Exception as e:
+                print(f"❌ Index bootstrap failed: {e}")
+        
+        # Roll raw activities up into daily summaries before the TTL expires them
+        from services.activity_service import start_rollup_task
+        start_rollup_task(app, socketio)
+        
+        # Close expired agent plans and send expiry reminders off the request path
+        from services.plan_expiry_service import start_plan_expiry_task
+        start_plan_expiry_task(app, socketio)
+        
         # Create initial super admin account
         auth_service = AuthService()
         auth_service.create_initial_super_admin()
@@ -0,0 +1,151 @@
+# benchmarks/json_responses.py
+# Response build time for 1,000-row list API pages: hand-built dicts + Flask's stdlib jsonify
+# vs. model JSON views encoded by the app's serialization provider
+#
+# Usage:
+#   python benchmarks/json_responses.py [--rows 1000] [--repeat 20]
+#
+# "manual" reproduces the previous controllers: one dict per row with
+# .isoformat() per datetime, encoded by Flask's DefaultJSONProvider. "views"
+# hands the models straight to jsonify() with utils.serialization installed
+# (orjson when importable, stdlib json otherwise). The models are loaded once
+# up front (as a list service returns them), so only the response build is
+# timed; the best of --repeat runs is reported.
+
+import os
+import sys
+import time
+import argparse
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bson
+from bson import ObjectId
+from bson.raw_bson import RawBSONDocument
+from flask import Flask, jsonify
+from flask.json.provider import DefaultJSONProvider
+
+from models.user import User
+from models.plan import Plan
+from models.coupon import Coupon
+from utils import serialization
+
+
+def user_document(i):
+    now = datetime.utcnow()
+    return {
+        '_id': ObjectId(), 'username': f'agent{i}', 'email': f'agent{i}@example.com',
+        'full_name': f'Agent Number {i}', 'role': 'AGENT', 'is_active': True,
+        'approval_status': 'APPROVED', 'partner_id': ObjectId(), 'agent_pdf_generated': i % 50,
+        'agent_pdf_limit': 100, 'created_at': now
+    }
+
+
+def plan_document(i):
+    return {
+        '_id': ObjectId(), 'name': f'Plan {i}', 'description': 'Annual advisory plan',
+        'period_type': 'YEARLY', 'period_value': 1 + i % 3, 'price': 999 + i, 'pdf_limit': 100,
+        'features': ['Health reports', 'Priority support'], 'is_active': True,
+        'created_at': datetime.utcnow()
+    }
+
+
+def coupon_document(i):
+    now = datetime.utcnow()
+    return {
+        '_id': ObjectId(), 'code': f'CODE{i:06d}', 'name': f'Coupon {i}', 'description': None,
+        'discount_type': 'PERCENTAGE', 'discount_value': 10, 'min_purchase_amount': 0,
+        'max_discount_amount': 500, 'usage_limit': 100, 'used_count': i % 100, 'valid_from': now,
+        'valid_until': now + timedelta(days=30), 'is_active': True, 'created_at': now
+    }
+
+
+def manual_user(user):
+    row = {
+        'id': user.id, 'username': user.username, 'email': user.email, 'full_name': user.full_name,
+        'role': user.role, 'is_active': user.is_active, 'approval_status': user.approval_status,
+        'created_at': user.created_at.isoformat() if user.created_at else None
+    }
+    if user.role == 'AGENT':
+        row['partner_id'] = str(user.partner_id) if user.partner_id else None
+        row['pdf_generated'] = user.agent_pdf_generated
+        row['pdf_limit'] = user.agent_pdf_limit
+    return row
+
+
+def manual_plan(plan):
+    return {
+        'id': plan.id, 'name': plan.name, 'description': plan.description,
+        'period_type': plan.period_type, 'period_value': plan.period_value,
+        'period_display': plan.get_period_display(), 'price': plan.price, 'pdf_limit': plan.pdf_limit,
+        'features': plan.features, 'is_active': plan.is_active,
+        'created_at': plan.created_at.isoformat() if plan.created_at else None
+    }
+
+
+def manual_coupon(coupon):
+    return {
+        'id': coupon.id, 'code': coupon.code, 'name': coupon.name, 'description': coupon.description,
+        'discount_type': coupon.discount_type, 'discount_value': coupon.discount_value,
+        'min_purchase_amount': coupon.min_purchase_amount,
+        'max_discount_amount': coupon.max_discount_amount, 'usage_limit': coupon.usage_limit,
+        'used_count': coupon.used_count,
+        'valid_from': coupon.valid_from.isoformat() if coupon.valid_from else None,
+        'valid_until': coupon.valid_until.isoformat() if coupon.valid_until else None,
+        'is_active': coupon.is_active,
+        'created_at': coupon.created_at.isoformat() if coupon.created_at else None
+    }
+
+
+LISTINGS = [
+    ('users', User, user_document, manual_user),
+    ('plans', Plan, plan_document, manual_plan),
+    ('coupons', Coupon, coupon_document, manual_coupon)
+]
+
+
+def best_of(repeat, fn):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='List API response build benchmark')
+    parser.add_argument('--rows', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    manual_app = Flask('manual')
+    manual_app.json = DefaultJSONProvider(manual_app)
+    views_app = Flask('views')
+    serialization.init_app(views_app)
+
+    encoder = 'orjson' if serialization.orjson is not None else 'stdlib json'
+    print(f"{args.rows} rows per page, best of {args.repeat}, views encoder: {encoder}\n")
+
+    for key, model_class, make_document, manual_row in LISTINGS:
+        page = [model_class(RawBSONDocument(bson.encode(make_document(i)))) for i in range(args.rows)]
+        for model in page:
+            model.id  # decode each document into its slots, as the first field read would
+
+        def build_manual():
+            with manual_app.app_context():
+                return jsonify({'success': True, key: [manual_row(m) for m in page]}).get_data()
+
+        def build_views():
+            with views_app.app_context():
+                return jsonify({'success': True, key: page}).get_data()
+
+        manual = best_of(args.repeat, build_manual)
+        views = best_of(args.repeat, build_views)
+        print(f"{key:<8} manual {manual * 1000:7.1f}ms   views {views * 1000:7.1f}ms   ({manual / views:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+# benchmarks/model_memory.py
+# Memory and construction time for 10k User models: dict-backed eager models vs. slotted lazy models
+#
+# Usage:
+#   python benchmarks/model_memory.py [--count 10000]
+#
+# "eager" reproduces the previous model shape (every field copied into a
+# per-instance __dict__ from a decoded dict). "lazy" is the current User: the
+# document stays as RawBSONDocument bytes and fields are decoded on first
+# access into __slots__. Each variant is measured building the models only and
+# building them then reading the five columns a list page shows.
+
+import os
+import sys
+import time
+import argparse
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bson
+from bson import ObjectId
+from bson.raw_bson import RawBSONDocument
+
+from models.user import User, FIELDS
+
+LIST_COLUMNS = ('username', 'email', 'full_name', 'role', 'is_active')
+
+
+class EagerUser:
+    """The pre-slots model: a plain class filled eagerly from a dict"""
+
+    def __init__(self, data):
+        self._id = data.get('_id')
+        for name, default in FIELDS:
+            setattr(self, name, data.get(name, default() if callable(default) else default))
+
+
+def sample_document(i):
+    now = datetime.utcnow()
+    return {
+        '_id': ObjectId(),
+        'username': f'agent{i}',
+        'email': f'agent{i}@example.com',
+        'password': b'$2b$12$' + b'x' * 53,
+        'full_name': f'Agent Number {i}',
+        'phone': f'98{i:08d}',
+        'role': 'AGENT',
+        'is_active': True,
+        'partner_id': ObjectId(),
+        'plan_id': ObjectId(),
+        'plan_start_date': now,
+        'plan_expiry_date': now,
+        'agent_pdf_generated': i % 50,
+        'agent_pdf_limit': 100,
+        'city': 'Pune',
+        'organization': 'Example Advisors',
+        'payment_confirmed': True,
+        'payment_reference': f'REF{i:010d}',
+        'approval_status': 'APPROVED',
+        'partner_approved': True,
+        'super_admin_approved': True,
+        'created_at': now,
+        'updated_at': now
+    }
+
+
+def build_and_read(build, read_columns):
+    models = build()
+    if read_columns:
+        for model in models:
+            for column in LIST_COLUMNS:
+                getattr(model, column)
+    return models
+
+
+def measure(label, build, read_columns):
+    # Timing and allocation tracking are separate runs: tracemalloc slows allocation-heavy code
+    started = time.perf_counter()
+    build_and_read(build, read_columns)
+    elapsed = time.perf_counter() - started
+
+    tracemalloc.start()
+    models = build_and_read(build, read_columns)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del models
+
+    suffix = ' + read 5 cols' if read_columns else ''
+    print(f"{label + suffix:<32} {elapsed * 1000:8.1f}ms  {current / 1024 / 1024:8.2f} MiB retained")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='User model memory/construction benchmark')
+    parser.add_argument('--count', type=int, default=10000)
+    args = parser.parse_args()
+
+    encoded = [bson.encode(sample_document(i)) for i in range(args.count)]
+    print(f"{args.count} users, {sum(map(len, encoded)) / len(encoded):.0f} BSON bytes each\n")
+
+    # Include BSON decoding in each variant: that is what a cursor does per document
+    for read_columns in (False, True):
+        measure('eager (dict)', lambda: [EagerUser(bson.decode(raw)) for raw in encoded], read_columns)
+        measure('lazy (raw+slots)', lambda: [User(RawBSONDocument(raw)) for raw in encoded], read_columns)
+
+
+if __name__ == '__main__':
+    main()
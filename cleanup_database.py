@@ -3,12 +3,12 @@
 
 import os
 import sys
-from pymongo import MongoClient
 
 # Add the current directory to the Python path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from config import config
+from models.connection import mongo_registry
 
 def cleanup_database():
     """Remove all data except super admin"""
@@ -17,9 +17,7 @@ def cleanup_database():
     # Connect to MongoDB
     config_name = os.getenv('FLASK_ENV', 'development')
     app_config = config[config_name]
-    client = MongoClient(app_config.MONGO_URI)
-    db_name = app_config.MONGO_URI.split('/')[-1]
-    db = client[db_name]
+    db = mongo_registry.get_database(app_config.MONGO_URI)
     
     # Clear all users except super admin
     result = db.users.delete_many({'role': {'$ne': 'SUPER_ADMIN'}})
@@ -33,6 +31,11 @@ def cleanup_database():
     result = db.coupons.delete_many({})
     print(f"  Deleted {result.deleted_count} coupons")
     
+    # Clear coupon partner limits and the redemption ledger
+    db.coupon_partner_limits.delete_many({})
+    result = db.coupon_redemptions.delete_many({})
+    print(f"  Deleted {result.deleted_count} coupon redemptions")
+    
     # Clear all activities
     result = db.activities.delete_many({})
     print(f"  Deleted {result.deleted_count} activities")
@@ -41,10 +44,14 @@ def cleanup_database():
     result = db.registration_links.delete_many({})
     print(f"  Deleted {result.deleted_count} registration links")
     
+    # Clear dashboard counters (rebuilt from source data on next read)
+    db.stats.delete_many({})
+    print("  Cleared dashboard counters")
+    
     print("\nDatabase cleanup completed!")
     print("Only super admin account remains: superadmin / superadmin123")
     
-    client.close()
+    mongo_registry.close()
 
 if __name__ == '__main__':
     confirm = input("Are you sure you want to clean the database? This will remove all data except super admin. (yes/no): ")
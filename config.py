@@ -11,6 +11,15 @@ class Config:
     # MongoDB Config
     MONGO_URI = os.environ.get('MONGO_URI') or 'mongodb://localhost:27017/financial_planning'
     
+    # MongoDB connection pool (shared client per worker process)
+    MONGO_MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE') or 100)
+    MONGO_MIN_POOL_SIZE = int(os.environ.get('MONGO_MIN_POOL_SIZE') or 0)
+    MONGO_MAX_IDLE_TIME_MS = int(os.environ.get('MONGO_MAX_IDLE_TIME_MS') or 300000)
+    MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.environ.get('MONGO_WAIT_QUEUE_TIMEOUT_MS') or 10000)
+    MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS') or 30000)
+    # Create registered indexes at startup (also available via: python manage.py ensure-indexes)
+    MONGO_ENSURE_INDEXES = os.environ.get('MONGO_ENSURE_INDEXES', 'True').lower() == 'true'
+    
     # Redis Config
     REDIS_URL = os.environ.get('REDIS_URL') or 'redis://localhost:6379/0'
     
@@ -31,6 +40,69 @@ class Config:
     
     # App Config
     ITEMS_PER_PAGE = 10
+    # Page-number URLs skip at most this many documents; deeper pages need a cursor
+    PAGINATION_MAX_SKIP = int(os.environ.get('PAGINATION_MAX_SKIP') or 5000)
+    # Listing totals are cached this long (seconds) unless an exact count is requested
+    COUNT_CACHE_TTL = int(os.environ.get('COUNT_CACHE_TTL') or 30)
+    COUNT_CACHE_MAX_ENTRIES = int(os.environ.get('COUNT_CACHE_MAX_ENTRIES') or 2048)
+    
+    # Activity log writer (batched inserts from a background greenlet)
+    ACTIVITY_WRITER_ENABLED = os.environ.get('ACTIVITY_WRITER_ENABLED', 'True').lower() == 'true'
+    ACTIVITY_BATCH_SIZE = int(os.environ.get('ACTIVITY_BATCH_SIZE') or 100)
+    ACTIVITY_FLUSH_INTERVAL = float(os.environ.get('ACTIVITY_FLUSH_INTERVAL') or 1.0)
+    ACTIVITY_QUEUE_MAX = int(os.environ.get('ACTIVITY_QUEUE_MAX') or 10000)
+    ACTIVITY_OVERFLOW_POLICY = os.environ.get('ACTIVITY_OVERFLOW_POLICY') or 'drop_oldest'  # drop_oldest, drop_newest, sync
+    ACTIVITY_WRITE_CONCERN = os.environ.get('ACTIVITY_WRITE_CONCERN') or '1'  # 0, 1, majority, ...
+    ACTIVITY_WRITE_CONCERN_J = os.environ.get('ACTIVITY_WRITE_CONCERN_J', 'False').lower() == 'true'
+    
+    # Raw activities expire after this many days (TTL index; 0 keeps them forever).
+    # Daily per-user/type rollups in activity_rollups are kept indefinitely.
+    ACTIVITY_RETENTION_DAYS = int(os.environ.get('ACTIVITY_RETENTION_DAYS') or 90)
+    ACTIVITY_ROLLUP_INTERVAL = int(os.environ.get('ACTIVITY_ROLLUP_INTERVAL') or 3600)  # seconds, 0 disables
+    ACTIVITY_ROLLUP_LOOKBACK_DAYS = int(os.environ.get('ACTIVITY_ROLLUP_LOOKBACK_DAYS') or 2)
+    
+    # Plan expiry sweep: marks expired agent plans EXPIRED and emails agents before/at expiry
+    PLAN_EXPIRY_SWEEP_INTERVAL = int(os.environ.get('PLAN_EXPIRY_SWEEP_INTERVAL') or 3600)  # seconds, 0 disables
+    PLAN_EXPIRY_WARNING_DAYS = int(os.environ.get('PLAN_EXPIRY_WARNING_DAYS') or 7)
+    PLAN_EXPIRY_BATCH_SIZE = int(os.environ.get('PLAN_EXPIRY_BATCH_SIZE') or 500)
+    PLAN_EXPIRY_EMAILS = os.environ.get('PLAN_EXPIRY_EMAILS', 'True').lower() == 'true'
+    
+    # Logged-in user cache (per process, optionally shared through Redis)
+    USER_CACHE_ENABLED = os.environ.get('USER_CACHE_ENABLED', 'True').lower() == 'true'
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL') or 60)
+    USER_CACHE_MAX_ENTRIES = int(os.environ.get('USER_CACHE_MAX_ENTRIES') or 5000)
+    USER_CACHE_REDIS = os.environ.get('USER_CACHE_REDIS', 'False').lower() == 'true'
+    USER_CACHE_REDIS_TTL = int(os.environ.get('USER_CACHE_REDIS_TTL') or 300)
+    
+    # Coupon catalog for read-only price quotes (per process, cleared on coupon writes)
+    COUPON_CATALOG_ENABLED = os.environ.get('COUPON_CATALOG_ENABLED', 'True').lower() == 'true'
+    COUPON_CATALOG_TTL = int(os.environ.get('COUPON_CATALOG_TTL') or 30)
+    COUPON_CATALOG_MAX_ENTRIES = int(os.environ.get('COUPON_CATALOG_MAX_ENTRIES') or 1024)
+    # Upper bound on coupons generated by one campaign request
+    COUPON_CAMPAIGN_MAX_CODES = int(os.environ.get('COUPON_CAMPAIGN_MAX_CODES') or 50000)
+    
+    # Public form-link token cache (per process, optionally shared through Redis); unknown tokens are cached too
+    FORM_LINK_CACHE_ENABLED = os.environ.get('FORM_LINK_CACHE_ENABLED', 'True').lower() == 'true'
+    FORM_LINK_CACHE_TTL = int(os.environ.get('FORM_LINK_CACHE_TTL') or 15)
+    FORM_LINK_CACHE_NEGATIVE_TTL = int(os.environ.get('FORM_LINK_CACHE_NEGATIVE_TTL') or 300)
+    FORM_LINK_CACHE_MAX_ENTRIES = int(os.environ.get('FORM_LINK_CACHE_MAX_ENTRIES') or 10000)
+    FORM_LINK_CACHE_REDIS = os.environ.get('FORM_LINK_CACHE_REDIS', 'False').lower() == 'true'
+    FORM_LINK_CACHE_REDIS_TTL = int(os.environ.get('FORM_LINK_CACHE_REDIS_TTL') or 300)
+    
+    # Plan catalog (per process, loaded once; other workers are told about plan writes through Redis pub/sub).
+    # Without PLAN_CATALOG_REDIS a plan change reaches only the worker that made it; the others
+    # keep serving their copy for up to PLAN_CATALOG_TTL seconds (5 minutes by default).
+    PLAN_CATALOG_ENABLED = os.environ.get('PLAN_CATALOG_ENABLED', 'True').lower() == 'true'
+    PLAN_CATALOG_REDIS = os.environ.get('PLAN_CATALOG_REDIS', 'False').lower() == 'true'
+    PLAN_CATALOG_TTL = int(os.environ.get('PLAN_CATALOG_TTL') or 300)  # reload backstop for missed messages
+    PLAN_CATALOG_POLL_INTERVAL = float(os.environ.get('PLAN_CATALOG_POLL_INTERVAL') or 1)  # seconds
+    
+    # bcrypt offload to eventlet's native thread pool (threads default to the CPU count)
+    PASSWORD_HASH_OFFLOAD = os.environ.get('PASSWORD_HASH_OFFLOAD', 'True').lower() == 'true'
+    PASSWORD_HASH_THREADS = int(os.environ.get('PASSWORD_HASH_THREADS') or 0) or None
+    # bcrypt cost for new hashes; older hashes are upgraded on login. Pick it with
+    # 'python manage.py calibrate-bcrypt'.
+    BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS') or 12)
     # Email Config
     # Email Config
     MAIL_SERVER = os.environ.get('MAIL_SERVER') or 'smtp.gmail.com'
@@ -1,12 +1,15 @@
 # controllers/coupon_controller.py
 # Enhanced coupon controller with partner restrictions
 
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, Response, stream_with_context, current_app
 from flask_login import login_required, current_user
-from services.coupon_service import CouponService
+from services.coupon_service import (CouponService, PARTNER_LIMIT_FIELD_PREFIX, CAMPAIGN_MIN_CODE_LENGTH,
+                                     CAMPAIGN_MAX_CODE_LENGTH, CAMPAIGN_MAX_PREFIX_LENGTH)
 from services.plan_service import PlanService
-from utils.decorators import owner_required
+from utils.decorators import owner_required, api_super_admin_required
 from datetime import datetime
+from bson import ObjectId
+from bson.errors import InvalidId
 from models.user import User
 
 coupons_bp = Blueprint('coupons', __name__)
@@ -89,16 +92,10 @@ def edit(coupon_id):
             if max_discount:
                 update_data['max_discount_amount'] = float(max_discount)
         
-        # Add partner limits to update_data
-        from models import get_users_collection
-        users = get_users_collection()
-        partners = users.find({'role': 'PARTNER'})
-        
-        for partner in partners:
-            partner_id = str(partner['_id'])
-            limit_value = request.form.get(f'partner_limit_{partner_id}')
-            if limit_value:
-                update_data[f'partner_limit_{partner_id}'] = limit_value
+        # Add partner limits to update_data (an emptied field removes that partner's limit)
+        for key, limit_value in request.form.items():
+            if key.startswith(PARTNER_LIMIT_FIELD_PREFIX):
+                update_data[key] = limit_value.strip()
         
         success, message = coupon_service.update_coupon(coupon_id, update_data, current_user.id)
         
@@ -117,6 +114,7 @@ def edit(coupon_id):
     users = get_users_collection()
     partners_data = users.find({'role': 'PARTNER', 'is_active': True})
     partners = [User(p) for p in partners_data]
+    coupon.partner_limits = coupon_service.get_partner_limits(coupon_id)
     
     return render_template('coupons/edit.html', 
                          coupon=coupon, 
@@ -146,33 +144,15 @@ def api_list():
     
     page = request.args.get('page', 1, type=int)
     coupon_service = CouponService()
-    result = coupon_service.get_all_coupons(page=page)
-    
-    coupons_data = []
-    for coupon in result['coupons']:
-        coupons_data.append({
-            'id': coupon.id,
-            'code': coupon.code,
-            'name': coupon.name,
-            'description': coupon.description,
-            'discount_type': coupon.discount_type,
-            'discount_value': coupon.discount_value,
-            'min_purchase_amount': coupon.min_purchase_amount,
-            'max_discount_amount': coupon.max_discount_amount,
-            'usage_limit': coupon.usage_limit,
-            'used_count': coupon.used_count,
-            'valid_from': coupon.valid_from.isoformat() if coupon.valid_from else None,
-            'valid_until': coupon.valid_until.isoformat() if coupon.valid_until else None,
-            'is_active': coupon.is_active,
-            'created_at': coupon.created_at.isoformat() if coupon.created_at else None
-        })
+    result = coupon_service.get_all_coupons(page=page, cursor=request.args.get('cursor'))
     
     return jsonify({
         'success': True,
-        'coupons': coupons_data,
+        'coupons': result['coupons'],
         'total': result['total'],
         'page': result['page'],
-        'total_pages': result['total_pages']
+        'total_pages': result['total_pages'],
+        'next_cursor': result['next_cursor']
     })
 
 @coupons_bp.route('/api/validate', methods=['POST'])
@@ -186,12 +166,98 @@ def api_validate():
     if not code:
         return jsonify({'success': False, 'error': 'Coupon code is required'}), 400
     
+    # Quote against the partner whose coupons the purchase would draw on
+    partner_id = None
+    if current_user.is_partner():
+        partner_id = current_user.id
+    elif current_user.is_agent() and current_user.partner_id:
+        partner_id = str(current_user.partner_id)
+    
+    # Preview only: the coupon is redeemed when the plan is assigned
     coupon_service = CouponService()
-    success, message, discount = coupon_service.validate_and_apply_coupon(code, amount, plan_id)
+    success, message, discount = coupon_service.quote(code, amount, plan_id, partner_id)
     
     return jsonify({
         'success': success,
         'message': message,
         'discount': discount,
         'final_amount': amount - discount if success else amount
-    })
\ No newline at end of file
+    })
+
+@coupons_bp.route('/api/campaigns', methods=['POST'])
+@login_required
+@api_super_admin_required
+def api_generate_campaign():
+    """Generate a batch of coupons sharing one template"""
+    data = request.get_json() or {}
+    
+    coupon_service = CouponService()
+    try:
+        count = int(data.get('count', 0))
+        code_length = max(int(data.get('code_length', 8)), CAMPAIGN_MIN_CODE_LENGTH)
+        template = {
+            'name': data.get('name'),
+            'description': data.get('description'),
+            'discount_type': data.get('discount_type', 'PERCENTAGE'),
+            'discount_value': float(data.get('discount_value', 0)),
+            'min_purchase_amount': float(data.get('min_purchase_amount', 0)),
+            'usage_limit': int(data['usage_limit']) if data.get('usage_limit') else 1,
+            'valid_from': datetime.fromisoformat(data['valid_from']) if data.get('valid_from') else None,
+            'valid_until': datetime.fromisoformat(data['valid_until']) if data.get('valid_until') else None,
+            'applicable_plans': [ObjectId(pid) for pid in data.get('applicable_plans') or []],
+            'is_active': True
+        }
+        if template['discount_type'] == 'PERCENTAGE' and data.get('max_discount_amount'):
+            template['max_discount_amount'] = float(data['max_discount_amount'])
+    except (TypeError, ValueError, InvalidId):
+        return jsonify({'success': False, 'error': 'Invalid number, date or plan id in campaign'}), 400
+    
+    prefix = data.get('prefix') or ''
+    max_codes = current_app.config.get('COUPON_CAMPAIGN_MAX_CODES', 50000)
+    if not 1 <= count <= max_codes:
+        return jsonify({'success': False, 'error': f'count must be between 1 and {max_codes}'}), 400
+    if code_length > CAMPAIGN_MAX_CODE_LENGTH:
+        return jsonify({'success': False, 'error': f'code_length must be at most {CAMPAIGN_MAX_CODE_LENGTH}'}), 400
+    if not isinstance(prefix, str) or len(prefix) > CAMPAIGN_MAX_PREFIX_LENGTH:
+        return jsonify({'success': False,
+                        'error': f'prefix must be at most {CAMPAIGN_MAX_PREFIX_LENGTH} characters'}), 400
+    if not data.get('name'):
+        return jsonify({'success': False, 'error': 'Campaign name is required'}), 400
+    
+    if not isinstance(data.get('partner_limits') or {}, dict):
+        return jsonify({'success': False, 'error': 'partner_limits must map partner ids to limits'}), 400
+    partner_limits, error = coupon_service.parse_partner_limits(data.get('partner_limits') or {})
+    if error:
+        return jsonify({'success': False, 'error': error}), 400
+    template['partner_limits'] = partner_limits
+    
+    result, error = coupon_service.generate_campaign(
+        template, count, current_user.id,
+        prefix=prefix,
+        code_length=code_length
+    )
+    
+    if not result or not result['inserted']:
+        return jsonify({'success': False, 'error': error}), 400
+    
+    return jsonify({
+        'success': error is None,
+        'error': error,
+        'campaign_id': result['campaign_id'],
+        'inserted': result['inserted'],
+        'collisions': result['collisions'],
+        'shortfall': result['shortfall'],
+        'csv_url': url_for('coupons.campaign_csv', campaign_id=result['campaign_id'])
+    })
+
+@coupons_bp.route('/campaigns/<campaign_id>/codes.csv')
+@login_required
+@owner_required
+def campaign_csv(campaign_id):
+    """Stream a campaign's coupon codes as CSV"""
+    coupon_service = CouponService()
+    return Response(
+        stream_with_context(coupon_service.iter_campaign_csv(campaign_id)),
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment; filename=coupons-{campaign_id}.csv'}
+    )
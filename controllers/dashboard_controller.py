@@ -1,13 +1,22 @@
 # controllers/dashboard_controller.py
 # Enhanced dashboard with role-specific views
 
-from flask import Blueprint, jsonify, render_template
+from flask import Blueprint, jsonify, render_template, request
 from flask_login import login_required, current_user
-from models import get_users_collection, get_plans_collection, get_coupons_collection, get_activities_collection
 from services.user_service import UserService
 from services.plan_service import PlanService
 from services.coupon_service import CouponService
-from utils.decorators import admin_required
+from services.stats_service import StatsService
+from services.activity_service import ActivityService
+from utils.decorators import admin_required, api_super_admin_required
+from models.connection import mongo_registry
+from models.count_cache import count_cache
+from services.activity_writer import activity_writer
+from services.user_session_cache import user_session_cache
+from services.coupon_catalog import coupon_catalog
+from services.plan_catalog import plan_catalog
+from services.form_link_cache import form_link_cache
+from services.plan_expiry_service import sweep_status
 from datetime import datetime
 
 dashboard_bp = Blueprint('dashboard_api', __name__)
@@ -27,39 +36,11 @@ def get_dashboard_stats():
 
 def get_super_admin_stats():
     """Get super admin dashboard statistics"""
-    users = get_users_collection()
-    plans = get_plans_collection()
-    coupons = get_coupons_collection()
-    
-    total_partners = users.count_documents({'role': 'PARTNER'})
-    active_partners = users.count_documents({'role': 'PARTNER', 'is_active': True, 'approval_status': 'APPROVED'})
-    total_agents = users.count_documents({'role': 'AGENT'})
-    active_agents = users.count_documents({'role': 'AGENT', 'is_active': True, 'approval_status': 'APPROVED'})
-    pending_approvals = users.count_documents({'approval_status': {'$in': ['PENDING', 'PARTNER_APPROVED']}})
-    active_plans = plans.count_documents({'is_active': True})
-    active_coupons = coupons.count_documents({'is_active': True})
-    
-    # Calculate total PDF usage across all partners
-    partners = users.find({'role': 'PARTNER'})
-    total_pdf_limit = sum(p.get('pdf_limit', 0) for p in partners)
-    
-    # Calculate total PDFs generated
-    agents = users.find({'role': 'AGENT'})
-    total_pdfs_generated = sum(a.get('agent_pdf_generated', 0) for a in agents)
+    stats_service = StatsService()
     
     return jsonify({
         'success': True,
-        'stats': {
-            'total_partners': total_partners,
-            'active_partners': active_partners,
-            'total_agents': total_agents,
-            'active_agents': active_agents,
-            'pending_approvals': pending_approvals,
-            'active_plans': active_plans,
-            'active_coupons': active_coupons,
-            'total_pdf_limit': total_pdf_limit,
-            'total_pdfs_generated': total_pdfs_generated
-        }
+        'stats': stats_service.get_platform_statistics()
     })
 
 def get_partner_stats():
@@ -103,41 +84,51 @@ def get_agent_stats():
 @login_required
 def get_recent_activities():
     """Get recent activities based on user role"""
-    activities = get_activities_collection()
-    users = get_users_collection()
-    
-    # Build query based on role
-    query = {}
-    if current_user.is_partner():
-        # Get activities for partner and their agents
-        agent_ids = [a['_id'] for a in users.find({'partner_id': current_user._id, 'role': 'AGENT'})]
-        query = {'$or': [
-            {'user_id': current_user._id},
-            {'user_id': {'$in': agent_ids}},
-            {'metadata.partner_id': str(current_user._id)}
-        ]}
-    elif current_user.is_agent():
-        # Get only agent's own activities
-        query = {'user_id': current_user._id}
+    # Partners see their own and their agents' activities, agents their own,
+    # super admin everything
+    recent = ActivityService().get_recent_activities(current_user, limit=10)
     
-    # Super admin sees all activities (no filter)
-    
-    # Get recent activities
-    recent = list(activities.find(query).sort('created_at', -1).limit(10))
-    
-    # Format activities with user info
-    formatted_activities = []
-    for activity in recent:
-        user_data = users.find_one({'_id': activity.get('user_id')})
-        formatted_activities.append({
-            'id': str(activity['_id']),
-            'user': user_data['username'] if user_data else 'Unknown',
-            'type': activity.get('activity_type'),
-            'description': activity.get('description'),
-            'created_at': activity.get('created_at').isoformat() if activity.get('created_at') else None
-        })
+    # ObjectId and datetime values are encoded by the app's JSON provider
+    formatted_activities = [{
+        'id': activity['_id'],
+        'user': activity.get('username') or 'Unknown',
+        'type': activity.get('activity_type'),
+        'description': activity.get('description'),
+        'created_at': activity.get('created_at')
+    } for activity in recent]
     
     return jsonify({
         'success': True,
         'activities': formatted_activities
-    })
\ No newline at end of file
+    })
+
+@dashboard_bp.route('/api/activity-summary')
+@login_required
+def get_activity_summary():
+    """Get per-day activity counts by type (from daily rollups)"""
+    days = min(max(request.args.get('days', 30, type=int), 1), 365)
+    summary = ActivityService().get_activity_summary(current_user, days=days)
+    
+    return jsonify({
+        'success': True,
+        'summary': summary
+    })
+
+@dashboard_bp.route('/api/system/metrics')
+@login_required
+@api_super_admin_required
+def get_system_metrics():
+    """Get runtime metrics for monitoring (super admin only)"""
+    return jsonify({
+        'success': True,
+        'metrics': {
+            'mongo_pool': mongo_registry.stats(),
+            'count_cache': count_cache.stats(),
+            'activity_writer': activity_writer.stats(),
+            'user_session_cache': user_session_cache.stats(),
+            'coupon_catalog': coupon_catalog.stats(),
+            'plan_catalog': plan_catalog.stats(),
+            'form_link_cache': form_link_cache.stats(),
+            'plan_expiry_sweep': sweep_status
+        }
+    })
@@ -1,6 +1,5 @@
 # models/forms/__init__.py
-from pymongo import MongoClient
-from flask import current_app, g
+from models import get_db
 
 def get_health_insurance_forms_collection():
     return get_db()['health_insurance_forms']
@@ -25,11 +24,3 @@ def get_form_links_collection():
 
 def get_insurance_recommendations_collection():
     return get_db()['insurance_recommendations']
-
-def get_db():
-    """Get MongoDB database instance"""
-    if 'db' not in g:
-        client = MongoClient(current_app.config['MONGO_URI'])
-        db_name = current_app.config['MONGO_URI'].split('/')[-1]
-        g.db = client[db_name]
-    return g.db
\ No newline at end of file
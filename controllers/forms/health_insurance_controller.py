@@ -220,19 +220,7 @@ def public_form(token):
                 flash(error, 'danger')
         
         # OPTIMIZATION 7: Start progress tracking early (async-like)
-        agent_id = str(link.agent_id) if hasattr(link, 'agent_id') and link.agent_id else None
-        
-        # Try multiple ways to get agent_id efficiently
-        if not agent_id:
-            try:
-                from models.forms import get_form_links_collection
-                form_links = get_form_links_collection()
-                link_data = form_links.find_one({'token': token}, {'agent_id': 1})  # Only get agent_id field
-                if link_data and link_data.get('agent_id'):
-                    agent_id = str(link_data['agent_id'])
-                    logger.info(f"🎯 Found agent_id from DB lookup: {agent_id}")
-            except Exception as e:
-                logger.error(f"❌ Error getting agent_id from DB: {e}")
+        agent_id = str(link.agent_id) if link.agent_id else None
         
         # Start progress tracking
         if agent_id:
@@ -5,6 +5,7 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash,
 from flask_login import login_required, current_user
 from services.plan_service import PlanService
 from utils.decorators import owner_required
+from utils.serialization import serialize
 
 plans_bp = Blueprint('plans', __name__)
 
@@ -99,30 +100,15 @@ def api_list():
     
     page = request.args.get('page', 1, type=int)
     plan_service = PlanService()
-    result = plan_service.get_all_plans(page=page)
-    
-    plans_data = []
-    for plan in result['plans']:
-        plans_data.append({
-            'id': plan.id,
-            'name': plan.name,
-            'description': plan.description,
-            'period_type': plan.period_type,
-            'period_value': plan.period_value,
-            'period_display': plan.get_period_display(),
-            'price': plan.price,
-            'pdf_limit': plan.pdf_limit,
-            'features': plan.features,
-            'is_active': plan.is_active,
-            'created_at': plan.created_at.isoformat() if plan.created_at else None
-        })
+    result = plan_service.get_all_plans(page=page, cursor=request.args.get('cursor'))
     
     return jsonify({
         'success': True,
-        'plans': plans_data,
+        'plans': result['plans'],
         'total': result['total'],
         'page': result['page'],
-        'total_pages': result['total_pages']
+        'total_pages': result['total_pages'],
+        'next_cursor': result['next_cursor']
     })
 
 @plans_bp.route('/api/active')
@@ -131,19 +117,9 @@ def api_active_plans():
     plan_service = PlanService()
     plans = plan_service.get_active_plans()
     
-    plans_data = []
-    for plan in plans:
-        plans_data.append({
-            'id': plan.id,
-            'name': plan.name,
-            'period_display': plan.get_period_display(),
-            'price': plan.price,
-            'pdf_limit': plan.pdf_limit
-        })
-    
     return jsonify({
         'success': True,
-        'plans': plans_data
+        'plans': serialize(plans, 'option')
     })
 
 @plans_bp.route('/api/create', methods=['POST'])
@@ -7,8 +7,10 @@ from werkzeug.utils import secure_filename
 from services.user_service import UserService
 from services.plan_service import PlanService
 from services.coupon_service import CouponService
+from services.stats_service import StatsService
 from utils.decorators import admin_required, api_admin_required, super_admin_required, partner_required
 from utils.helpers import save_profile_image, delete_profile_image, log_activity
+from utils.serialization import serialize
 import os
 from datetime import datetime
 from services.email_service import EmailService
@@ -390,38 +392,12 @@ def profile():
 def partner_resources():
     """View partner's assigned resources"""
     user_service = UserService()
-    plan_service = PlanService()
-    coupon_service = CouponService()
-    
-    # Get assigned plans
-    assigned_plans = []
-    if current_user.assigned_plans:
-        for plan_id in current_user.assigned_plans:
-            plan = plan_service.get_plan_by_id(str(plan_id))
-            if plan:
-                assigned_plans.append(plan)
-    
-    # Get assigned coupons with usage stats
-    assigned_coupons = []
-    if current_user.assigned_coupons:
-        for coupon_id in current_user.assigned_coupons:
-            coupon = coupon_service.get_coupon_by_id(str(coupon_id))
-            if coupon:
-                # Get partner-specific usage stats
-                if hasattr(coupon, 'partner_limits') and coupon.partner_limits:
-                    partner_limit = coupon.partner_limits.get(current_user.id)
-                    if partner_limit:
-                        coupon.usage_stats = partner_limit
-                assigned_coupons.append(coupon)
-    
-    # Get PDF usage
-    stats = user_service.get_partner_statistics(current_user.id)
-    pdf_used = stats['pdf_generated'] if stats else 0
+    resources = user_service.get_partner_resources(current_user)
     
     return render_template('users/partner_resources.html',
-                         assigned_plans=assigned_plans,
-                         assigned_coupons=assigned_coupons,
-                         pdf_used=pdf_used)
+                         assigned_plans=resources['plans'],
+                         assigned_coupons=resources['coupons'],
+                         pdf_used=resources['pdf_used'])
 
 # controllers/user_controller.py - Replace the assign_plan route (around line 285)
 # Add this to controllers/user_controller.py (at the end of the file)
@@ -442,20 +418,9 @@ def api_payment_details(user_id):
         if str(user.partner_id) != current_user.id:
             return jsonify({'error': 'Unauthorized'}), 403
     
-    payment_data = {
-        'payment_confirmed': user.payment_confirmed,
-        'payment_amount': user.payment_amount,
-        'payment_method': user.payment_method,
-        'payment_reference': user.payment_reference,
-        'payment_date': user.payment_date.isoformat() if user.payment_date else None,
-        'payment_proof': user.payment_proof,
-        'plan_price_paid': user.plan_price_paid,
-        'plan_coupon_used': user.plan_coupon_used
-    }
-    
     return jsonify({
         'success': True,
-        'payment': payment_data
+        'payment': serialize(user, 'payment')
     })
 
 @users_bp.route('/payment-proof/<filename>')
@@ -573,25 +538,15 @@ def partners():
     user_service = UserService()
     result = user_service.get_all_users_with_partners(filters, page, 10)
     
-    # Calculate additional stats
-    users = get_users_collection()
-    total_partners = result['total']
-    active_count = users.count_documents({'role': 'PARTNER', 'is_active': True, 'approval_status': 'APPROVED'})
-    
-    # Calculate total PDF limits and usage
-    all_partners = users.find({'role': 'PARTNER'})
-    total_pdf_limit = sum(p.get('pdf_limit', 0) for p in all_partners)
-    
-    # Calculate total PDFs used by all agents
-    all_agents = users.find({'role': 'AGENT'})
-    total_pdf_used = sum(a.get('agent_pdf_generated', 0) for a in all_agents)
+    # Platform-wide partner and PDF totals (single aggregation)
+    platform_stats = StatsService().get_platform_statistics()
     
     return render_template('users/partners.html',
                          partners=result['users'],
-                         total=total_partners,
-                         active_count=active_count,
-                         total_pdf_limit=total_pdf_limit,
-                         total_pdf_used=total_pdf_used,
+                         total=result['total'],
+                         active_count=platform_stats['active_partners'],
+                         total_pdf_limit=platform_stats['total_pdf_limit'],
+                         total_pdf_used=platform_stats['total_pdfs_generated'],
                          page=result['page'],
                          per_page=result['per_page'],
                          total_pages=result['total_pages'])
@@ -630,7 +585,7 @@ def agents():
     selected_partner = None
     if current_user.is_super_admin():
         users = get_users_collection()
-        partners_data = users.find({'role': 'PARTNER', 'is_active': True})
+        partners_data = users.find({'role': 'PARTNER', 'is_active': True}, User.projection('ref'))
         partners_list = [User(p) for p in partners_data]
         
         # Get selected partner info
@@ -704,26 +659,9 @@ def toggle_status(user_id):
         return redirect(request.referrer or url_for('users.list'))
     
     # Toggle status
-    new_status = not user.is_active
-    users = get_users_collection()
-    users.update_one(
-        {'_id': ObjectId(user_id)},
-        {'$set': {
-            'is_active': new_status,
-            'updated_at': datetime.utcnow()
-        }}
-    )
-    
-    # Log activity
-    status_text = "activated" if new_status else "deactivated"
-    log_activity(
-        current_user.id,
-        'USER_STATUS_CHANGE',
-        f"User {user.username} {status_text}",
-        {'user_id': user_id, 'new_status': new_status}
-    )
+    success, message = user_service.toggle_user_status(user_id, current_user.id)
     
-    flash(f'User {status_text} successfully.', 'success')
+    flash(message, 'success' if success else 'danger')
     return redirect(request.referrer or url_for('users.list'))
 
 # API endpoints with proper permission checks
@@ -750,6 +688,7 @@ def api_users_list():
         return jsonify({'error': 'Unauthorized'}), 403
     
     page = request.args.get('page', 1, type=int)
+    cursor = request.args.get('cursor')
     role_filter = request.args.get('role')
     
     filters = {}
@@ -759,42 +698,17 @@ def api_users_list():
     user_service = UserService()
     
     if current_user.is_super_admin():
-        result = user_service.get_all_users_with_partners(filters, page, 10)
+        result = user_service.get_all_users_with_partners(filters, page, 10, cursor)
     elif current_user.is_partner():
-        result = user_service.get_partner_agents(current_user.id, filters, page, 10)
+        result = user_service.get_partner_agents(current_user.id, filters, page, 10, cursor)
     else:
-        result = {'users': [], 'total': 0, 'page': 1, 'per_page': 10, 'total_pages': 0}
-    
-    # Convert users to dict format
-    users_data = []
-    for user in result['users']:
-        user_dict = {
-            'id': user.id,
-            'username': user.username,
-            'email': user.email,
-            'full_name': user.full_name,
-            'role': user.role,
-            'is_active': user.is_active,
-            'approval_status': user.approval_status,
-            'created_at': user.created_at.isoformat() if user.created_at else None
-        }
-        
-        if user.role == 'AGENT':
-            user_dict['partner_id'] = str(user.partner_id) if user.partner_id else None
-            user_dict['pdf_generated'] = user.agent_pdf_generated
-            user_dict['pdf_limit'] = user.agent_pdf_limit
-            if hasattr(user, 'plan') and user.plan:
-                user_dict['plan'] = {
-                    'id': user.plan.id,
-                    'name': user.plan.name
-                }
-        
-        users_data.append(user_dict)
+        result = {'users': [], 'total': 0, 'page': 1, 'per_page': 10, 'total_pages': 0, 'next_cursor': None}
     
     return jsonify({
         'success': True,
-        'users': users_data,
+        'users': result['users'],
         'total': result['total'],
         'page': result['page'],
-        'total_pages': result['total_pages']
+        'total_pages': result['total_pages'],
+        'next_cursor': result['next_cursor']
     })
\ No newline at end of file
@@ -2,14 +2,18 @@
 # database/setup_insurance_recommendations.py
 # Setup script for insurance recommendations collection
 
-from pymongo import MongoClient
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.connection import mongo_registry
 
 def setup_recommendations():
     """Setup insurance recommendations collection with base data"""
     
     # Connect to MongoDB
-    client = MongoClient('mongodb://localhost:27017/advisormitra')
-    db = client.advisormitra
+    db = mongo_registry.get_database(os.environ.get('MONGO_URI') or 'mongodb://localhost:27017/advisormitra')
     
     # Clear existing recommendations
     db.insurance_recommendations.drop()
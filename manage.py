@@ -0,0 +1,249 @@
+# manage.py
+# Maintenance commands that run against the configured database
+#
+# Usage:
+#   python manage.py ensure-indexes
+#   python manage.py verify-indexes
+#   python manage.py reconcile-stats [--dry-run]
+#   python manage.py backfill-activities
+#   python manage.py rollup-activities [--days N | --history]
+#   python manage.py calibrate-bcrypt [--target-ms 250]
+#   python manage.py migrate-coupon-limits
+#   python manage.py sweep-plan-expiry [--no-emails]
+#   python manage.py sync-partner-pdf-counters [--dry-run]
+
+import os
+import sys
+import argparse
+
+# Add the current directory to the Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from flask import Flask
+from config import config
+from models.connection import mongo_registry
+
+
+def create_cli_app():
+    """Lightweight app for maintenance commands (no blueprints or SocketIO)"""
+    config_name = os.getenv('FLASK_ENV', 'development')
+    app = Flask(__name__)
+    app.config.from_object(config[config_name])
+    mongo_registry.init_app(app)
+    return app
+
+
+def cmd_ensure_indexes(args):
+    """Create all registered indexes"""
+    from models import get_db
+    from models.indexes import ensure_indexes
+
+    results = ensure_indexes(get_db())
+    failed = [r for r in results if not r['ok']]
+
+    for r in results:
+        status = 'ok' if r['ok'] else f"FAILED: {r['error']}"
+        if r.get('note'):
+            status += f" ({r['note']})"
+        print(f"  {r['collection']}.{r['name']}: {status}")
+
+    print(f"\n{len(results) - len(failed)}/{len(results)} indexes in place")
+    return 1 if failed else 0
+
+
+def cmd_verify_indexes(args):
+    """Explain canonical queries and fail on collection scans"""
+    from models import get_db
+    from models.indexes import verify_indexes
+
+    ok, results = verify_indexes(get_db())
+
+    for r in results:
+        status = 'ok' if r['ok'] else 'COLLSCAN'
+        print(f"  [{status}] {r['collection']} {r['filter']} sort={r['sort']} -> {' > '.join(r['stages'])}")
+
+    if not ok:
+        print("\nSome canonical queries run as collection scans. Run 'python manage.py ensure-indexes'.")
+        return 1
+
+    print("\nAll canonical queries use an index")
+    return 0
+
+
+def cmd_reconcile_stats(args):
+    """Rebuild dashboard counters from source data and report drift"""
+    from services.stats_service import StatsService
+
+    drift = StatsService().reconcile(apply=not args.dry_run)
+
+    for d in drift:
+        print(f"  {d['_id']}.{d['field']}: stored={d['stored']} actual={d['actual']}")
+
+    action = 'found' if args.dry_run else 'repaired'
+    print(f"\n{len(drift)} drifted counter(s) {action}")
+    return 0
+
+
+def cmd_backfill_activities(args):
+    """Stamp username and partner_id on activities logged before they were recorded"""
+    from services.activity_service import ActivityService
+
+    updated = ActivityService().backfill_actor_fields(batch_size=args.batch_size)
+    print(f"{updated} activities updated")
+    return 0
+
+
+def cmd_rollup_activities(args):
+    """Roll raw activities up into daily per-user/type summaries"""
+    from flask import current_app
+    from models import get_db
+    from services.activity_service import ActivityService, ensure_activity_ttl
+
+    service = ActivityService()
+    retention_days = current_app.config.get('ACTIVITY_RETENTION_DAYS')
+    if args.history:
+        rolled = service.rollup_history(retention_days=retention_days)
+    else:
+        rolled = service.rollup(days=args.days, retention_days=retention_days)
+    if rolled:
+        print(f"Rolled up {len(rolled)} day(s): {rolled[0]:%Y-%m-%d} .. {rolled[-1]:%Y-%m-%d}")
+
+    if args.history:
+        for r in ensure_activity_ttl(get_db()):
+            status = 'ok' if r['ok'] else f"FAILED: {r['error']}"
+            print(f"  {r['collection']}.{r['name']}: {status}")
+        if retention_days:
+            print(f"History recorded; raw activities now expire after {retention_days} days")
+    return 0
+
+
+def cmd_calibrate_bcrypt(args):
+    """Measure bcrypt on this host and recommend BCRYPT_ROUNDS for a target latency"""
+    from flask import current_app
+    from utils.passwords import calibrate
+
+    rounds, timings = calibrate(args.target_ms, args.min_rounds, args.max_rounds, args.samples)
+
+    for cost, ms in timings.items():
+        marker = '  <-- recommended' if cost == rounds else ''
+        print(f"  rounds={cost:<3} {ms:8.1f}ms{marker}")
+
+    current = current_app.config.get('BCRYPT_ROUNDS')
+    print(f"\nTarget {args.target_ms}ms: set BCRYPT_ROUNDS={rounds} (currently {current})")
+    if timings.get(rounds, 0) > args.target_ms:
+        print("Even the minimum cost exceeds the target on this host")
+    print("Existing hashes are rehashed at the new cost on each user's next login")
+    return 0
+
+
+def cmd_migrate_coupon_limits(args):
+    """Move partner limits embedded in coupon documents into coupon_partner_limits"""
+    from services.coupon_service import CouponService
+
+    migrated = CouponService().migrate_embedded_partner_limits(batch_size=args.batch_size)
+    print(f"{migrated} coupons migrated")
+    return 0
+
+
+def cmd_sweep_plan_expiry(args):
+    """Mark expired agent plans EXPIRED and send expiry reminders now"""
+    from flask import current_app
+    from services.plan_expiry_service import PlanExpiryService
+
+    if not args.no_emails:
+        from app import mail
+        mail.init_app(current_app)
+
+    totals = PlanExpiryService().sweep(
+        warning_days=args.warning_days,
+        batch_size=args.batch_size,
+        send_emails=not args.no_emails
+    )
+    if totals is None:
+        print("Another process is sweeping; try again later")
+        return 1
+
+    print(f"{totals['expired']} plan(s) expired, {totals['expiring']} expiry reminder(s), "
+          f"{totals['emails_sent']} email(s) sent, {totals['emails_failed']} failed")
+    if totals['lease_lost']:
+        print("Sweep stopped early: lease lost to another process")
+        return 1
+    return 0
+
+
+def cmd_sync_partner_pdf_counters(args):
+    """Set each partner's PDF counter to the sum of its agents' counts"""
+    from services.quota_service import PdfQuotaService
+
+    drift = PdfQuotaService().sync_partner_counters(apply=not args.dry_run)
+
+    for d in drift:
+        print(f"  {d['_id']}.pdf_generated: stored={d['stored']} actual={d['actual']}")
+
+    action = 'found' if args.dry_run else 'repaired'
+    print(f"\n{len(drift)} partner counter(s) {action}")
+    return 0
+
+
+COMMANDS = {
+    'ensure-indexes': cmd_ensure_indexes,
+    'verify-indexes': cmd_verify_indexes,
+    'reconcile-stats': cmd_reconcile_stats,
+    'backfill-activities': cmd_backfill_activities,
+    'rollup-activities': cmd_rollup_activities,
+    'calibrate-bcrypt': cmd_calibrate_bcrypt,
+    'migrate-coupon-limits': cmd_migrate_coupon_limits,
+    'sweep-plan-expiry': cmd_sweep_plan_expiry,
+    'sync-partner-pdf-counters': cmd_sync_partner_pdf_counters
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='AdvisorMitra maintenance commands')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    subparsers.add_parser('ensure-indexes', help='Create all registered indexes (idempotent)')
+    subparsers.add_parser('verify-indexes', help='Fail if any canonical query does a COLLSCAN')
+
+    reconcile = subparsers.add_parser('reconcile-stats', help='Rebuild dashboard counters from source data')
+    reconcile.add_argument('--dry-run', action='store_true', help='Report drift without rewriting counters')
+
+    backfill = subparsers.add_parser('backfill-activities', help='Stamp username/partner_id on old activities')
+    backfill.add_argument('--batch-size', type=int, default=500, help='Users resolved per $in query')
+
+    rollup = subparsers.add_parser('rollup-activities', help='Roll raw activities up into daily summaries')
+    rollup.add_argument('--days', type=int, default=2, help='Days to (re)build, today included')
+    rollup.add_argument('--history', action='store_true',
+                        help='Roll up all existing history, then enable the activities TTL index')
+
+    calibrate = subparsers.add_parser('calibrate-bcrypt', help='Recommend BCRYPT_ROUNDS for a target hash latency')
+    calibrate.add_argument('--target-ms', type=float, default=250, help='Acceptable time per hash')
+    calibrate.add_argument('--min-rounds', type=int, default=10)
+    calibrate.add_argument('--max-rounds', type=int, default=16)
+    calibrate.add_argument('--samples', type=int, default=3, help='Hashes timed per cost (median is used)')
+
+    migrate_limits = subparsers.add_parser('migrate-coupon-limits',
+                                           help='Move embedded coupon partner_limits into their own collection')
+    migrate_limits.add_argument('--batch-size', type=int, default=500, help='Coupons read per batch')
+
+    expiry = subparsers.add_parser('sweep-plan-expiry', help='Mark expired agent plans and send expiry reminders')
+    expiry.add_argument('--warning-days', type=int, default=7, help='Remind agents whose plan expires this soon')
+    expiry.add_argument('--batch-size', type=int, default=500, help='Agents updated per bulk write')
+    expiry.add_argument('--no-emails', action='store_true', help='Update plans without sending email')
+
+    sync_pdfs = subparsers.add_parser('sync-partner-pdf-counters',
+                                      help="Set partner PDF counters to the sum of their agents' counts")
+    sync_pdfs.add_argument('--dry-run', action='store_true', help='Report mismatches without rewriting counters')
+
+    args = parser.parse_args(argv)
+
+    app = create_cli_app()
+    with app.app_context():
+        try:
+            return COMMANDS[args.command](args)
+        finally:
+            mongo_registry.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
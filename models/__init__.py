@@ -1,15 +1,13 @@
 # models/__init__.py
 # Database collections initialization with new registration_links collection
 
-from pymongo import MongoClient
 from flask import current_app, g
+from models.connection import mongo_registry
 
 def get_db():
-    """Get MongoDB database instance"""
+    """Get MongoDB database instance from the shared client registry"""
     if 'db' not in g:
-        client = MongoClient(current_app.config['MONGO_URI'])
-        db_name = current_app.config['MONGO_URI'].split('/')[-1]
-        g.db = client[db_name]
+        g.db = mongo_registry.get_database(current_app.config['MONGO_URI'])
     return g.db
 
 # Collections
@@ -25,5 +23,20 @@ def get_coupons_collection():
 def get_activities_collection():
     return get_db()['activities']
 
+def get_activity_rollups_collection():
+    return get_db()['activity_rollups']
+
+def get_coupon_redemptions_collection():
+    return get_db()['coupon_redemptions']
+
+def get_coupon_partner_limits_collection():
+    return get_db()['coupon_partner_limits']
+
 def get_registration_links_collection():
-    return get_db()['registration_links']
\ No newline at end of file
+    return get_db()['registration_links']
+
+def get_stats_collection():
+    return get_db()['stats']
+
+def get_job_leases_collection():
+    return get_db()['job_leases']
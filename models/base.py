@@ -0,0 +1,111 @@
+# models/base.py
+# Slotted model base: fields are decoded from the backing document on first access
+
+import bson
+from bson.codec_options import CodecOptions
+from bson.raw_bson import RawBSONDocument
+
+_MISSING = object()
+
+# Every model exposes its document _id the same lazy way as its other fields
+ID_FIELD = (('_id', None),)
+
+# Codec for reads that build models: documents stay as undecoded BSON bytes
+# until a field is read (nested documents stay raw too)
+RAW_CODEC_OPTIONS = CodecOptions(document_class=RawBSONDocument)
+
+
+def raw_collection(collection):
+    """Same collection, returning RawBSONDocument instead of dict"""
+    return collection.with_options(codec_options=RAW_CODEC_OPTIONS)
+
+
+def field_slots(fields, extra=()):
+    """__slots__ for a model: one private slot per field plus `extra` plain attributes"""
+    return tuple(f'_f_{name}' for name, _ in ID_FIELD + tuple(fields)) + tuple(extra)
+
+
+class LazyField:
+    """Read a field from the backing document the first time it is accessed.
+
+    The decoded value (or the default) is cached in the instance's slot;
+    assignments write the slot directly.
+    """
+
+    __slots__ = ('name', 'default', 'slot')
+
+    def __init__(self, name, default, slot):
+        self.name = name
+        self.default = default
+        self.slot = slot
+
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            return self
+
+        try:
+            return self.slot.__get__(obj, owner)
+        except AttributeError:
+            pass
+
+        data = obj._data
+        if isinstance(data, RawBSONDocument):
+            # One C-level decode of the raw bytes, then every field is in its slot
+            obj._materialize()
+            return self.slot.__get__(obj, owner)
+
+        value = data.get(self.name, _MISSING) if data is not None else _MISSING
+        if value is _MISSING:
+            value = self.default() if callable(self.default) else self.default
+        self.slot.__set__(obj, value)
+        return value
+
+    def __set__(self, obj, value):
+        if isinstance(obj._data, RawBSONDocument):
+            # Decode first so the remaining fields cannot overwrite this assignment
+            obj._materialize()
+        self.slot.__set__(obj, value)
+
+
+def lazy_fields(cls):
+    """Class decorator: install a LazyField over each `_f_<name>` slot in cls.FIELDS"""
+    cls._lazy_fields = tuple(
+        LazyField(name, default, cls.__dict__[f'_f_{name}'])
+        for name, default in ID_FIELD + tuple(cls.FIELDS)
+    )
+    cls._field_slots = {field.name: field.slot for field in cls._lazy_fields}
+    for field in cls._lazy_fields:
+        setattr(cls, field.name, field)
+    return cls
+
+
+class Model:
+    """Base for document-backed models.
+
+    Subclasses declare FIELDS as (name, default) pairs, set
+    `__slots__ = field_slots(FIELDS, extra=...)` and are decorated with
+    @lazy_fields. `data` may be a dict or a RawBSONDocument.
+    """
+
+    __slots__ = ('_data',)
+
+    FIELDS = ()
+    _lazy_fields = ()
+    _field_slots = {}
+
+    def __init__(self, data=None):
+        self._data = data
+
+    def _materialize(self):
+        """Decode a RawBSONDocument once into the field slots and release the bytes.
+
+        Fields missing from the document keep an empty slot and fall back to
+        their default when read.
+        """
+        document = bson.decode(self._data.raw)
+        self._data = None
+        slots = self._field_slots
+        for name, value in document.items():
+            slot = slots.get(name)
+            if slot is not None:
+                slot.__set__(self, value)
@@ -0,0 +1,172 @@
+# models/connection.py
+# Process-wide MongoClient registry with pool sizing, fork safety and pool statistics
+
+import os
+import threading
+from pymongo import MongoClient, monitoring
+
+
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    """Collect connection pool counters for monitoring"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.created = 0
+            self.closed = 0
+            self.in_use = 0
+            self.waiting = 0
+            self.checkouts = 0
+            self.checkout_failures = 0
+            self.pools_cleared = 0
+
+    def _bump(self, **deltas):
+        with self._lock:
+            for name, delta in deltas.items():
+                setattr(self, name, getattr(self, name) + delta)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'created': self.created,
+                'closed': self.closed,
+                'open': self.created - self.closed,
+                'in_use': self.in_use,
+                'waiting': self.waiting,
+                'checkouts': self.checkouts,
+                'checkout_failures': self.checkout_failures,
+                'pools_cleared': self.pools_cleared
+            }
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._bump(pools_cleared=1)
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._bump(created=1)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._bump(closed=1)
+
+    def connection_check_out_started(self, event):
+        self._bump(waiting=1)
+
+    def connection_check_out_failed(self, event):
+        self._bump(waiting=-1, checkout_failures=1)
+
+    def connection_checked_out(self, event):
+        self._bump(waiting=-1, in_use=1, checkouts=1)
+
+    def connection_checked_in(self, event):
+        self._bump(in_use=-1)
+
+
+class MongoClientRegistry:
+    """One shared MongoClient per URI per process.
+
+    MongoClient is thread-safe and pools its own connections, so every request,
+    greenlet and background job shares the same client. Clients are never
+    shared across a fork: the child drops the parent's clients and lazily
+    builds its own.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clients = {}
+        self._pid = os.getpid()
+        self._client_options = {}
+        self._default_uri = None
+        self.pool_stats = PoolStatsListener()
+        self._listeners = [self.pool_stats]
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def init_app(self, app):
+        """Configure the registry from the Flask config"""
+        config = app.config
+        self._default_uri = config['MONGO_URI']
+        self._client_options = {
+            'maxPoolSize': config.get('MONGO_MAX_POOL_SIZE', 100),
+            'minPoolSize': config.get('MONGO_MIN_POOL_SIZE', 0),
+            'maxIdleTimeMS': config.get('MONGO_MAX_IDLE_TIME_MS'),
+            'waitQueueTimeoutMS': config.get('MONGO_WAIT_QUEUE_TIMEOUT_MS'),
+            'serverSelectionTimeoutMS': config.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', 30000),
+            'connectTimeoutMS': config.get('MONGO_CONNECT_TIMEOUT_MS', 20000)
+        }
+        app.extensions['mongo_registry'] = self
+
+    def add_listener(self, listener):
+        """Register a pymongo event listener for clients created from now on"""
+        with self._lock:
+            if listener not in self._listeners:
+                self._listeners.append(listener)
+
+    def _after_fork(self):
+        # Sockets inherited from the parent must not be used or closed here
+        self._lock = threading.Lock()
+        self._clients = {}
+        self._pid = os.getpid()
+        self.pool_stats.reset()
+
+    def get_client(self, uri=None):
+        """Get (or lazily create) the shared client for a URI"""
+        uri = uri or self._default_uri
+        if not uri:
+            raise RuntimeError("MongoClientRegistry is not configured with a MONGO_URI")
+
+        if self._pid != os.getpid():
+            self._after_fork()
+
+        client = self._clients.get(uri)
+        if client is not None:
+            return client
+
+        with self._lock:
+            client = self._clients.get(uri)
+            if client is None:
+                options = {k: v for k, v in self._client_options.items() if v is not None}
+                client = MongoClient(uri, event_listeners=list(self._listeners), **options)
+                self._clients[uri] = client
+        return client
+
+    def get_database(self, uri=None):
+        """Get the database named in the URI"""
+        uri = uri or self._default_uri
+        client = self.get_client(uri)
+        try:
+            return client.get_default_database()
+        except Exception:
+            return client[uri.split('/')[-1].split('?')[0]]
+
+    def stats(self):
+        """Pool statistics for monitoring"""
+        stats = self.pool_stats.snapshot()
+        stats['clients'] = len(self._clients)
+        stats['max_pool_size'] = self._client_options.get('maxPoolSize', 100)
+        stats['pid'] = self._pid
+        return stats
+
+    def close(self):
+        """Close every client owned by this process"""
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients = {}
+        for client in clients:
+            client.close()
+
+
+mongo_registry = MongoClientRegistry()
@@ -0,0 +1,102 @@
+# models/count_cache.py
+# Cached pagination totals: short-TTL count cache invalidated by in-process writes
+
+import threading
+from bson import json_util
+from pymongo import monitoring
+from utils.cache import TTLCache
+
+# Commands that change documents in the collection they name
+WRITE_COMMANDS = {'insert', 'update', 'delete', 'findAndModify', 'drop'}
+
+
+def _namespace(collection):
+    return f'{collection.database.name}.{collection.name}'
+
+
+def _normalize(query):
+    """Stable key for a filter regardless of dict key order"""
+    return json_util.dumps(query or {}, sort_keys=True)
+
+
+class CountCache:
+    """Approximate totals for listings.
+
+    Unfiltered totals come from estimated_document_count (collection
+    metadata); filtered totals from count_documents. Both are cached per
+    (namespace, filter) for a few seconds and dropped whenever this process
+    writes to the collection. Writes from other processes show up once the
+    TTL lapses.
+    """
+
+    def __init__(self, maxsize=2048, ttl=30):
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.listener = CountInvalidationListener(self)
+
+    def init_app(self, app):
+        """Size the cache from the Flask config and hook it into every MongoClient"""
+        from models.connection import mongo_registry
+
+        self.cache.maxsize = app.config.get('COUNT_CACHE_MAX_ENTRIES', self.cache.maxsize)
+        self.cache.ttl = app.config.get('COUNT_CACHE_TTL', self.cache.ttl)
+        mongo_registry.add_listener(self.listener)
+
+    def count(self, collection, query=None, exact=False):
+        """Count documents matching query; exact=True always asks the server"""
+        if exact:
+            return collection.count_documents(query or {})
+
+        key = (_namespace(collection), _normalize(query))
+        total = self.cache.get(key)
+        if total is None:
+            if query:
+                total = collection.count_documents(query)
+            else:
+                total = collection.estimated_document_count()
+            self.cache.set(key, total)
+        return total
+
+    def invalidate(self, namespace):
+        """Drop cached totals for one 'db.collection' namespace"""
+        return self.cache.delete_where(lambda key: key[0] == namespace)
+
+    def stats(self):
+        return self.cache.stats()
+
+
+class CountInvalidationListener(monitoring.CommandListener):
+    """Invalidate cached counts when a write command touches a collection"""
+
+    def __init__(self, count_cache):
+        self.count_cache = count_cache
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        if event.command_name not in WRITE_COMMANDS:
+            return
+
+        collection_name = event.command.get(event.command_name)
+        if not isinstance(collection_name, str):
+            return
+
+        namespace = f'{event.database_name}.{collection_name}'
+        # Invalidate before and after the write so a count racing with it is not kept
+        self.count_cache.invalidate(namespace)
+        with self._lock:
+            self._pending[(event.request_id, event.operation_id)] = namespace
+
+    def _finished(self, event):
+        with self._lock:
+            namespace = self._pending.pop((event.request_id, event.operation_id), None)
+        if namespace:
+            self.count_cache.invalidate(namespace)
+
+    def succeeded(self, event):
+        self._finished(event)
+
+    def failed(self, event):
+        self._finished(event)
+
+
+count_cache = CountCache()
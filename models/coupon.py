@@ -1,28 +1,48 @@
 from datetime import datetime
 from bson import ObjectId
+from models.base import Model, field_slots, lazy_fields
 import string
-import random
+import secrets
 
-class Coupon:
-    def __init__(self, data=None):
-        if data:
-            self._id = data.get('_id')
-            self.code = data.get('code')
-            self.name = data.get('name')
-            self.description = data.get('description')
-            self.discount_type = data.get('discount_type', 'PERCENTAGE')  # PERCENTAGE, FIXED
-            self.discount_value = data.get('discount_value', 0)
-            self.min_purchase_amount = data.get('min_purchase_amount', 0)
-            self.max_discount_amount = data.get('max_discount_amount')  # For percentage discounts
-            self.usage_limit = data.get('usage_limit')  # None for unlimited
-            self.used_count = data.get('used_count', 0)
-            self.valid_from = data.get('valid_from', datetime.utcnow())
-            self.valid_until = data.get('valid_until')
-            self.is_active = data.get('is_active', True)
-            self.applicable_plans = data.get('applicable_plans', [])  # Empty means all plans
-            self.created_at = data.get('created_at', datetime.utcnow())
-            self.updated_at = data.get('updated_at', datetime.utcnow())
-            self.created_by = data.get('created_by')
+# (field, default) for every stored coupon attribute, decoded lazily on first access.
+# Callable defaults are evaluated per instance; others are shared, so they must be immutable.
+FIELDS = (
+    ('code', None),
+    ('name', None),
+    ('description', None),
+    ('discount_type', 'PERCENTAGE'),  # PERCENTAGE, FIXED
+    ('discount_value', 0),
+    ('min_purchase_amount', 0),
+    ('max_discount_amount', None),  # For percentage discounts
+    ('usage_limit', None),  # None for unlimited
+    ('used_count', 0),
+    ('valid_from', datetime.utcnow),
+    ('valid_until', None),
+    ('is_active', True),
+    ('applicable_plans', list),  # Empty means all plans
+    ('partner_limits', dict),  # {partner_id: {'limit', 'used'}}, filled from coupon_partner_limits
+    ('campaign_id', None),  # Set on coupons created together by CouponService.generate_campaign
+    ('last_redemption_attempt', None),  # Latest redemption that passed the coupon checks (see CouponService.redeem)
+    ('created_at', datetime.utcnow),
+    ('updated_at', datetime.utcnow),
+    ('created_by', None)
+)
+
+# Named JSON views (see utils/serialization.py); 'default' is what the coupons list API returns
+JSON_VIEWS = {
+    'default': (
+        'id', 'code', 'name', 'description', 'discount_type', 'discount_value', 'min_purchase_amount',
+        'max_discount_amount', 'usage_limit', 'used_count', 'valid_from', 'valid_until', 'is_active',
+        'created_at'
+    )
+}
+
+@lazy_fields
+class Coupon(Model):
+    __slots__ = field_slots(FIELDS, extra=('usage_stats',))
+    
+    FIELDS = FIELDS
+    JSON_VIEWS = JSON_VIEWS
     
     def to_dict(self):
         return {
@@ -49,10 +69,18 @@ class Coupon:
         return str(self._id) if self._id else None
     
     @staticmethod
-    def generate_code(length=8):
+    def generate_code(length=8, prefix=''):
         """Generate a random coupon code"""
         characters = string.ascii_uppercase + string.digits
-        return ''.join(random.choice(characters) for _ in range(length))
+        return prefix + ''.join(secrets.choice(characters) for _ in range(length))
+    
+    @staticmethod
+    def generate_codes(count, length=8, prefix=''):
+        """Generate `count` distinct random codes (uniqueness in the database is the unique index's job)"""
+        codes = set()
+        while len(codes) < count:
+            codes.add(Coupon.generate_code(length, prefix))
+        return list(codes)
     
     def is_valid(self):
         """Check if coupon is currently valid"""
@@ -74,7 +102,7 @@ class Coupon:
     
     def calculate_discount(self, amount, plan_id=None):
         """Calculate discount amount"""
-        if plan_id and self.applicable_plans and str(plan_id) not in self.applicable_plans:
+        if plan_id and self.applicable_plans and str(plan_id) not in {str(pid) for pid in self.applicable_plans}:
             return 0
         
         if amount < self.min_purchase_amount:
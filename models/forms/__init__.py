@@ -1,6 +1,5 @@
 # models/forms/__init__.py
-from pymongo import MongoClient
-from flask import current_app, g
+from models import get_db
 
 def get_health_insurance_forms_collection():
     return get_db()['health_insurance_forms']
@@ -22,11 +21,3 @@ def get_customer_forms_collection():
 
 def get_form_links_collection():
     return get_db()['form_links']
-
-def get_db():
-    """Get MongoDB database instance"""
-    if 'db' not in g:
-        client = MongoClient(current_app.config['MONGO_URI'])
-        db_name = current_app.config['MONGO_URI'].split('/')[-1]
-        g.db = client[db_name]
-    return g.db
\ No newline at end of file
@@ -1,24 +1,40 @@
 # models/forms/form_link.py
 from datetime import datetime
 from bson import ObjectId
+from models.base import Model, field_slots, lazy_fields
 import secrets
 
-class FormLink:
-    def __init__(self, data=None):
-        if data:
-            self._id = data.get('_id')
-            self.token = data.get('token')
-            self.form_type = data.get('form_type')  # health_insurance, term_insurance, etc.
-            self.agent_id = data.get('agent_id')
-            self.agent_name = data.get('agent_name')
-            self.agent_phone = data.get('agent_phone')
-            self.language = data.get('language', 'en')
-            self.created_by = data.get('created_by')
-            self.created_at = data.get('created_at', datetime.utcnow())
-            self.expires_at = data.get('expires_at')
-            self.is_active = data.get('is_active', True)
-            self.usage_count = data.get('usage_count', 0)
-            self.usage_limit = data.get('usage_limit')  # None for unlimited
+# (field, default) for every stored form link attribute, decoded lazily on first access.
+# Callable defaults are evaluated per instance; others are shared, so they must be immutable.
+FIELDS = (
+    ('token', None),
+    ('form_type', None),  # health_insurance, term_insurance, etc.
+    ('agent_id', None),
+    ('agent_name', None),
+    ('agent_phone', None),
+    ('language', 'en'),
+    ('created_by', None),
+    ('created_at', datetime.utcnow),
+    ('expires_at', None),
+    ('is_active', True),
+    ('usage_count', 0),
+    ('usage_limit', None)  # None for unlimited
+)
+
+# Named JSON views (see utils/serialization.py)
+JSON_VIEWS = {
+    'default': (
+        'id', 'token', 'form_type', 'agent_id', 'language', 'created_at', 'expires_at', 'is_active',
+        'usage_count', 'usage_limit'
+    )
+}
+
+@lazy_fields
+class FormLink(Model):
+    __slots__ = field_slots(FIELDS)
+    
+    FIELDS = FIELDS
+    JSON_VIEWS = JSON_VIEWS
     
     def to_dict(self):
         return {
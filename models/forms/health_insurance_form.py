@@ -1,42 +1,69 @@
 # models/forms/health_insurance_form.py
 from datetime import datetime
 from bson import ObjectId
+from models.base import Model, field_slots, lazy_fields
 
-class HealthInsuranceForm:
-    def __init__(self, data=None):
-        if data:
-            self._id = data.get('_id')
-            self.form_link_id = data.get('form_link_id')  # Link used to generate this form
-            self.agent_id = data.get('agent_id')
-            self.language = data.get('language', 'en')
-            
-            # Form fields
-            self.name = data.get('name')
-            self.email = data.get('email')
-            self.mobile = data.get('mobile')
-            self.city_of_residence = data.get('city_of_residence')
-            self.age = data.get('age')
-            self.number_of_members = data.get('number_of_members')
-            self.eldest_member_age = data.get('eldest_member_age')
-            self.pre_existing_diseases = data.get('pre_existing_diseases')
-            self.major_surgery = data.get('major_surgery')
-            self.existing_insurance = data.get('existing_insurance')
-            self.current_coverage = data.get('current_coverage')
-            self.port_policy = data.get('port_policy')
-            
-            # NEW: Preferred report language
-            self.report_language = data.get('report_language', 'en')
-            
-            # Tier city will be calculated based on city
-            self.tier_city = data.get('tier_city')
-            
-            # Metadata
-            self.form_timestamp = data.get('form_timestamp', datetime.utcnow())
-            self.created_at = data.get('created_at', datetime.utcnow())
-            self.updated_at = data.get('updated_at', datetime.utcnow())
-            self.pdf_generated = data.get('pdf_generated', False)
-            self.pdf_generated_at = data.get('pdf_generated_at')
-            self.pdf_filename = data.get('pdf_filename')
+# (field, default) for every stored form attribute, decoded lazily on first access.
+# Callable defaults are evaluated per instance; others are shared, so they must be immutable.
+FIELDS = (
+    ('form_link_id', None),  # Link used to generate this form
+    ('agent_id', None),
+    ('language', 'en'),
+
+    # Form fields
+    ('name', None),
+    ('email', None),
+    ('mobile', None),
+    ('city_of_residence', None),
+    ('age', None),
+    ('number_of_members', None),
+    ('eldest_member_age', None),
+    ('pre_existing_diseases', None),
+    ('major_surgery', None),
+    ('existing_insurance', None),
+    ('current_coverage', None),
+    ('port_policy', None),
+
+    # NEW: Preferred report language
+    ('report_language', 'en'),
+
+    # Tier city will be calculated based on city
+    ('tier_city', None),
+
+    # Metadata
+    ('form_timestamp', datetime.utcnow),
+    ('created_at', datetime.utcnow),
+    ('updated_at', datetime.utcnow),
+    ('pdf_generated', False),
+    ('pdf_generated_at', None),
+    ('pdf_filename', None)
+)
+
+# Named projections per view. None means the full document.
+PROJECTIONS = {
+    # Agent's form list
+    'list_row': {name: 1 for name in (
+        'agent_id', 'name', 'email', 'mobile', 'city_of_residence', 'number_of_members',
+        'language', 'report_language', 'pdf_generated', 'created_at'
+    )},
+    'detail': None
+}
+
+# Named JSON views (see utils/serialization.py); fields match the 'list_row' projection
+JSON_VIEWS = {
+    'default': (
+        'id', 'agent_id', 'name', 'email', 'mobile', 'city_of_residence', 'number_of_members',
+        'language', 'report_language', 'pdf_generated', 'created_at'
+    )
+}
+
+@lazy_fields
+class HealthInsuranceForm(Model):
+    __slots__ = field_slots(FIELDS)
+    
+    FIELDS = FIELDS
+    PROJECTIONS = PROJECTIONS
+    JSON_VIEWS = JSON_VIEWS
     
     def to_dict(self):
         return {
@@ -65,6 +92,11 @@ class HealthInsuranceForm:
             'pdf_filename': self.pdf_filename
         }
     
+    @classmethod
+    def projection(cls, view):
+        """Projection document for a named view (None fetches every field)"""
+        return cls.PROJECTIONS[view]
+    
     @property
     def id(self):
         return str(self._id) if self._id else None
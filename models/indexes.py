@@ -0,0 +1,258 @@
+# models/indexes.py
+# Declarative index registry with idempotent bootstrap and explain()-based verification
+
+from datetime import datetime
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+from flask import current_app
+
+# Server error code for an existing index with the same keys but other options
+INDEX_OPTIONS_CONFLICT = 85
+
+# Index specs per collection. Each spec is a dict with 'keys', 'name' and any
+# extra create_index options (unique, sparse, partialFilterExpression, ...).
+# 'ttl_days_config' names a config key holding a retention in days; when it is
+# set the index becomes a TTL index (existing indexes are converted with collMod).
+# 'ttl_requires' is a (collection, filter) that must match a document before the
+# expiry is applied; until then the index is created without one.
+# Written to activity_rollups once all raw activity history has been rolled up
+# (ActivityService.rollup_history); raw activities only start expiring after that
+ACTIVITY_HISTORY_BACKFILL_ID = 'history_backfill'
+
+INDEX_SPECS = {
+    'users': [
+        {'keys': [('username', ASCENDING)], 'name': 'username_unique', 'unique': True},
+        {'keys': [('email', ASCENDING)], 'name': 'email_unique', 'unique': True},
+        {'keys': [('role', ASCENDING), ('created_at', DESCENDING), ('_id', DESCENDING)], 'name': 'role_created_at_id'},
+        {'keys': [('partner_id', ASCENDING), ('role', ASCENDING), ('created_at', DESCENDING), ('_id', DESCENDING)],
+         'name': 'partner_role_created_at_id'},
+        {'keys': [('approval_status', ASCENDING), ('created_at', DESCENDING), ('_id', DESCENDING)],
+         'name': 'approval_status_created_at_id'},
+        {'keys': [('created_at', DESCENDING), ('_id', DESCENDING)], 'name': 'created_at_id'},
+        {'keys': [('plan_id', ASCENDING)], 'name': 'plan_id', 'sparse': True},
+        {'keys': [('plan_expiry_date', ASCENDING)], 'name': 'plan_expiry_date', 'sparse': True}
+    ],
+    'plans': [
+        {'keys': [('name', ASCENDING)], 'name': 'name'},
+        {'keys': [('is_active', ASCENDING), ('price', ASCENDING)], 'name': 'is_active_price'},
+        {'keys': [('created_at', DESCENDING), ('_id', DESCENDING)], 'name': 'created_at_id'}
+    ],
+    'coupons': [
+        {'keys': [('code', ASCENDING)], 'name': 'code_unique', 'unique': True},
+        {'keys': [('is_active', ASCENDING)], 'name': 'is_active'},
+        {'keys': [('campaign_id', ASCENDING), ('_id', ASCENDING)], 'name': 'campaign_id',
+         'partialFilterExpression': {'campaign_id': {'$exists': True}}},
+        {'keys': [('created_at', DESCENDING), ('_id', DESCENDING)], 'name': 'created_at_id'}
+    ],
+    'coupon_redemptions': [
+        {'keys': [('coupon_id', ASCENDING), ('partner_id', ASCENDING)], 'name': 'coupon_partner'},
+        {'keys': [('partner_id', ASCENDING), ('redeemed_at', DESCENDING)], 'name': 'partner_redeemed_at',
+         'sparse': True},
+        {'keys': [('redeemed_at', DESCENDING)], 'name': 'redeemed_at'}
+    ],
+    'coupon_partner_limits': [
+        {'keys': [('coupon_id', ASCENDING), ('partner_id', ASCENDING)], 'name': 'coupon_partner_unique',
+         'unique': True},
+        {'keys': [('partner_id', ASCENDING), ('coupon_id', ASCENDING)], 'name': 'partner_coupon'}
+    ],
+    'activities': [
+        {'keys': [('created_at', ASCENDING)], 'name': 'created_at', 'ttl_days_config': 'ACTIVITY_RETENTION_DAYS',
+         'ttl_requires': ('activity_rollups', {'_id': ACTIVITY_HISTORY_BACKFILL_ID})},
+        {'keys': [('user_id', ASCENDING), ('created_at', DESCENDING)], 'name': 'user_created_at'},
+        {'keys': [('partner_id', ASCENDING), ('created_at', DESCENDING)], 'name': 'partner_created_at', 'sparse': True}
+    ],
+    'activity_rollups': [
+        {'keys': [('day', DESCENDING)], 'name': 'day'},
+        {'keys': [('partner_id', ASCENDING), ('day', DESCENDING)], 'name': 'partner_day', 'sparse': True},
+        {'keys': [('user_id', ASCENDING), ('day', DESCENDING)], 'name': 'user_day'}
+    ],
+    'registration_links': [
+        {'keys': [('token', ASCENDING)], 'name': 'token_unique', 'unique': True}
+    ],
+    'form_links': [
+        {'keys': [('token', ASCENDING)], 'name': 'token_unique', 'unique': True},
+        {'keys': [('agent_id', ASCENDING), ('form_type', ASCENDING), ('created_at', DESCENDING), ('_id', DESCENDING)],
+         'name': 'agent_form_type_created_at_id'}
+    ],
+    'health_insurance_forms': [
+        {'keys': [('agent_id', ASCENDING), ('created_at', DESCENDING), ('_id', DESCENDING)],
+         'name': 'agent_created_at_id'}
+    ],
+    'insurance_recommendations': [
+        {'keys': [('age_group', ASCENDING), ('city_tier', ASCENDING), ('pre_existing_condition', ASCENDING)],
+         'name': 'age_group_1_city_tier_1_pre_existing_condition_1'}
+    ]
+}
+
+# Indexes superseded by an entry above; ensure_indexes() drops them if present.
+RETIRED_INDEXES = {
+    'users': ['role_created_at', 'partner_role_created_at', 'approval_status_created_at', 'created_at'],
+    'plans': ['created_at'],
+    'coupons': ['created_at'],
+    'form_links': ['agent_form_type_created_at'],
+    'health_insurance_forms': ['agent_created_at']
+}
+
+# Listings sort newest first with _id as tie-breaker (see utils/pagination.py)
+_NEWEST = [('created_at', DESCENDING), ('_id', DESCENDING)]
+
+# Hot queries the application issues; verify_indexes() fails if any of them
+# is planned as a collection scan.
+_SAMPLE_ID = ObjectId('000000000000000000000000')
+_SAMPLE_DATE = datetime(2000, 1, 1)
+
+CANONICAL_QUERIES = [
+    {'collection': 'users', 'filter': {'username': 'sample'}},
+    {'collection': 'users', 'filter': {'email': 'sample@example.com'}},
+    {'collection': 'users', 'filter': {'$or': [{'username': 'sample'}, {'email': 'sample'}]}},
+    {'collection': 'users', 'filter': {'partner_id': _SAMPLE_ID, 'role': 'AGENT'}, 'sort': _NEWEST},
+    {'collection': 'users', 'filter': {'role': 'PARTNER'}, 'sort': _NEWEST},
+    {'collection': 'users', 'filter': {'approval_status': {'$in': ['PENDING', 'PARTNER_APPROVED']}},
+     'sort': _NEWEST},
+    {'collection': 'users', 'filter': {}, 'sort': _NEWEST},
+    {'collection': 'users', 'filter': {'plan_id': _SAMPLE_ID}},
+    {'collection': 'users', 'filter': {'plan_expiry_date': {'$lte': _SAMPLE_DATE}, 'role': 'AGENT',
+                                       'plan_status': {'$ne': 'EXPIRED'}},
+     'sort': [('plan_expiry_date', ASCENDING)]},
+    {'collection': 'plans', 'filter': {'is_active': True}, 'sort': [('price', ASCENDING)]},
+    {'collection': 'plans', 'filter': {'name': 'sample'}},
+    {'collection': 'coupons', 'filter': {'code': 'SAMPLE'}},
+    {'collection': 'coupons', 'filter': {'campaign_id': _SAMPLE_ID}, 'sort': [('_id', ASCENDING)]},
+    {'collection': 'plans', 'filter': {}, 'sort': _NEWEST},
+    {'collection': 'coupons', 'filter': {}, 'sort': _NEWEST},
+    {'collection': 'coupon_redemptions', 'filter': {'coupon_id': _SAMPLE_ID}},
+    {'collection': 'coupon_partner_limits', 'filter': {'coupon_id': _SAMPLE_ID, 'partner_id': _SAMPLE_ID}},
+    {'collection': 'coupon_partner_limits', 'filter': {'partner_id': _SAMPLE_ID, 'coupon_id': {'$in': [_SAMPLE_ID]}}},
+    {'collection': 'activities', 'filter': {}, 'sort': [('created_at', DESCENDING)]},
+    {'collection': 'activities', 'filter': {'user_id': _SAMPLE_ID}, 'sort': [('created_at', DESCENDING)]},
+    {'collection': 'activities', 'filter': {'partner_id': _SAMPLE_ID}, 'sort': [('created_at', DESCENDING)]},
+    {'collection': 'registration_links', 'filter': {'token': 'sample', 'used': False}},
+    {'collection': 'form_links', 'filter': {'token': 'sample'}},
+    {'collection': 'form_links', 'filter': {'agent_id': _SAMPLE_ID, 'form_type': 'health_insurance'},
+     'sort': _NEWEST},
+    {'collection': 'health_insurance_forms', 'filter': {'agent_id': _SAMPLE_ID}, 'sort': _NEWEST},
+    {'collection': 'insurance_recommendations',
+     'filter': {'age_group': '25-35', 'city_tier': 'Tier 1', 'pre_existing_condition': 'No'}}
+]
+
+
+def drop_retired_indexes(db, retired=None):
+    """Drop superseded indexes that still exist. Returns the dropped 'collection.name' strings."""
+    retired = RETIRED_INDEXES if retired is None else retired
+    dropped = []
+
+    for collection_name, names in retired.items():
+        collection = db[collection_name]
+        existing = set(collection.index_information())
+        for name in names:
+            if name in existing:
+                collection.drop_index(name)
+                dropped.append(f'{collection_name}.{name}')
+
+    return dropped
+
+
+def _ttl_seconds(config_key):
+    """Retention from the app config in seconds, or None when disabled"""
+    try:
+        days = current_app.config.get(config_key)
+    except RuntimeError:
+        days = None
+    return int(days * 86400) if days else None
+
+
+def _set_ttl(db, collection_name, spec, seconds):
+    """Turn an existing index into a TTL index (or change its expiry)"""
+    db.command('collMod', collection_name, index={
+        'keyPattern': dict(spec['keys']),
+        'expireAfterSeconds': seconds
+    })
+
+
+def ensure_indexes(db, specs=None):
+    """Create every registered index and drop retired ones. Safe to run repeatedly.
+
+    Returns a list of result dicts: collection, name, ok and error (if any).
+    """
+    specs = specs or INDEX_SPECS
+    results = []
+
+    for collection_name, collection_specs in specs.items():
+        collection = db[collection_name]
+        for spec in collection_specs:
+            options = {k: v for k, v in spec.items() if k not in ('keys', 'ttl_days_config', 'ttl_requires')}
+            ttl = _ttl_seconds(spec['ttl_days_config']) if spec.get('ttl_days_config') else None
+            note = None
+            if ttl and spec.get('ttl_requires'):
+                required_collection, required_filter = spec['ttl_requires']
+                if not db[required_collection].find_one(required_filter, {'_id': 1}):
+                    ttl = None
+                    note = f'TTL deferred until {required_collection} has {required_filter}'
+            if ttl:
+                options['expireAfterSeconds'] = ttl
+            try:
+                try:
+                    collection.create_indexes([IndexModel(spec['keys'], **options)])
+                except OperationFailure as e:
+                    if e.code != INDEX_OPTIONS_CONFLICT or not (ttl or note):
+                        raise
+                    # Same keys, different expiry: adjust it in place instead of rebuilding.
+                    # A deferred TTL leaves an expiry set by an earlier run as it is.
+                    if ttl:
+                        _set_ttl(db, collection_name, spec, ttl)
+                results.append({'collection': collection_name, 'name': spec['name'], 'ok': True, 'error': None,
+                                'note': note})
+            except OperationFailure as e:
+                results.append({'collection': collection_name, 'name': spec['name'], 'ok': False, 'error': str(e),
+                                'note': note})
+
+    if specs is INDEX_SPECS:
+        try:
+            drop_retired_indexes(db)
+        except OperationFailure as e:
+            results.append({'collection': '*', 'name': 'retired', 'ok': False, 'error': str(e)})
+
+    return results
+
+
+def _plan_stages(plan):
+    """Yield every stage name in an explain() plan tree"""
+    if isinstance(plan, dict):
+        if 'stage' in plan:
+            yield plan['stage']
+        for key in ('inputStage', 'queryPlan', 'winningPlan'):
+            if key in plan:
+                yield from _plan_stages(plan[key])
+        for child in plan.get('inputStages', []):
+            yield from _plan_stages(child)
+    elif isinstance(plan, list):
+        for child in plan:
+            yield from _plan_stages(child)
+
+
+def verify_indexes(db, queries=None):
+    """Explain each canonical query and flag collection scans.
+
+    Returns (ok, results) where results holds collection, filter, stages and ok per query.
+    """
+    queries = queries or CANONICAL_QUERIES
+    results = []
+
+    for query in queries:
+        cursor = db[query['collection']].find(query['filter'])
+        if query.get('sort'):
+            cursor = cursor.sort(query['sort'])
+        explain = cursor.limit(query.get('limit', 10)).explain()
+
+        winning_plan = explain.get('queryPlanner', {}).get('winningPlan', {})
+        stages = list(_plan_stages(winning_plan))
+        results.append({
+            'collection': query['collection'],
+            'filter': query['filter'],
+            'sort': query.get('sort'),
+            'stages': stages,
+            'ok': 'COLLSCAN' not in stages
+        })
+
+    return all(r['ok'] for r in results), results
@@ -1,21 +1,44 @@
 from datetime import datetime
 from bson import ObjectId
+from models.base import Model, field_slots, lazy_fields
 
-class Plan:
-    def __init__(self, data=None):
-        if data:
-            self._id = data.get('_id')
-            self.name = data.get('name')
-            self.description = data.get('description')
-            self.period_type = data.get('period_type', 'YEARLY')  # YEARLY, MONTHLY, CUSTOM
-            self.period_value = data.get('period_value', 1)  # Number of months/years
-            self.price = data.get('price', 0)
-            self.pdf_limit = data.get('pdf_limit', 0)
-            self.features = data.get('features', [])
-            self.is_active = data.get('is_active', True)
-            self.created_at = data.get('created_at', datetime.utcnow())
-            self.updated_at = data.get('updated_at', datetime.utcnow())
-            self.created_by = data.get('created_by')
+# (field, default) for every stored plan attribute, decoded lazily on first access.
+# Callable defaults are evaluated per instance; others are shared, so they must be immutable.
+FIELDS = (
+    ('name', None),
+    ('description', None),
+    ('period_type', 'YEARLY'),  # YEARLY, MONTHLY, CUSTOM
+    ('period_value', 1),  # Number of months/years
+    ('price', 0),
+    ('pdf_limit', 0),
+    ('features', list),
+    ('is_active', True),
+    ('created_at', datetime.utcnow),
+    ('updated_at', datetime.utcnow),
+    ('created_by', None)
+)
+
+# Named JSON views (see utils/serialization.py); 'default' is what the plans list API returns
+JSON_VIEWS = {
+    'default': (
+        'id', 'name', 'description', 'period_type', 'period_value',
+        ('period_display', lambda plan: plan.get_period_display()),
+        'price', 'pdf_limit', 'features', 'is_active', 'created_at'
+    ),
+    'option': (
+        'id', 'name',
+        ('period_display', lambda plan: plan.get_period_display()),
+        'price', 'pdf_limit'
+    ),
+    'ref': ('id', 'name')
+}
+
+@lazy_fields
+class Plan(Model):
+    __slots__ = field_slots(FIELDS)
+    
+    FIELDS = FIELDS
+    JSON_VIEWS = JSON_VIEWS
     
     def to_dict(self):
         return {
@@ -3,75 +3,144 @@
 
 from datetime import datetime
 from bson import ObjectId
-import bcrypt
+from models.base import Model, field_slots, lazy_fields
+from utils import passwords
+from utils.serialization import OMIT, serialize
 
-class User:
-    def __init__(self, data=None):
-        if data:
-            self._id = data.get('_id')
-            self.username = data.get('username')
-            self.email = data.get('email')
-            self.password = data.get('password')
-            self.full_name = data.get('full_name')
-            self.phone = data.get('phone')
-            self.role = data.get('role', 'AGENT')  # SUPER_ADMIN, PARTNER, AGENT
-            self.profile_image = data.get('profile_image')
-            self.is_active = data.get('is_active', True)
-            
-            # Partner-specific fields
-            self.partner_id = data.get('partner_id')  # For agents - which partner they belong to
-            self.assigned_plans = data.get('assigned_plans', [])  # For partners - plans they can use
-            self.assigned_coupons = data.get('assigned_coupons', [])  # For partners - coupons they can use
-            self.pdf_limit = data.get('pdf_limit', 0)  # Overall PDF limit for partner
-            self.pdf_generated = data.get('pdf_generated', 0)  # PDFs generated by partner's agents
-            
-            # Agent-specific fields
-            self.plan_id = data.get('plan_id')  # For agents
-            self.plan_start_date = data.get('plan_start_date')
-            self.plan_expiry_date = data.get('plan_expiry_date')
-            self.agent_pdf_generated = data.get('agent_pdf_generated', 0)
-            self.agent_pdf_limit = data.get('agent_pdf_limit', 0)
-            # Additional agent profile fields
-            self.salutation = data.get('salutation')
-            self.gender = data.get('gender')
-            self.city = data.get('city')
-            self.organization = data.get('organization')
-            self.professional_role = data.get('professional_role')
-            self.is_lic_advisor = data.get('is_lic_advisor', False)
-            self.sells_mutual_funds = data.get('sells_mutual_funds', False)
-            self.sells_health_insurance = data.get('sells_health_insurance', False)
-            self.sells_term_insurance = data.get('sells_term_insurance', False)
-            # Payment tracking fields
-            self.payment_confirmed = data.get('payment_confirmed', False)
-            self.payment_proof = data.get('payment_proof')  # Filename of payment proof
-            self.payment_date = data.get('payment_date')
-            self.payment_amount = data.get('payment_amount')
-            self.payment_method = data.get('payment_method')
-            self.payment_reference = data.get('payment_reference')
-            self.plan_price_paid = data.get('plan_price_paid')  # Actual price paid after discount
-            self.plan_coupon_used = data.get('plan_coupon_used')  # Coupon code used
-            
-            # Approval fields
-            self.approval_status = data.get('approval_status', 'PENDING')  # PENDING, PARTNER_APPROVED, APPROVED, REJECTED
-            self.requires_double_approval = data.get('requires_double_approval', True)
-            self.partner_approved = data.get('partner_approved', False)
-            self.partner_approved_at = data.get('partner_approved_at')
-            self.partner_approved_by = data.get('partner_approved_by')
-            self.super_admin_approved = data.get('super_admin_approved', False)
-            self.super_admin_approved_at = data.get('super_admin_approved_at')
-            self.super_admin_approved_by = data.get('super_admin_approved_by')
-            self.rejection_reason = data.get('rejection_reason')
-            
-            # Registration link tracking
-            self.registration_link = data.get('registration_link')
-            self.registered_via_link = data.get('registered_via_link')
-            self.registration_link_sent_by = data.get('registration_link_sent_by')
-            
-            # Timestamps
-            self.created_at = data.get('created_at', datetime.utcnow())
-            self.updated_at = data.get('updated_at', datetime.utcnow())
-            self.last_login = data.get('last_login')
-            self.created_by = data.get('created_by')
+# (field, default) for every stored user attribute, decoded lazily on first access.
+# Callable defaults are evaluated per instance; others are shared, so they must be immutable.
+FIELDS = (
+    ('username', None),
+    ('email', None),
+    ('password', None),
+    ('full_name', None),
+    ('phone', None),
+    ('role', 'AGENT'),  # SUPER_ADMIN, PARTNER, AGENT
+    ('profile_image', None),
+    ('is_active', True),
+
+    # Partner-specific fields
+    ('partner_id', None),  # For agents - which partner they belong to
+    ('assigned_plans', list),  # For partners - plans they can use
+    ('assigned_coupons', list),  # For partners - coupons they can use
+    ('pdf_limit', 0),  # Overall PDF limit for partner
+    ('pdf_generated', 0),  # PDFs generated by partner's agents
+
+    # Agent-specific fields
+    ('plan_id', None),  # For agents
+    ('plan_start_date', None),
+    ('plan_expiry_date', None),
+    ('plan_status', None),  # ACTIVE, EXPIRED (set by the plan expiry sweeper)
+    ('plan_expired_at', None),
+    ('plan_expiry_notice', None),  # Last expiry email queued: EXPIRING, EXPIRED
+    ('agent_pdf_generated', 0),
+    ('agent_pdf_limit', 0),
+    # Additional agent profile fields
+    ('salutation', None),
+    ('gender', None),
+    ('city', None),
+    ('organization', None),
+    ('professional_role', None),
+    ('is_lic_advisor', False),
+    ('sells_mutual_funds', False),
+    ('sells_health_insurance', False),
+    ('sells_term_insurance', False),
+    # Payment tracking fields
+    ('payment_confirmed', False),
+    ('payment_proof', None),  # Filename of payment proof
+    ('payment_date', None),
+    ('payment_amount', None),
+    ('payment_method', None),
+    ('payment_reference', None),
+    ('plan_price_paid', None),  # Actual price paid after discount
+    ('plan_coupon_used', None),  # Coupon code used
+
+    # Approval fields
+    ('approval_status', 'PENDING'),  # PENDING, PARTNER_APPROVED, APPROVED, REJECTED
+    ('requires_double_approval', True),
+    ('partner_approved', False),
+    ('partner_approved_at', None),
+    ('partner_approved_by', None),
+    ('super_admin_approved', False),
+    ('super_admin_approved_at', None),
+    ('super_admin_approved_by', None),
+    ('rejection_reason', None),
+
+    # Registration link tracking
+    ('registration_link', None),
+    ('registered_via_link', None),
+    ('registration_link_sent_by', None),
+
+    # Timestamps
+    ('created_at', datetime.utcnow),
+    ('updated_at', datetime.utcnow),
+    ('last_login', None),
+    ('created_by', None)
+)
+
+# Named projections per view. None means the full document.
+PROJECTIONS = {
+    # List pages and the users list API
+    'list_row': {name: 1 for name in (
+        'username', 'email', 'full_name', 'phone', 'role', 'profile_image', 'is_active',
+        'partner_id', 'plan_id', 'plan_expiry_date', 'pdf_limit', 'pdf_generated',
+        'agent_pdf_generated', 'agent_pdf_limit', 'assigned_plans', 'assigned_coupons',
+        'approval_status', 'requires_double_approval', 'partner_approved', 'super_admin_approved',
+        'rejection_reason', 'payment_confirmed', 'payment_amount', 'payment_proof', 'created_at'
+    )},
+    # A related user shown by name (an agent's partner, partner dropdowns)
+    'ref': {'username': 1, 'full_name': 1, 'role': 1},
+    # Password check and can_login()
+    'auth': {name: 1 for name in (
+        'username', 'email', 'password', 'full_name', 'role', 'is_active', 'partner_id',
+        'approval_status', 'requires_double_approval', 'partner_approved', 'super_admin_approved',
+        'rejection_reason'
+    )},
+    # The logged-in user (everything but the password hash)
+    'session': {'password': 0},
+    'detail': None
+}
+
+
+def _agent_field(name):
+    """JSON getter for an agent-only field (left out for other roles)"""
+    def getter(user):
+        return getattr(user, name) if user.role == 'AGENT' else OMIT
+    return getter
+
+
+def _agent_related(name):
+    """JSON getter for an attached partner/plan (left out when not loaded)"""
+    def getter(user):
+        related = getattr(user, name, None) if user.role == 'AGENT' else None
+        return serialize(related, 'ref') if related else OMIT
+    return getter
+
+
+# Named JSON views (see utils/serialization.py); 'default' is what the users list API returns
+JSON_VIEWS = {
+    'default': (
+        'id', 'username', 'email', 'full_name', 'role', 'is_active', 'approval_status', 'created_at',
+        ('partner_id', _agent_field('partner_id')),
+        ('pdf_generated', _agent_field('agent_pdf_generated')),
+        ('pdf_limit', _agent_field('agent_pdf_limit')),
+        ('partner', _agent_related('partner')),
+        ('plan', _agent_related('plan'))
+    ),
+    'ref': ('id', 'username', 'full_name'),
+    'payment': (
+        'payment_confirmed', 'payment_amount', 'payment_method', 'payment_reference', 'payment_date',
+        'payment_proof', 'plan_price_paid', 'plan_coupon_used'
+    )
+}
+
+@lazy_fields
+class User(Model):
+    __slots__ = field_slots(FIELDS, extra=('partner', 'plan'))
+    
+    FIELDS = FIELDS
+    PROJECTIONS = PROJECTIONS
+    JSON_VIEWS = JSON_VIEWS
     
     def to_dict(self):
         return {
@@ -91,6 +160,7 @@ class User:
             'plan_id': self.plan_id,
             'plan_start_date': self.plan_start_date,
             'plan_expiry_date': self.plan_expiry_date,
+            'plan_status': self.plan_status,
             'agent_pdf_generated': self.agent_pdf_generated,
             'agent_pdf_limit': self.agent_pdf_limit,
             'salutation': self.salutation,
@@ -128,11 +198,16 @@ class User:
     
     @staticmethod
     def hash_password(password):
-        return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+        return passwords.hash_password(password)
     
     @staticmethod
     def verify_password(password, hashed):
-        return bcrypt.checkpw(password.encode('utf-8'), hashed)
+        return passwords.verify_password(password, hashed)
+    
+    @classmethod
+    def projection(cls, view):
+        """Projection document for a named view (None fetches every field)"""
+        return cls.PROJECTIONS[view]
     
     @property
     def id(self):
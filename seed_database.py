@@ -5,12 +5,12 @@ import os
 import sys
 from datetime import datetime, timedelta
 from bson import ObjectId
-from pymongo import MongoClient
 
 # Add the current directory to the Python path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from config import config
+from models.connection import mongo_registry
 from models.user import User
 from models.plan import Plan
 from models.coupon import Coupon
@@ -26,9 +26,14 @@ def clear_existing_data(db):
     # Clear all other collections
     db.plans.delete_many({})
     db.coupons.delete_many({})
+    db.coupon_partner_limits.delete_many({})
+    db.coupon_redemptions.delete_many({})
     db.activities.delete_many({})
     db.registration_links.delete_many({})
     
+    # Dashboard counters are rebuilt from source data on next read
+    db.stats.delete_many({})
+    
     print("Existing data cleared (super admin preserved)")
 
 def create_plans(db):
@@ -169,7 +174,6 @@ def create_coupons(db):
             'valid_until': datetime.utcnow() + timedelta(days=180),
             'is_active': True,
             'applicable_plans': [],
-            'partner_limits': {},  # Will be updated with partner IDs
             'created_at': datetime.utcnow(),
             'updated_at': datetime.utcnow()
         },
@@ -267,18 +271,15 @@ def create_partners(db, plan_ids, coupon_ids):
         partner_ids.append(result.inserted_id)
         print(f"  Created partner: {partner_data['username']} - {partner_data['full_name']}")
     
-    # Update partner limits for PARTNER30 coupon
-    db.coupons.update_one(
-        {'code': 'PARTNER30'},
-        {
-            '$set': {
-                'partner_limits': {
-                    str(partner_ids[0]): {'limit': 50, 'used': 5},
-                    str(partner_ids[1]): {'limit': 100, 'used': 20}
-                }
-            }
-        }
-    )
+    # Partner limits for PARTNER30 coupon
+    partner30 = db.coupons.find_one({'code': 'PARTNER30'}, {'_id': 1})
+    now = datetime.utcnow()
+    db.coupon_partner_limits.insert_many([
+        {'coupon_id': partner30['_id'], 'partner_id': partner_ids[0], 'limit': 50, 'used': 5,
+         'created_at': now, 'updated_at': now},
+        {'coupon_id': partner30['_id'], 'partner_id': partner_ids[1], 'limit': 100, 'used': 20,
+         'created_at': now, 'updated_at': now}
+    ])
     
     return partner_ids
 
@@ -463,9 +464,7 @@ def main():
     # Connect to MongoDB
     config_name = os.getenv('FLASK_ENV', 'development')
     app_config = config[config_name]
-    client = MongoClient(app_config.MONGO_URI)
-    db_name = app_config.MONGO_URI.split('/')[-1]
-    db = client[db_name]
+    db = mongo_registry.get_database(app_config.MONGO_URI)
     
     # Clear existing data
     clear_existing_data(db)
@@ -502,7 +501,7 @@ def main():
     print("  EXPIRED10 - Expired coupon")
     print("="*50)
     
-    client.close()
+    mongo_registry.close()
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
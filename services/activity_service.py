@@ -0,0 +1,299 @@
+# services/activity_service.py
+# Activity feed queries, denormalized actor fields, and daily rollups of raw activities
+
+import logging
+from datetime import datetime, timedelta
+from bson import ObjectId
+from pymongo import UpdateMany
+from models import get_db, get_users_collection, get_activities_collection, get_activity_rollups_collection
+from models.indexes import ACTIVITY_HISTORY_BACKFILL_ID
+
+logger = logging.getLogger(__name__)
+
+
+def _day_start(dt):
+    return datetime(dt.year, dt.month, dt.day)
+
+
+def rollup_pipeline(start, end):
+    """Group raw activities in [start, end) into one document per (day, user, type), merged into activity_rollups"""
+    return [
+        {'$match': {'created_at': {'$gte': start, '$lt': end}}},
+        {'$group': {
+            '_id': {
+                'day': {'$dateFromParts': {
+                    'year': {'$year': '$created_at'},
+                    'month': {'$month': '$created_at'},
+                    'day': {'$dayOfMonth': '$created_at'}
+                }},
+                'user_id': '$user_id',
+                'activity_type': '$activity_type'
+            },
+            'count': {'$sum': 1},
+            'username': {'$last': '$username'},
+            'partner_id': {'$last': '$partner_id'},
+            'first_at': {'$min': '$created_at'},
+            'last_at': {'$max': '$created_at'}
+        }},
+        {'$addFields': {
+            'day': '$_id.day',
+            'user_id': '$_id.user_id',
+            'activity_type': '$_id.activity_type',
+            'updated_at': '$$NOW'
+        }},
+        # Re-rolling a day replaces its documents, so runs are idempotent
+        {'$merge': {
+            'into': 'activity_rollups',
+            'on': '_id',
+            'whenMatched': 'replace',
+            'whenNotMatched': 'insert'
+        }}
+    ]
+
+
+def activity_actor(user_id, actor=None):
+    """Return (username, partner_id) to stamp on an activity written by user_id.
+
+    partner_id is the partner whose feed should show the activity: the
+    partner themself, or an agent's partner. `actor` is the acting user's
+    document or User when the caller already holds it; otherwise the
+    logged-in user is used when it is the actor, and the user session cache
+    as a last resort.
+    """
+    from flask import has_request_context
+    from flask_login import current_user
+    from services.user_session_cache import user_session_cache
+
+    if user_id is None:
+        return None, None
+
+    if actor is not None:
+        if not isinstance(actor, dict):
+            actor = {'username': actor.username, 'role': actor.role, 'partner_id': actor.partner_id}
+        user = dict(actor, _id=user_id)
+    elif has_request_context() and current_user.is_authenticated and current_user._id == user_id:
+        user = {'username': current_user.username, 'role': current_user.role,
+                'partner_id': current_user.partner_id, '_id': current_user._id}
+    else:
+        user = user_session_cache.get(user_id)
+
+    if not user:
+        return None, None
+
+    return user.get('username'), _partner_scope(user)
+
+
+def _partner_scope(user):
+    if user.get('role') == 'PARTNER':
+        return user['_id']
+    if user.get('role') == 'AGENT':
+        return user.get('partner_id')
+    return None
+
+
+class ActivityService:
+    def __init__(self):
+        self.activities = get_activities_collection()
+        self.rollups = get_activity_rollups_collection()
+        self.users = get_users_collection()
+
+    def feed_query(self, user):
+        """Filter for the activities a user may see"""
+        if user.is_partner():
+            # Activities of the partner and their agents, stamped at write time
+            return {'partner_id': user._id}
+        if user.is_agent():
+            return {'user_id': user._id}
+        return {}
+
+    def get_recent_activities(self, user, limit=10):
+        """Latest activities visible to a user, in one aggregation"""
+        pipeline = [
+            {'$match': self.feed_query(user)},
+            {'$sort': {'created_at': -1}},
+            {'$limit': limit},
+            # Only rows written before usernames were stamped join to users
+            {'$addFields': {'_legacy_user_id': {
+                '$cond': [{'$eq': [{'$type': '$username'}, 'missing']}, '$user_id', None]
+            }}},
+            {'$lookup': {
+                'from': 'users',
+                'localField': '_legacy_user_id',
+                'foreignField': '_id',
+                'as': '_user'
+            }},
+            {'$project': {
+                'activity_type': 1,
+                'description': 1,
+                'created_at': 1,
+                'username': {'$ifNull': ['$username', {'$arrayElemAt': ['$_user.username', 0]}]}
+            }}
+        ]
+        return list(self.activities.aggregate(pipeline))
+
+    def backfill_actor_fields(self, batch_size=500):
+        """Stamp username and partner_id on activities written before they were recorded.
+
+        Returns the number of activity documents updated.
+        """
+        user_ids = self.activities.distinct('user_id', {'username': {'$exists': False}})
+        updated = 0
+
+        for start in range(0, len(user_ids), batch_size):
+            chunk = [uid for uid in user_ids[start:start + batch_size] if isinstance(uid, ObjectId)]
+            operations = []
+            for user in self.users.find({'_id': {'$in': chunk}}, {'username': 1, 'role': 1, 'partner_id': 1}):
+                fields = {'username': user.get('username')}
+                partner_id = _partner_scope(user)
+                if partner_id:
+                    fields['partner_id'] = partner_id
+                operations.append(UpdateMany(
+                    {'user_id': user['_id'], 'username': {'$exists': False}},
+                    {'$set': fields}
+                ))
+            if operations:
+                updated += self.activities.bulk_write(operations, ordered=False).modified_count
+
+        # Activities logged with a null partner_id would otherwise sit in the sparse index
+        result = self.activities.update_many({'partner_id': {'$type': 'null'}}, {'$unset': {'partner_id': ''}})
+        updated += result.modified_count
+
+        # Super admin actions on a partner's records carried the partner only in metadata
+        result = self.activities.update_many(
+            {'partner_id': {'$exists': False}, 'metadata.partner_id': {'$regex': '^[0-9a-fA-F]{24}$'}},
+            [{'$set': {'partner_id': {'$toObjectId': '$metadata.partner_id'}}}]
+        )
+        return updated + result.modified_count
+
+    def rollup(self, days=2, retention_days=None, now=None):
+        """Roll up the last `days` UTC days (today included) into activity_rollups.
+
+        Days whose raw records may already be expiring (older than
+        retention_days - 1) are skipped so a re-run never shrinks a rollup.
+        Returns the list of day starts that were rolled up.
+        """
+        now = now or datetime.utcnow()
+        today = _day_start(now)
+        oldest = today - timedelta(days=max(days, 1) - 1)
+        if retention_days:
+            oldest = max(oldest, today - timedelta(days=retention_days - 1))
+
+        rolled = []
+        day = oldest
+        while day <= today:
+            # One $merge per day keeps each run's working set small
+            self.activities.aggregate(rollup_pipeline(day, day + timedelta(days=1)))
+            rolled.append(day)
+            day += timedelta(days=1)
+        return rolled
+
+    def rollup_history(self, retention_days=None, now=None):
+        """Roll up every day of raw history, with no retention clamp, and record the backfill.
+
+        The activities TTL index is only applied once the backfill is recorded,
+        so nothing expires before it has been rolled up. Days outside the
+        retention window that already have rollups are left alone (an earlier
+        TTL may have expired part of their raw records). Returns the day starts
+        that were rolled up.
+        """
+        now = now or datetime.utcnow()
+        today = _day_start(now)
+        first = self.activities.find_one({}, {'created_at': 1}, sort=[('created_at', 1)])
+
+        rolled = []
+        if first and isinstance(first.get('created_at'), datetime):
+            done = set()
+            if retention_days:
+                keep_from = today - timedelta(days=retention_days - 1)
+                done = set(self.rollups.distinct('day', {'day': {'$lt': keep_from}}))
+            day = _day_start(first['created_at'])
+            while day <= today:
+                if day not in done:
+                    self.activities.aggregate(rollup_pipeline(day, day + timedelta(days=1)))
+                    rolled.append(day)
+                day += timedelta(days=1)
+
+        self.rollups.update_one(
+            {'_id': ACTIVITY_HISTORY_BACKFILL_ID},
+            {'$set': {'completed_at': now, 'days_rolled': len(rolled)}},
+            upsert=True
+        )
+        return rolled
+
+    def history_backfilled(self):
+        return self.rollups.find_one({'_id': ACTIVITY_HISTORY_BACKFILL_ID}, {'_id': 1}) is not None
+
+    def get_activity_summary(self, user, days=30, now=None):
+        """Per-day activity counts by type for the last `days` days.
+
+        Completed days come from activity_rollups; today is counted from the
+        raw collection so it is always current.
+        """
+        now = now or datetime.utcnow()
+        today = _day_start(now)
+        start = today - timedelta(days=max(days, 1) - 1)
+        scope = self.feed_query(user)
+
+        rows = list(self.rollups.aggregate([
+            {'$match': dict(scope, day={'$gte': start, '$lt': today})},
+            {'$group': {'_id': {'day': '$day', 'activity_type': '$activity_type'}, 'count': {'$sum': '$count'}}}
+        ]))
+        rows += [
+            {'_id': {'day': today, 'activity_type': row['_id']}, 'count': row['count']}
+            for row in self.activities.aggregate([
+                {'$match': dict(scope, created_at={'$gte': today})},
+                {'$group': {'_id': '$activity_type', 'count': {'$sum': 1}}}
+            ])
+        ]
+
+        by_day = {}
+        totals = {}
+        for row in rows:
+            day = row['_id']['day'].strftime('%Y-%m-%d')
+            activity_type = row['_id']['activity_type'] or 'UNKNOWN'
+            counts = by_day.setdefault(day, {})
+            counts[activity_type] = counts.get(activity_type, 0) + row['count']
+            totals[activity_type] = totals.get(activity_type, 0) + row['count']
+
+        series = []
+        day = start
+        while day <= today:
+            key = day.strftime('%Y-%m-%d')
+            counts = by_day.get(key, {})
+            series.append({'day': key, 'counts': counts, 'total': sum(counts.values())})
+            day += timedelta(days=1)
+
+        return {'days': series, 'totals': totals}
+
+
+def ensure_activity_ttl(db):
+    """(Re)apply the activities indexes, turning on the TTL once the history backfill is recorded"""
+    from models.indexes import INDEX_SPECS, ensure_indexes
+    return ensure_indexes(db, {'activities': INDEX_SPECS['activities']})
+
+
+def start_rollup_task(app, socketio):
+    """Periodically roll up recent activities in a SocketIO background task"""
+    interval = app.config.get('ACTIVITY_ROLLUP_INTERVAL', 3600)
+    if not interval:
+        return
+
+    retention_days = app.config.get('ACTIVITY_RETENTION_DAYS')
+
+    def run():
+        while True:
+            try:
+                with app.app_context():
+                    service = ActivityService()
+                    if not service.history_backfilled():
+                        # First run: roll up all existing history, then let the TTL index expire raw records
+                        service.rollup_history(retention_days=retention_days)
+                        ensure_activity_ttl(get_db())
+                    else:
+                        days = app.config.get('ACTIVITY_ROLLUP_LOOKBACK_DAYS', 2)
+                        service.rollup(days=days, retention_days=retention_days)
+            except Exception as e:
+                logger.warning(f"Activity rollup failed: {e}")
+            socketio.sleep(interval)
+
+    socketio.start_background_task(run)
@@ -0,0 +1,203 @@
+# services/activity_writer.py
+# Buffered activity log writer: requests enqueue, a background greenlet batches inserts
+
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import deque
+from pymongo.errors import BulkWriteError, PyMongoError
+from pymongo.write_concern import WriteConcern
+from models.connection import mongo_registry
+
+logger = logging.getLogger(__name__)
+
+OVERFLOW_POLICIES = ('drop_oldest', 'drop_newest', 'sync')
+
+
+def parse_write_concern(value, journal=None):
+    """'majority', '0', '1', ... -> WriteConcern"""
+    value = str(value if value is not None else 1).strip()
+    w = int(value) if value.isdigit() else value
+    return WriteConcern(w=w, j=journal if w != 0 else None)
+
+
+class ActivityWriter:
+    """Queue activity documents in process and flush them with insert_many.
+
+    A batch is flushed when `batch_size` records are waiting or
+    `flush_interval` seconds have passed since the last flush. The queue holds
+    at most `max_queue` records; past that the overflow policy decides:
+    drop_oldest, drop_newest, or sync (insert the record inline). Anything
+    left is flushed at interpreter shutdown.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._queue = deque()
+        self._socketio = None
+        self._uri = None
+        self._pid = None
+        self._running = False
+        self.enabled = False
+        self.batch_size = 100
+        self.flush_interval = 1.0
+        self.max_queue = 10000
+        self.overflow_policy = 'drop_oldest'
+        self.write_concern = WriteConcern(w=1)
+        self._reset_counters()
+        atexit.register(self.shutdown)
+
+    def _reset_counters(self):
+        self.enqueued = 0
+        self.flushed = 0
+        self.dropped = 0
+        self.failed = 0
+        self.batches = 0
+        self.last_flush_at = None
+        self.last_error = None
+
+    def init_app(self, app, socketio):
+        """Configure from the Flask config; the flush loop starts on first use"""
+        config = app.config
+        self._socketio = socketio
+        self._uri = config['MONGO_URI']
+        self.enabled = config.get('ACTIVITY_WRITER_ENABLED', True)
+        self.batch_size = config.get('ACTIVITY_BATCH_SIZE', 100)
+        self.flush_interval = config.get('ACTIVITY_FLUSH_INTERVAL', 1.0)
+        self.max_queue = config.get('ACTIVITY_QUEUE_MAX', 10000)
+        self.overflow_policy = config.get('ACTIVITY_OVERFLOW_POLICY', 'drop_oldest')
+        if self.overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"ACTIVITY_OVERFLOW_POLICY must be one of {', '.join(OVERFLOW_POLICIES)}")
+        self.write_concern = parse_write_concern(
+            config.get('ACTIVITY_WRITE_CONCERN', 1),
+            config.get('ACTIVITY_WRITE_CONCERN_J')
+        )
+        app.extensions['activity_writer'] = self
+
+    def _collection(self):
+        return mongo_registry.get_database(self._uri).get_collection(
+            'activities', write_concern=self.write_concern
+        )
+
+    def _ensure_started(self):
+        pid = os.getpid()
+        if self._running and self._pid == pid:
+            return
+
+        with self._lock:
+            if self._running and self._pid == pid:
+                return
+            if self._pid != pid:
+                # A forked worker starts with an empty queue and its own loop
+                self._queue.clear()
+                self._reset_counters()
+            self._pid = pid
+            self._running = True
+        self._socketio.start_background_task(self._run)
+
+    def enqueue(self, activity):
+        """Queue one activity document.
+
+        Returns False when the writer is not configured, in which case the
+        caller should write the record itself.
+        """
+        if not self.enabled or self._socketio is None:
+            return False
+
+        self._ensure_started()
+
+        with self._lock:
+            full = len(self._queue) >= self.max_queue
+            if full and self.overflow_policy == 'drop_newest':
+                self.dropped += 1
+                return True
+            if full and self.overflow_policy == 'drop_oldest':
+                self._queue.popleft()
+                self.dropped += 1
+                full = False
+            if not full:
+                self._queue.append(activity)
+                self.enqueued += 1
+                return True
+
+        # 'sync' overflow policy: the queue is full, write this record inline
+        self._write([activity])
+        return True
+
+    def _run(self):
+        last_flush = time.monotonic()
+        poll = min(self.flush_interval, 0.1)
+        while self._running and self._pid == os.getpid():
+            self._socketio.sleep(poll)
+            due = time.monotonic() - last_flush >= self.flush_interval
+            if len(self._queue) >= self.batch_size or (due and self._queue):
+                self.flush()
+                last_flush = time.monotonic()
+            elif due:
+                last_flush = time.monotonic()
+
+    def _take_batch(self):
+        with self._lock:
+            count = min(self.batch_size, len(self._queue))
+            return [self._queue.popleft() for _ in range(count)]
+
+    def flush(self):
+        """Write everything queued so far. Returns the number of records inserted."""
+        inserted = 0
+        while True:
+            batch = self._take_batch()
+            if not batch:
+                return inserted
+            inserted += self._write(batch)
+
+    def _write(self, batch):
+        try:
+            self._collection().insert_many(batch, ordered=False)
+            written = len(batch)
+        except BulkWriteError as e:
+            written = e.details.get('nInserted', 0)
+            self._record_error(len(batch) - written, e)
+        except PyMongoError as e:
+            written = 0
+            self._record_error(len(batch), e)
+
+        with self._lock:
+            self.flushed += written
+            self.batches += 1
+            self.last_flush_at = time.time()
+        return written
+
+    def _record_error(self, count, error):
+        with self._lock:
+            self.failed += count
+            self.last_error = str(error)
+        logger.warning(f"Activity writer lost {count} record(s): {error}")
+
+    def shutdown(self):
+        """Stop the flush loop and write whatever is still queued"""
+        self._running = False
+        if self._queue and self._pid == os.getpid():
+            self.flush()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'running': self._running,
+                'queued': len(self._queue),
+                'max_queue': self.max_queue,
+                'overflow_policy': self.overflow_policy,
+                'write_concern': self.write_concern.document,
+                'enqueued': self.enqueued,
+                'flushed': self.flushed,
+                'dropped': self.dropped,
+                'failed': self.failed,
+                'batches': self.batches,
+                'last_flush_at': self.last_flush_at,
+                'last_error': self.last_error
+            }
+
+
+activity_writer = ActivityWriter()
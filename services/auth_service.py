@@ -5,6 +5,8 @@ from datetime import datetime
 from models import get_users_collection
 from models.user import User
 from utils.helpers import log_activity
+from services.user_session_cache import user_session_cache
+from utils import passwords
 from bson import ObjectId
 
 class AuthService:
@@ -19,7 +21,7 @@ class AuthService:
                 {'username': username},
                 {'email': username}
             ]
-        })
+        }, User.projection('auth'))
         
         if not user_data:
             return None, "Invalid username or password"
@@ -47,12 +49,21 @@ class AuthService:
             {'$set': {'last_login': datetime.utcnow()}}
         )
         
+        # Upgrade the stored hash if its cost is not the configured one. Only the
+        # hash just verified is replaced, so a concurrent password change wins.
+        if passwords.needs_rehash(user.password):
+            self.users.update_one(
+                {'_id': user_data['_id'], 'password': user.password},
+                {'$set': {'password': User.hash_password(password)}}
+            )
+        
         # Log activity
         log_activity(
             user.id,
             'LOGIN',
             f'User {user.username} logged in',
-            {'ip': None}  # Can be enhanced to capture IP
+            {'ip': None},  # Can be enhanced to capture IP
+            actor=user
         )
         
         return user, None
@@ -84,11 +95,14 @@ class AuthService:
             }
         )
         
+        user_session_cache.invalidate(user_id)
+        
         # Log activity
         log_activity(
             user_id,
             'PASSWORD_CHANGE',
-            'Password changed successfully'
+            'Password changed successfully',
+            actor=user
         )
         
         return True, "Password changed successfully"
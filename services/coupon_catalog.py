@@ -0,0 +1,88 @@
+# services/coupon_catalog.py
+# In-process coupon catalog for read-only price quotes (short TTL, cleared on coupon writes)
+
+from models.connection import mongo_registry
+from models.coupon import Coupon
+from utils.cache import TTLCache
+
+# Everything a quote needs: validity, usage and discount terms (partner limits are added from
+# coupon_partner_limits)
+QUOTE_PROJECTION = {name: 1 for name in (
+    'code', 'is_active', 'valid_from', 'valid_until', 'usage_limit', 'used_count', 'discount_type',
+    'discount_value', 'min_purchase_amount', 'max_discount_amount', 'applicable_plans'
+)}
+
+# Cached for codes that do not exist, so mistyped codes are not a read each time
+_UNKNOWN = False
+
+
+class CouponCatalog:
+    """Coupons by code for quoting discounts without touching the database.
+
+    Quotes may be up to `ttl` seconds stale (another worker's redemptions or
+    edits); CouponService.redeem() re-checks everything atomically, so a stale
+    quote can never over-redeem. Writes made through CouponService clear this
+    process's catalog immediately.
+    """
+
+    def __init__(self):
+        self.local = TTLCache(maxsize=1024, ttl=30)
+        self.enabled = True
+        self._uri = None
+        self.db_loads = 0
+
+    def init_app(self, app):
+        config = app.config
+        self._uri = config['MONGO_URI']
+        self.enabled = config.get('COUPON_CATALOG_ENABLED', True)
+        self.local.maxsize = config.get('COUPON_CATALOG_MAX_ENTRIES', self.local.maxsize)
+        self.local.ttl = config.get('COUPON_CATALOG_TTL', self.local.ttl)
+        app.extensions['coupon_catalog'] = self
+
+    def _db(self):
+        return mongo_registry.get_database(self._uri)
+
+    def _load(self, code):
+        self.db_loads += 1
+        db = self._db()
+        data = db['coupons'].find_one({'code': code}, QUOTE_PROJECTION)
+        if not data:
+            return _UNKNOWN
+
+        data['partner_limits'] = {
+            str(doc['partner_id']): {'limit': doc['limit'], 'used': doc.get('used', 0)}
+            for doc in db['coupon_partner_limits'].find(
+                {'coupon_id': data['_id']},
+                {'partner_id': 1, 'limit': 1, 'used': 1}
+            )
+        }
+        return data
+
+    def get(self, code):
+        """Return the Coupon for a code, or None if there is no such coupon"""
+        code = (code or '').strip().upper()
+        if not code:
+            return None
+
+        data = self.local.get(code) if self.enabled else None
+        if data is None:
+            data = self._load(code)
+            if self.enabled:
+                self.local.set(code, data)
+
+        return Coupon(data) if data is not _UNKNOWN else None
+
+    def invalidate(self, code=None):
+        """Drop one code, or the whole catalog when no code is given"""
+        if code:
+            self.local.delete(code.strip().upper())
+        else:
+            self.local.clear()
+
+    def stats(self):
+        stats = self.local.stats()
+        stats.update({'enabled': self.enabled, 'db_loads': self.db_loads})
+        return stats
+
+
+coupon_catalog = CouponCatalog()
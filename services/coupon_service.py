@@ -1,17 +1,201 @@
 # services/coupon_service.py
-# Enhanced coupon service with partner restrictions
+# Enhanced coupon service with partner restrictions, per-partner limits and a redemption ledger
 
 from datetime import datetime
 from bson import ObjectId
-from models import get_coupons_collection, get_users_collection
+import csv
+import io
+from pymongo import ReturnDocument, UpdateOne, DeleteOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, PyMongoError
+from models import (get_coupons_collection, get_users_collection, get_coupon_redemptions_collection,
+                    get_coupon_partner_limits_collection)
 from models.coupon import Coupon
 from models.user import User
 from utils.helpers import log_activity
+from services.stats_service import StatsService
+from services.coupon_catalog import coupon_catalog
+from services.user_session_cache import user_session_cache
+from utils.pagination import keyset_paginate
+from models.base import raw_collection
+
+# Server error code for a unique index violation (coupons.code_unique)
+DUPLICATE_KEY = 11000
+
+# Bulk generation: codes per insert_many, and rounds of regenerating collided codes
+CAMPAIGN_BATCH_SIZE = 1000
+CAMPAIGN_MAX_RETRIES = 5
+
+# Accepted campaign code lengths (random part) and longest code prefix
+CAMPAIGN_MIN_CODE_LENGTH = 6
+CAMPAIGN_MAX_CODE_LENGTH = 32
+CAMPAIGN_MAX_PREFIX_LENGTH = 16
+
+# Columns of the campaign codes CSV export, and rows per streamed chunk
+CAMPAIGN_CSV_CHUNK_ROWS = 500
+CAMPAIGN_CSV_FIELDS = [
+    'code', 'name', 'discount_type', 'discount_value', 'min_purchase_amount', 'max_discount_amount',
+    'usage_limit', 'used_count', 'valid_from', 'valid_until', 'is_active'
+]
+
+# Form fields carrying a partner's limit on the coupon edit page: partner_limit_<partner_id>
+PARTNER_LIMIT_FIELD_PREFIX = 'partner_limit_'
+
+# Redemption outcome codes, with the message shown to users
+REDEMPTION_MESSAGES = {
+    'OK': "Coupon applied successfully",
+    'INACTIVE': "Coupon is not active",
+    'NOT_YET_VALID': "Coupon is not yet valid",
+    'EXPIRED': "Coupon has expired",
+    'USAGE_LIMIT': "Coupon usage limit exceeded",
+    'NOT_ASSIGNED': "This coupon is not available for your account",
+    'PARTNER_LIMIT': "Partner usage limit exceeded for this coupon",
+    'NOT_APPLICABLE': "Coupon not applicable for this purchase"
+}
+
+
+def _discount_expr(amount):
+    """Aggregation expression mirroring Coupon.calculate_discount (plan check excluded)"""
+    percentage = {'$multiply': [amount, {'$divide': [{'$ifNull': ['$discount_value', 0]}, 100]}]}
+    return {'$cond': [
+        {'$lt': [amount, {'$ifNull': ['$min_purchase_amount', 0]}]},
+        0,
+        {'$cond': [
+            {'$eq': ['$discount_type', 'PERCENTAGE']},
+            {'$let': {
+                'vars': {'discount': percentage},
+                'in': {'$cond': [
+                    {'$gt': [{'$ifNull': ['$max_discount_amount', 0]}, 0]},
+                    {'$min': ['$$discount', '$max_discount_amount']},
+                    '$$discount'
+                ]}
+            }},
+            {'$min': [{'$ifNull': ['$discount_value', 0]}, amount]}
+        ]}
+    ]}
+
+
+def _redemption_checks(amount, plan_id=None, assigned_coupons=None, now=None):
+    """(condition, reason) pairs, in order; a coupon is redeemable when none holds"""
+    checks = [
+        ({'$ne': ['$is_active', True]}, 'INACTIVE'),
+        ({'$gt': [{'$ifNull': ['$valid_from', now]}, now]}, 'NOT_YET_VALID'),
+        ({'$lt': [{'$ifNull': ['$valid_until', now]}, now]}, 'EXPIRED'),
+        ({'$and': [
+            {'$gt': [{'$ifNull': ['$usage_limit', 0]}, 0]},
+            {'$gte': [{'$ifNull': ['$used_count', 0]}, '$usage_limit']}
+        ]}, 'USAGE_LIMIT')
+    ]
+    if assigned_coupons is not None:
+        checks.append(({'$not': [{'$in': ['$_id', list(assigned_coupons)]}]}, 'NOT_ASSIGNED'))
+    if plan_id:
+        checks.append(({'$and': [
+            {'$gt': [{'$size': {'$ifNull': ['$applicable_plans', []]}}, 0]},
+            {'$not': [{'$in': [plan_id, {'$ifNull': ['$applicable_plans', []]}]}]}
+        ]}, 'NOT_APPLICABLE'))
+    checks.append(({'$lte': [_discount_expr(amount), 0]}, 'NOT_APPLICABLE'))
+    return checks
+
+
+def redemption_filter(code, amount, plan_id=None, assigned_coupons=None, now=None):
+    """Filter matching the coupon only while every redemption check passes.
+
+    Used with redemption_pipeline in one conditional find_one_and_update, so
+    concurrent redemptions cannot exceed usage_limit and a rejected
+    redemption writes nothing.
+    """
+    checks = _redemption_checks(amount, plan_id, assigned_coupons, now or datetime.utcnow())
+    return {'code': code, '$expr': {'$not': [{'$or': [case for case, _ in checks]}]}}
+
+
+def redemption_pipeline(amount, plan_id=None, partner_id=None, now=None):
+    """Update pipeline counting one use and recording the redemption in last_redemption_attempt.
+
+    Partner limits are reserved separately (see partner_limit_pipeline).
+    """
+    return [
+        {'$set': {
+            'used_count': {'$add': [{'$ifNull': ['$used_count', 0]}, 1]},
+            'last_redemption_attempt': {
+                'at': now or datetime.utcnow(),
+                'amount': amount,
+                'plan_id': plan_id,
+                'partner_id': partner_id,
+                'discount': _discount_expr(amount),
+                'reason': 'OK'
+            }
+        }}
+    ]
+
+
+def rejection_reason(coupon, amount, plan_id=None, assigned_coupons=None, now=None):
+    """The first check in _redemption_checks a Coupon fails, or None (used to explain a missed redemption)"""
+    now = now or datetime.utcnow()
+    if not coupon.is_active:
+        return 'INACTIVE'
+    if coupon.valid_from and coupon.valid_from > now:
+        return 'NOT_YET_VALID'
+    if coupon.valid_until and coupon.valid_until < now:
+        return 'EXPIRED'
+    if coupon.usage_limit and (coupon.used_count or 0) >= coupon.usage_limit:
+        return 'USAGE_LIMIT'
+    if assigned_coupons is not None and coupon._id not in assigned_coupons:
+        return 'NOT_ASSIGNED'
+    if coupon.calculate_discount(amount, plan_id) <= 0:
+        return 'NOT_APPLICABLE'
+    return None
+
+
+def partner_limit_pipeline(now=None):
+    """Update pipeline reserving one use against a coupon_partner_limits document.
+
+    'used' only moves while it is below 'limit'; last_reserved tells the
+    caller whether this attempt got the unit.
+    """
+    used = {'$ifNull': ['$used', 0]}
+    return [
+        {'$set': {'last_reserved': {'$lt': [used, '$limit']}, 'updated_at': now or datetime.utcnow()}},
+        {'$set': {'used': {'$cond': ['$last_reserved', {'$add': [used, 1]}, used]}}}
+    ]
+
+
+def partner_usage_pipeline(coupon_id):
+    """Per-partner redemptions (from the ledger) joined with limits and partner names"""
+    return [
+        {'$match': {'coupon_id': coupon_id, 'partner_id': {'$ne': None}}},
+        {'$group': {
+            '_id': '$partner_id',
+            'redeemed': {'$sum': 1},
+            'discount_total': {'$sum': '$discount'},
+            'last_redeemed_at': {'$max': '$redeemed_at'}
+        }},
+        # Partners with a limit but no redemptions yet still get a row
+        {'$unionWith': {'coll': 'coupon_partner_limits', 'pipeline': [
+            {'$match': {'coupon_id': coupon_id}},
+            {'$project': {'_id': '$partner_id', 'limit': 1, 'used': 1}}
+        ]}},
+        {'$group': {
+            '_id': '$_id',
+            'redeemed': {'$sum': '$redeemed'},
+            'discount_total': {'$sum': '$discount_total'},
+            'last_redeemed_at': {'$max': '$last_redeemed_at'},
+            'limit': {'$max': '$limit'},
+            'used': {'$max': '$used'}
+        }},
+        {'$lookup': {'from': 'users', 'localField': '_id', 'foreignField': '_id', 'as': 'partner'}},
+        {'$project': {
+            'redeemed': 1, 'discount_total': 1, 'last_redeemed_at': 1, 'limit': 1, 'used': 1,
+            'partner.username': 1, 'partner.full_name': 1
+        }},
+        {'$sort': {'redeemed': -1}}
+    ]
+
 
 class CouponService:
     def __init__(self):
         self.coupons = get_coupons_collection()
         self.users = get_users_collection()
+        self.redemptions = get_coupon_redemptions_collection()
+        self.partner_limits = get_coupon_partner_limits_collection()
     
     def get_coupon_by_id(self, coupon_id):
         """Get coupon by ID"""
@@ -60,27 +244,20 @@ class CouponService:
         """Create coupon with partner limits"""
         return self.create_coupon_with_limits(coupon_data, created_by_id)
     
-    def create_coupon_with_limits(self, coupon_data, created_by_id):
-        """Create coupon with usage limits per partner"""
-        # Generate code if not provided
-        if not coupon_data.get('code'):
-            coupon_data['code'] = Coupon.generate_code()
-        else:
-            coupon_data['code'] = coupon_data['code'].upper()
-        
-        # Check if code already exists
-        existing = self.coupons.find_one({'code': coupon_data['code']})
-        
-        if existing:
-            return None, "Coupon code already exists"
-        
+    def _prepare_coupon(self, coupon_data, created_by_id):
+        """Normalize submitted coupon fields into a document ready to insert.
+
+        Returns (document, partner_limits) with partner_limits as {partner ObjectId: limit};
+        limits are stored in coupon_partner_limits, not on the coupon.
+        """
         # Convert dates if provided as strings
         if coupon_data.get('valid_from'):
-            coupon_data['valid_from'] = datetime.fromisoformat(coupon_data['valid_from'])
+            if isinstance(coupon_data['valid_from'], str):
+                coupon_data['valid_from'] = datetime.fromisoformat(coupon_data['valid_from'])
         else:
             coupon_data['valid_from'] = datetime.utcnow()
         
-        if coupon_data.get('valid_until'):
+        if coupon_data.get('valid_until') and isinstance(coupon_data['valid_until'], str):
             coupon_data['valid_until'] = datetime.fromisoformat(coupon_data['valid_until'])
         
         # Set defaults
@@ -89,23 +266,46 @@ class CouponService:
         coupon_data['updated_at'] = datetime.utcnow()
         coupon_data['created_by'] = ObjectId(created_by_id)
         
-        # Partner usage limits
-        if coupon_data.get('partner_limits'):
-            # Convert partner IDs to ObjectId
-            partner_limits = {}
-            for partner_id, limit in coupon_data['partner_limits'].items():
-                partner_limits[str(ObjectId(partner_id))] = {
-                    'limit': limit,
-                    'used': 0
-                }
-            coupon_data['partner_limits'] = partner_limits
+        # Partner usage limits (convert partner IDs to ObjectId)
+        partner_limits = {
+            ObjectId(partner_id): int(limit)
+            for partner_id, limit in (coupon_data.pop('partner_limits', None) or {}).items()
+        }
         
         # Convert plan IDs to ObjectId
         if coupon_data.get('applicable_plans'):
             coupon_data['applicable_plans'] = [ObjectId(pid) for pid in coupon_data['applicable_plans']]
         
-        # Insert coupon
-        result = self.coupons.insert_one(coupon_data)
+        return coupon_data, partner_limits
+    
+    def create_coupon_with_limits(self, coupon_data, created_by_id):
+        """Create coupon with usage limits per partner"""
+        generated = not coupon_data.get('code')
+        if generated:
+            coupon_data['code'] = Coupon.generate_code()
+        else:
+            coupon_data['code'] = coupon_data['code'].upper()
+        
+        coupon_data, partner_limits = self._prepare_coupon(coupon_data, created_by_id)
+        
+        # The unique index on code rejects duplicates; generated codes are simply redrawn
+        for _ in range(CAMPAIGN_MAX_RETRIES):
+            try:
+                result = self.coupons.insert_one(coupon_data)
+                break
+            except DuplicateKeyError:
+                if not generated:
+                    return None, "Coupon code already exists"
+                coupon_data.pop('_id', None)
+                coupon_data['code'] = Coupon.generate_code()
+        else:
+            return None, "Could not generate a unique coupon code"
+        
+        if partner_limits:
+            self.set_partner_limits(result.inserted_id, partner_limits)
+        
+        StatsService().record_active_change('active_coupons', False, coupon_data.get('is_active', True))
+        coupon_catalog.invalidate(coupon_data['code'])
         
         # Log activity
         log_activity(
@@ -117,6 +317,130 @@ class CouponService:
         
         return str(result.inserted_id), None
     
+    def generate_campaign(self, template, count, created_by_id, prefix='', code_length=8):
+        """Create `count` coupons sharing one template (discount, dates, partner limits).
+
+        Codes are drawn at random and inserted with insert_many(ordered=False);
+        only the codes the unique index rejects are redrawn and retried. A
+        batch that still has rejected codes after the retries is left short and
+        the next batch goes ahead; the shortfall is reported in `error`, as is a
+        failure to store the partner limits. Every coupon gets the same
+        campaign_id. Returns (result, error).
+        """
+        if count < 1:
+            return None, "Number of coupons must be at least 1"
+        
+        template = dict(template)
+        template.pop('code', None)
+        template.setdefault('usage_limit', 1)  # Campaign codes are single-use unless stated otherwise
+        template, partner_limits = self._prepare_coupon(template, created_by_id)
+        template['campaign_id'] = ObjectId()
+        prefix = (prefix or '').upper()
+        
+        inserted = 0
+        collisions = 0
+        shortfall = 0
+        limit_docs = []
+        for start in range(0, count, CAMPAIGN_BATCH_SIZE):
+            pending = [
+                dict(template, code=code)
+                for code in Coupon.generate_codes(min(CAMPAIGN_BATCH_SIZE, count - start), code_length, prefix)
+            ]
+            
+            for _ in range(CAMPAIGN_MAX_RETRIES + 1):
+                failed = set()
+                try:
+                    self.coupons.insert_many(pending, ordered=False)
+                except BulkWriteError as e:
+                    errors = e.details.get('writeErrors', [])
+                    if any(error['code'] != DUPLICATE_KEY for error in errors):
+                        raise
+                    failed = {error['index'] for error in errors}
+                    collisions += len(failed)
+                
+                stored = [doc['_id'] for index, doc in enumerate(pending) if index not in failed]
+                inserted += len(stored)
+                limit_docs += [
+                    self._partner_limit_doc(coupon_id, partner_id, limit)
+                    for coupon_id in stored
+                    for partner_id, limit in partner_limits.items()
+                ]
+                
+                if not failed:
+                    pending = []
+                    break
+                
+                # Retry only the rejected documents, each with a fresh code
+                retry = []
+                for index in sorted(failed):
+                    doc = pending[index]
+                    doc.pop('_id', None)
+                    doc['code'] = Coupon.generate_code(code_length, prefix)
+                    retry.append(doc)
+                pending = retry
+            
+            # Codes still colliding after the retries are skipped; later batches draw new ones
+            shortfall += len(pending)
+        
+        errors = []
+        if limit_docs:
+            try:
+                for start in range(0, len(limit_docs), CAMPAIGN_BATCH_SIZE):
+                    self.partner_limits.insert_many(limit_docs[start:start + CAMPAIGN_BATCH_SIZE], ordered=False)
+            except PyMongoError as e:
+                errors.append(f"Partner limits could not be saved for every coupon: {e}")
+        
+        if inserted:
+            if template.get('is_active', True):
+                StatsService().record_active_created('active_coupons', inserted)
+            coupon_catalog.invalidate()
+            
+            log_activity(
+                created_by_id,
+                'COUPON_CAMPAIGN_CREATED',
+                f"Generated {inserted} coupons: {template.get('name')}",
+                {'campaign_id': str(template['campaign_id']), 'count': inserted}
+            )
+        
+        result = {
+            'campaign_id': str(template['campaign_id']),
+            'inserted': inserted,
+            'collisions': collisions,
+            'shortfall': shortfall
+        }
+        if shortfall:
+            errors.insert(0, f"Only {inserted} of {count} codes could be generated; use a longer code length")
+        return result, '; '.join(errors) or None
+    
+    def iter_campaign_csv(self, campaign_id):
+        """Yield a campaign's coupons as CSV text in chunks of CAMPAIGN_CSV_CHUNK_ROWS lines"""
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=CAMPAIGN_CSV_FIELDS, extrasaction='ignore')
+        
+        def flush():
+            value = buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            return value
+        
+        writer.writeheader()
+        yield flush()
+        
+        projection = {name: 1 for name in CAMPAIGN_CSV_FIELDS}
+        cursor = self.coupons.find({'campaign_id': ObjectId(campaign_id)}, projection).sort('_id', 1)
+        rows = 0
+        for doc in cursor.batch_size(CAMPAIGN_BATCH_SIZE):
+            for name in ('valid_from', 'valid_until'):
+                if doc.get(name):
+                    doc[name] = doc[name].isoformat()
+            writer.writerow(doc)
+            rows += 1
+            if rows % CAMPAIGN_CSV_CHUNK_ROWS == 0:
+                yield flush()
+        
+        if rows % CAMPAIGN_CSV_CHUNK_ROWS:
+            yield flush()
+    
     def update_coupon(self, coupon_id, update_data, updated_by_id):
         """Update coupon details including partner limits"""
         # Remove fields that shouldn't be updated
@@ -137,33 +461,13 @@ class CouponService:
         if update_data.get('applicable_plans'):
             update_data['applicable_plans'] = [ObjectId(pid) for pid in update_data['applicable_plans'] if pid]
         
-        # Handle partner limits from form data
-        from models import get_users_collection
-        users = get_users_collection()
-        partners = users.find({'role': 'PARTNER'})
-        
-        partner_limits = {}
-        for partner in partners:
-            partner_id = str(partner['_id'])
-            limit_key = f'partner_limit_{partner_id}'
-            
-            # Check if limit was provided in form
-            if limit_key in update_data:
-                limit_value = update_data.pop(limit_key)
-                if limit_value:
-                    # Get existing usage count
-                    existing_coupon = self.coupons.find_one({'_id': ObjectId(coupon_id)})
-                    existing_usage = 0
-                    if existing_coupon and existing_coupon.get('partner_limits'):
-                        existing_usage = existing_coupon['partner_limits'].get(partner_id, {}).get('used', 0)
-                    
-                    partner_limits[partner_id] = {
-                        'limit': int(limit_value),
-                        'used': existing_usage
-                    }
-        
-        if partner_limits:
-            update_data['partner_limits'] = partner_limits
+        # Partner limits from form data: a number sets the limit, an empty field removes it
+        partner_limits, error = self.parse_partner_limits({
+            key[len(PARTNER_LIMIT_FIELD_PREFIX):]: update_data.pop(key)
+            for key in [key for key in update_data if key.startswith(PARTNER_LIMIT_FIELD_PREFIX)]
+        }, allow_remove=True)
+        if error:
+            return False, error
         
         # Set updated timestamp
         update_data['updated_at'] = datetime.utcnow()
@@ -173,8 +477,11 @@ class CouponService:
             {'_id': ObjectId(coupon_id)},
             {'$set': update_data}
         )
+        limits_changed = self.set_partner_limits(coupon_id, partner_limits) if partner_limits else 0
         
-        if result.modified_count > 0:
+        if result.modified_count > 0 or limits_changed:
+            coupon_catalog.invalidate()
+            
             # Log activity
             log_activity(
                 updated_by_id,
@@ -186,6 +493,111 @@ class CouponService:
         
         return True, "No changes made"
     
+    def parse_partner_limits(self, raw_limits, allow_remove=False):
+        """Validate submitted {partner_id: limit} into {partner ObjectId: int}.
+
+        Limits must be whole numbers >= 0 and every id must be an existing
+        partner (checked with one $in read). With allow_remove an empty value
+        maps to None (remove the limit). Returns (limits, error).
+        """
+        limits = {}
+        for partner_id, value in (raw_limits or {}).items():
+            if not ObjectId.is_valid(str(partner_id)):
+                return None, f"Invalid partner id: {partner_id}"
+            if value in (None, '') and allow_remove:
+                limits[ObjectId(str(partner_id))] = None
+                continue
+            try:
+                limit = int(value)
+            except (TypeError, ValueError):
+                return None, f"Partner limit must be a whole number: {value}"
+            if limit < 0:
+                return None, "Partner limit cannot be negative"
+            limits[ObjectId(str(partner_id))] = limit
+        
+        if limits:
+            found = set(self.users.distinct('_id', {'_id': {'$in': list(limits)}, 'role': 'PARTNER'}))
+            unknown = [str(partner_id) for partner_id in limits if partner_id not in found]
+            if unknown:
+                return None, f"Unknown partner: {', '.join(unknown)}"
+        
+        return limits, None
+    
+    @staticmethod
+    def _partner_limit_doc(coupon_id, partner_id, limit, now=None):
+        now = now or datetime.utcnow()
+        return {
+            'coupon_id': ObjectId(coupon_id),
+            'partner_id': ObjectId(partner_id),
+            'limit': limit,
+            'used': 0,
+            'created_at': now,
+            'updated_at': now
+        }
+    
+    def set_partner_limits(self, coupon_id, limits):
+        """Apply {partner_id: limit} to a coupon in one bulk_write (a limit of None removes it).
+
+        Existing usage is kept when a limit changes. Returns the number of
+        limit documents inserted, changed or removed.
+        """
+        now = datetime.utcnow()
+        coupon_id = ObjectId(coupon_id)
+        operations = []
+        
+        for partner_id, limit in limits.items():
+            key = {'coupon_id': coupon_id, 'partner_id': ObjectId(partner_id)}
+            if limit is None:
+                operations.append(DeleteOne(key))
+            else:
+                operations.append(UpdateOne(
+                    key,
+                    {
+                        '$set': {'limit': int(limit), 'updated_at': now},
+                        '$setOnInsert': {'used': 0, 'created_at': now}
+                    },
+                    upsert=True
+                ))
+        
+        if not operations:
+            return 0
+        
+        result = self.partner_limits.bulk_write(operations, ordered=False)
+        changed = result.upserted_count + result.modified_count + result.deleted_count
+        if changed:
+            coupon_catalog.invalidate()
+        return changed
+    
+    def get_partner_limits(self, coupon_id):
+        """Limits on one coupon as {partner_id: {'limit', 'used'}} (string partner ids)"""
+        return {
+            str(doc['partner_id']): {'limit': doc['limit'], 'used': doc.get('used', 0)}
+            for doc in self.partner_limits.find(
+                {'coupon_id': ObjectId(coupon_id)},
+                {'partner_id': 1, 'limit': 1, 'used': 1}
+            )
+        }
+    
+    def get_partner_coupon_usage(self, partner_id, coupon_ids):
+        """One partner's limits across coupons as {coupon_id: {'limit', 'used'}} (string coupon ids)"""
+        if not coupon_ids:
+            return {}
+        return {
+            str(doc['coupon_id']): {'limit': doc['limit'], 'used': doc.get('used', 0)}
+            for doc in self.partner_limits.find(
+                {'partner_id': ObjectId(partner_id), 'coupon_id': {'$in': [ObjectId(cid) for cid in coupon_ids]}},
+                {'coupon_id': 1, 'limit': 1, 'used': 1}
+            )
+        }
+    
+    def get_coupons_by_ids(self, coupon_ids):
+        """Coupons for a list of ids in one query, in the order given"""
+        if not coupon_ids:
+            return []
+        ids = [ObjectId(cid) for cid in coupon_ids]
+        by_id = {doc['_id']: doc for doc in self.coupons.find({'_id': {'$in': ids}})}
+        return [Coupon(by_id[cid]) for cid in ids if cid in by_id]
+    
     def toggle_coupon_status(self, coupon_id, updated_by_id):
         """Toggle coupon active status"""
         coupon_data = self.coupons.find_one({'_id': ObjectId(coupon_id)})
@@ -201,6 +613,8 @@ class CouponService:
                 'updated_at': datetime.utcnow()
             }}
         )
+        StatsService().record_active_change('active_coupons', not new_status, new_status)
+        coupon_catalog.invalidate(coupon_data['code'])
         
         # Log activity
         status_text = "activated" if new_status else "deactivated"
@@ -213,92 +627,191 @@ class CouponService:
         
         return True, f"Coupon {status_text} successfully"
     
-    def get_all_coupons(self, filters=None, page=1, per_page=10):
+    def get_all_coupons(self, filters=None, page=1, per_page=10, cursor=None, exact_total=False):
         """Get all coupons with pagination"""
-        query = filters or {}
-        
-        # Calculate skip value
-        skip = (page - 1) * per_page
-        
-        # Get total count
-        total = self.coupons.count_documents(query)
-        
-        # Get paginated results
-        coupons_data = self.coupons.find(query).skip(skip).limit(per_page).sort('created_at', -1)
-        coupons = [Coupon(data) for data in coupons_data]
-        
-        return {
-            'coupons': coupons,
-            'total': total,
-            'page': page,
-            'per_page': per_page,
-            'total_pages': (total + per_page - 1) // per_page
-        }
-    
-    def validate_and_apply_coupon(self, code, amount, plan_id=None):
-        """Public method for coupon validation - redirects to partner method"""
-        # For backward compatibility
-        return self.validate_and_apply_coupon_for_partner(code, amount, plan_id, None)
+        result = keyset_paginate(raw_collection(self.coupons), filters, page, per_page, cursor, exact_total=exact_total)
+        result['coupons'] = [Coupon(data) for data in result.pop('items')]
+        return result
     
-    def validate_and_apply_coupon_for_partner(self, code, amount, plan_id, partner_id):
-        """Validate and apply coupon with partner restrictions"""
-        coupon = self.get_coupon_by_code(code)
-        
+    def quote(self, code, amount, plan_id=None, partner_id=None):
+        """Preview a coupon's discount without redeeming it (no database writes).
+
+        Reads the coupon from the in-process catalog and the partner from the
+        session cache, applying the same checks as redeem(). Returns
+        (success, message, discount); the result may be a few seconds stale.
+        """
+        coupon = coupon_catalog.get(code)
         if not coupon:
             return False, "Invalid coupon code", 0
         
-        # Check if coupon is valid
         is_valid, message = coupon.is_valid()
         if not is_valid:
             return False, message, 0
         
-        # Check if partner can use this coupon
         if partner_id:
-            partner = self.users.find_one({'_id': ObjectId(partner_id), 'role': 'PARTNER'})
-            if partner and partner.get('assigned_coupons'):
+            partner = user_session_cache.get(partner_id)
+            if partner and partner.get('role') == 'PARTNER' and partner.get('assigned_coupons'):
                 if coupon._id not in partner['assigned_coupons']:
-                    return False, "This coupon is not available for your account", 0
+                    return False, REDEMPTION_MESSAGES['NOT_ASSIGNED'], 0
             
-            # Check partner-specific usage limits
-            if hasattr(coupon, 'partner_limits') and coupon.partner_limits:
-                partner_limit_data = coupon.partner_limits.get(str(partner_id))
-                if partner_limit_data:
-                    if partner_limit_data['used'] >= partner_limit_data['limit']:
-                        return False, "Partner usage limit exceeded for this coupon", 0
-        
-        # Calculate discount
+            partner_limit = coupon.partner_limits.get(str(partner_id))
+            if partner_limit and partner_limit.get('used', 0) >= partner_limit.get('limit', 0):
+                return False, REDEMPTION_MESSAGES['PARTNER_LIMIT'], 0
+        
         discount = coupon.calculate_discount(amount, plan_id)
+        if discount <= 0:
+            return False, REDEMPTION_MESSAGES['NOT_APPLICABLE'], 0
         
-        if discount == 0:
-            return False, "Coupon not applicable for this purchase", 0
+        return True, REDEMPTION_MESSAGES['OK'], discount
+    
+    def validate_and_apply_coupon_for_partner(self, code, amount, plan_id, partner_id, agent_id=None, redeemed_by=None):
+        """Validate and apply coupon with partner restrictions"""
+        assigned_coupons = None
+        if partner_id:
+            partner = self.users.find_one(
+                {'_id': ObjectId(partner_id), 'role': 'PARTNER'},
+                {'assigned_coupons': 1}
+            )
+            if partner and partner.get('assigned_coupons'):
+                assigned_coupons = partner['assigned_coupons']
         
-        # Increment usage counts
-        update_data = {'$inc': {'used_count': 1}}
+        return self.redeem(code, amount, plan_id, partner_id, assigned_coupons, agent_id, redeemed_by)
+    
+    def redeem(self, code, amount, plan_id=None, partner_id=None, assigned_coupons=None, agent_id=None,
+               redeemed_by=None):
+        """Check and redeem a coupon, then record the redemption in the ledger.
+
+        The coupon checks sit in the filter of one conditional
+        find_one_and_update that moves used_count, so a rejected coupon is not
+        written to. That write cannot report which check failed, so the reason
+        is worked out from the in-process coupon catalog (no database read
+        while the code is cached); if the cached copy passes every check it is
+        stale, and it is dropped before one retry. A partner limit is then
+        reserved the same way in coupon_partner_limits (the coupon use is
+        given back if the partner is out of uses). assigned_coupons restricts
+        redemption to those coupon ids (a partner's assigned coupons); None
+        means no restriction. Returns (success, message, discount).
+        """
+        if not code:
+            return False, "Invalid coupon code", 0
         
-        # Update partner-specific usage
-        if partner_id and hasattr(coupon, 'partner_limits') and coupon.partner_limits and str(partner_id) in coupon.partner_limits:
-            update_data['$inc'][f'partner_limits.{partner_id}.used'] = 1
+        code = code.upper()
+        plan_id = ObjectId(plan_id) if plan_id and ObjectId.is_valid(plan_id) else None
+        partner_id = ObjectId(partner_id) if partner_id else None
+        
+        # A miss the cached coupon cannot explain means the cache is stale; refresh it and try once more
+        for _ in range(2):
+            now = datetime.utcnow()
+            coupon = self.coupons.find_one_and_update(
+                redemption_filter(code, amount, plan_id, assigned_coupons, now),
+                redemption_pipeline(amount, plan_id, str(partner_id) if partner_id else None, now),
+                projection={'code': 1, 'last_redemption_attempt': 1},
+                return_document=ReturnDocument.AFTER
+            )
+            if coupon:
+                break
+            
+            cached = coupon_catalog.get(code)
+            if not cached:
+                return False, "Invalid coupon code", 0
+            reason = rejection_reason(cached, amount, plan_id, assigned_coupons, now)
+            if reason:
+                return False, REDEMPTION_MESSAGES[reason], 0
+            coupon_catalog.invalidate(code)
+        else:
+            return False, "Coupon could not be applied, please try again", 0
         
-        self.coupons.update_one({'_id': coupon._id}, update_data)
+        attempt = coupon['last_redemption_attempt']
         
-        return True, "Coupon applied successfully", discount
+        if partner_id:
+            limit = self.partner_limits.find_one_and_update(
+                {'coupon_id': coupon['_id'], 'partner_id': partner_id},
+                partner_limit_pipeline(now),
+                projection={'last_reserved': 1},
+                return_document=ReturnDocument.AFTER
+            )
+            
+            # No limit document means the partner is not limited on this coupon
+            if limit and not limit['last_reserved']:
+                self.coupons.update_one(
+                    {'_id': coupon['_id'], 'used_count': {'$gt': 0}},
+                    {
+                        '$inc': {'used_count': -1},
+                        '$set': {'last_redemption_attempt.reason': 'PARTNER_LIMIT'}
+                    }
+                )
+                return False, REDEMPTION_MESSAGES['PARTNER_LIMIT'], 0
+        
+        self.redemptions.insert_one({
+            'coupon_id': coupon['_id'],
+            'code': coupon['code'],
+            'partner_id': partner_id,
+            'agent_id': ObjectId(agent_id) if agent_id else None,
+            'plan_id': plan_id,
+            'amount': amount,
+            'discount': attempt['discount'],
+            'redeemed_by': ObjectId(redeemed_by) if redeemed_by else None,
+            'redeemed_at': now
+        })
+        
+        # used_count moved: quotes in this process should see it
+        coupon_catalog.invalidate(code)
+        
+        return True, REDEMPTION_MESSAGES['OK'], attempt['discount']
     
     def get_coupon_usage_by_partner(self, coupon_id):
-        """Get usage statistics by partner for a coupon"""
-        coupon = self.get_coupon_by_id(coupon_id)
-        if not coupon or not hasattr(coupon, 'partner_limits'):
-            return []
-        
+        """Get usage statistics by partner for a coupon (one aggregation over the ledger)"""
         usage_stats = []
-        for partner_id, limit_data in coupon.partner_limits.items():
-            partner = self.users.find_one({'_id': ObjectId(partner_id)})
-            if partner:
-                usage_stats.append({
-                    'partner_id': partner_id,
-                    'partner_name': partner['full_name'] or partner['username'],
-                    'limit': limit_data['limit'],
-                    'used': limit_data['used'],
-                    'remaining': limit_data['limit'] - limit_data['used']
-                })
-        
-        return usage_stats
\ No newline at end of file
+        for row in self.redemptions.aggregate(partner_usage_pipeline(ObjectId(coupon_id))):
+            partner = row['partner'][0] if row['partner'] else {}
+            limit = row.get('limit')
+            used = row.get('used', row['redeemed']) if limit is not None else row['redeemed']
+            usage_stats.append({
+                'partner_id': str(row['_id']),
+                'partner_name': partner.get('full_name') or partner.get('username') or 'Unknown',
+                'limit': limit,
+                'used': used,
+                'remaining': max(0, limit - used) if limit is not None else None,
+                'redeemed': row['redeemed'],
+                'discount_total': row['discount_total'],
+                'last_redeemed_at': row.get('last_redeemed_at')
+            })
+        
+        return usage_stats
+    
+    def migrate_embedded_partner_limits(self, batch_size=500):
+        """Move partner_limits dicts stored on coupons into coupon_partner_limits.
+
+        Limits already present in the collection win. Returns the number of
+        coupons migrated.
+        """
+        now = datetime.utcnow()
+        migrated = 0
+        cursor = self.coupons.find(
+            {'partner_limits': {'$exists': True}},
+            {'partner_limits': 1}
+        ).batch_size(batch_size)
+        
+        for coupon in cursor:
+            operations = [
+                UpdateOne(
+                    {'coupon_id': coupon['_id'], 'partner_id': ObjectId(partner_id)},
+                    {'$setOnInsert': {
+                        'limit': int(data.get('limit') or 0),
+                        'used': int(data.get('used') or 0),
+                        'created_at': now,
+                        'updated_at': now
+                    }},
+                    upsert=True
+                )
+                for partner_id, data in (coupon.get('partner_limits') or {}).items()
+                if ObjectId.is_valid(partner_id)
+            ]
+            if operations:
+                self.partner_limits.bulk_write(operations, ordered=False)
+            self.coupons.update_one({'_id': coupon['_id']}, {'$unset': {'partner_limits': ''}})
+            migrated += 1
+        
+        if migrated:
+            coupon_catalog.invalidate()
+        return migrated
@@ -123,4 +123,64 @@ If you have any questions, please contact your partner.
 Regards,
 Financial Planning System Team"""
         
-        return message
\ No newline at end of file
+        return message
+    
+    def send_plan_expiry_notices(self, notices):
+        """Send plan expiry emails over one SMTP connection.
+        
+        Each notice is a dict with email, name, plan_name, expiry_date and
+        stage ('EXPIRING' or 'EXPIRED'). Returns (sent, failed).
+        """
+        if not notices:
+            return 0, 0
+        
+        from app import mail
+        
+        sent = failed = 0
+        try:
+            with mail.connect() as connection:
+                for notice in notices:
+                    try:
+                        connection.send(self._plan_expiry_message(notice))
+                        sent += 1
+                    except Exception as e:
+                        failed += 1
+                        self.logger.error(f"Error sending plan expiry email to {notice['email']}: {str(e)}")
+        except Exception as e:
+            self.logger.error(f"Error connecting to mail server: {str(e)}")
+            failed = len(notices) - sent
+        
+        self.logger.info(f"Plan expiry emails: {sent} sent, {failed} failed")
+        return sent, failed
+    
+    def _plan_expiry_message(self, notice):
+        expiry = notice['expiry_date'].strftime('%d %b %Y') if notice.get('expiry_date') else 'today'
+        plan_name = notice.get('plan_name') or 'your plan'
+        
+        if notice['stage'] == 'EXPIRED':
+            subject = f"Your plan {plan_name} has expired"
+            status_line = f"Your plan {plan_name} expired on {expiry}. PDF generation is paused until a new plan is assigned."
+        else:
+            subject = f"Your plan {plan_name} expires on {expiry}"
+            status_line = f"Your plan {plan_name} expires on {expiry}. Please contact your partner to renew it."
+        
+        text_body = f"""
+Dear {notice.get('name') or 'Agent'},
+
+{status_line}
+
+Best regards,
+Financial Planning System Team
+            """
+        
+        html_body = render_template_string("""
+            <p>Dear {{ name }},</p>
+            <p>{{ status_line }}</p>
+            <p>Best regards,<br>Financial Planning System Team</p>
+            <p style="font-size: 12px; color: #666;">This is an automated email. Please do not reply to this message.</p>
+            """,
+            name=notice.get('name') or 'Agent',
+            status_line=status_line
+        )
+        
+        return Message(subject=subject, recipients=[notice['email']], body=text_body, html=html_body)
@@ -0,0 +1,145 @@
+# services/form_link_cache.py
+# Public form-link lookups by token: in-process LRU+TTL with an optional Redis tier and negative caching
+
+import logging
+import redis
+from bson import json_util
+from models.connection import mongo_registry
+from models.forms.form_link import FormLink
+from utils.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Cached for tokens that do not exist, so scanners probing random tokens are not a read each time
+_UNKNOWN = False
+
+
+class FormLinkCache:
+    """Resolve a public form token without a database read on every GET, POST and socket event.
+
+    Entries hold the whole link document, including the agent display fields
+    (agent_name, agent_phone) the form pages show. Validity (is_active,
+    expiry, usage) is evaluated on each use from the cached document, and
+    submissions re-check it atomically when they count the use, so a stale
+    entry can never let a link be used past its limit.
+
+    HealthInsuranceFormService calls invalidate() when a link is created,
+    toggled, used or auto-deactivated: that drops this process's entry and the
+    shared Redis copy. Other workers' local entries expire after `ttl`.
+    """
+
+    def __init__(self):
+        self.local = TTLCache(maxsize=10000, ttl=15)
+        self.negative_ttl = 300
+        self.redis_client = None
+        self.redis_ttl = 300
+        self.enabled = True
+        self._uri = None
+        self.redis_hits = 0
+        self.redis_errors = 0
+        self.db_loads = 0
+        self.unknown_tokens = 0
+
+    def init_app(self, app):
+        config = app.config
+        self._uri = config['MONGO_URI']
+        self.enabled = config.get('FORM_LINK_CACHE_ENABLED', True)
+        self.local.maxsize = config.get('FORM_LINK_CACHE_MAX_ENTRIES', self.local.maxsize)
+        self.local.ttl = config.get('FORM_LINK_CACHE_TTL', self.local.ttl)
+        self.negative_ttl = config.get('FORM_LINK_CACHE_NEGATIVE_TTL', self.negative_ttl)
+        self.redis_ttl = config.get('FORM_LINK_CACHE_REDIS_TTL', self.redis_ttl)
+
+        if self.enabled and config.get('FORM_LINK_CACHE_REDIS', False):
+            try:
+                self.redis_client = redis.from_url(config.get('REDIS_URL', 'redis://localhost:6379/0'))
+                self.redis_client.ping()
+            except Exception as e:
+                logger.warning(f"Form link cache Redis tier disabled: {e}")
+                self.redis_client = None
+
+        app.extensions['form_link_cache'] = self
+
+    def _form_links(self):
+        return mongo_registry.get_database(self._uri)['form_links']
+
+    @staticmethod
+    def _key(token):
+        return f'form_link:{token}'
+
+    def _load(self, token):
+        self.db_loads += 1
+        data = self._form_links().find_one({'token': token})
+        if not data:
+            self.unknown_tokens += 1
+            return _UNKNOWN
+        return data
+
+    def _redis_get(self, token):
+        """(found, data) from the Redis tier; data is _UNKNOWN for a cached miss"""
+        try:
+            raw = self.redis_client.get(self._key(token))
+        except Exception as e:
+            self.redis_errors += 1
+            logger.warning(f"Form link cache Redis read failed: {e}")
+            return False, None
+        if raw is None:
+            return False, None
+        self.redis_hits += 1
+        return True, json_util.loads(raw) or _UNKNOWN
+
+    def _redis_set(self, token, data):
+        try:
+            ttl = self.redis_ttl if data is not _UNKNOWN else self.negative_ttl
+            self.redis_client.setex(self._key(token), ttl, json_util.dumps(data or None))
+        except Exception as e:
+            self.redis_errors += 1
+            logger.warning(f"Form link cache Redis write failed: {e}")
+
+    def get(self, token):
+        """Return the FormLink for a token, or None if there is no such link"""
+        if not token:
+            return None
+        if not self.enabled:
+            data = self._load(token)
+            return FormLink(data) if data is not _UNKNOWN else None
+
+        data = self.local.get(token)
+        if data is None:
+            found = False
+            if self.redis_client:
+                found, data = self._redis_get(token)
+            if not found:
+                data = self._load(token)
+                if self.redis_client:
+                    self._redis_set(token, data)
+            self.local.set(token, data, ttl=None if data is not _UNKNOWN else self.negative_ttl)
+
+        return FormLink(data) if data is not _UNKNOWN else None
+
+    def invalidate(self, *tokens):
+        """Drop cached copies of links whose document changed (or was just created)"""
+        for token in tokens:
+            if not token:
+                continue
+            self.local.delete(token)
+            if self.redis_client:
+                try:
+                    self.redis_client.delete(self._key(token))
+                except Exception as e:
+                    self.redis_errors += 1
+                    logger.warning(f"Form link cache Redis invalidation failed: {e}")
+
+    def stats(self):
+        stats = self.local.stats()
+        stats.update({
+            'enabled': self.enabled,
+            'redis': self.redis_client is not None,
+            'redis_hits': self.redis_hits,
+            'redis_errors': self.redis_errors,
+            'db_loads': self.db_loads,
+            'unknown_tokens': self.unknown_tokens
+        })
+        return stats
+
+
+form_link_cache = FormLinkCache()
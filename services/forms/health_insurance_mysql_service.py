@@ -6,6 +6,7 @@ import uuid
 import secrets
 from models import get_users_collection
 from utils.helpers import log_activity
+from services.stats_service import StatsService
 import subprocess
 import os
 from flask import current_app
@@ -78,7 +79,8 @@ class HealthInsuranceFormService:
                 str(agent_id),
                 'FORM_LINK_CREATED',
                 f"Created health insurance form link",
-                {'link_id': link_id, 'language': language}
+                {'link_id': link_id, 'language': language},
+                actor=agent
             )
             
             return link_id, token
@@ -191,7 +193,8 @@ class HealthInsuranceFormService:
                 link['agent_id'],
                 'FORM_SUBMITTED',
                 f"Health insurance form submitted by {form_data.get('name')}",
-                {'form_id': form_id}
+                {'form_id': form_id},
+                actor=agent
             )
             
             return form_id, None
@@ -350,13 +353,15 @@ class HealthInsuranceFormService:
                     {'_id': agent['partner_id']},
                     {'$inc': {'pdf_generated': 1}}
                 )
+            StatsService().record_pdf_generated(agent.get('partner_id'), 1)
             
             # Log activity
             log_activity(
                 str(agent_id),
                 'PDF_GENERATED',
                 f"Generated health insurance PDF for {form['name']}",
-                {'form_id': form_id, 'pdf_filename': pdf_filename}
+                {'form_id': form_id, 'pdf_filename': pdf_filename},
+                actor=agent
             )
             
             return pdf_filename, None
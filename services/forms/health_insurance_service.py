@@ -3,11 +3,18 @@
 
 from datetime import datetime, timedelta
 from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import PyMongoError
 from models.forms import get_health_insurance_forms_collection, get_form_links_collection
 from models.forms.health_insurance_form import HealthInsuranceForm
 from models.forms.form_link import FormLink
 from models import get_users_collection
 from utils.helpers import log_activity
+from services.quota_service import PdfQuotaService
+from services.form_link_cache import form_link_cache
+from services.user_session_cache import user_session_cache
+from utils.pagination import keyset_paginate
+from models.base import raw_collection
 import os
 import io
 
@@ -45,6 +52,7 @@ class HealthInsuranceFormService:
         }
         
         result = self.form_links.insert_one(link_data)
+        form_link_cache.invalidate(link_data['token'])
         
         # Log activity
         log_activity(
@@ -57,9 +65,8 @@ class HealthInsuranceFormService:
         return str(result.inserted_id), link_data['token']
     
     def get_form_link(self, token):
-        """Get form link by token"""
-        link_data = self.form_links.find_one({'token': token})
-        return FormLink(link_data) if link_data else None
+        """Get form link by token (served from the form link cache)"""
+        return form_link_cache.get(token)
     
     def submit_form(self, form_data, token):
         """Submit health insurance form with report language"""
@@ -73,56 +80,83 @@ class HealthInsuranceFormService:
         if not is_valid:
             return None, message
         
-        # Check agent PDF limit
-        agent = self.users.find_one({'_id': link.agent_id})
-        if agent.get('agent_pdf_generated', 0) >= agent.get('agent_pdf_limit', 0):
+        # Check agent PDF limit (the logged-in user cache holds the agent's counters)
+        agent = user_session_cache.get(link.agent_id)
+        if not agent or agent.get('agent_pdf_generated', 0) >= agent.get('agent_pdf_limit', 0):
             return None, "Agent has reached PDF generation limit"
         
+        # Count this use; the filter re-checks the link so a stale cached copy cannot over-use it
+        now = datetime.utcnow()
+        used = self.form_links.find_one_and_update(
+            {
+                '_id': link._id,
+                'is_active': True,
+                '$or': [{'expires_at': None}, {'expires_at': {'$gt': now}}],
+                '$expr': {'$or': [
+                    {'$eq': [{'$ifNull': ['$usage_limit', 0]}, 0]},
+                    {'$lt': [{'$ifNull': ['$usage_count', 0]}, '$usage_limit']}
+                ]}
+            },
+            {'$inc': {'usage_count': 1}},
+            projection={'usage_count': 1, 'usage_limit': 1},
+            return_document=ReturnDocument.AFTER
+        )
+        if not used:
+            form_link_cache.invalidate(token)
+            return None, "Link is no longer active or its usage limit has been reached"
+        
         # Add metadata to form data
         form_data['form_link_id'] = link._id
         form_data['agent_id'] = link.agent_id
         form_data['language'] = form_data.get('language', link.language)
         form_data['report_language'] = form_data.get('report_language', form_data.get('language', 'en'))
-        form_data['created_at'] = datetime.utcnow()
-        form_data['updated_at'] = datetime.utcnow()
+        form_data['created_at'] = now
+        form_data['updated_at'] = now
         
         # Calculate tier city
         form = HealthInsuranceForm(form_data)
         form.calculate_tier_city()
         form_data['tier_city'] = form.tier_city
         
-        # Insert form
-        result = self.forms.insert_one(form_data)
-        
-        # Update link usage count
-        self.form_links.update_one(
-            {'_id': link._id},
-            {'$inc': {'usage_count': 1}}
-        )
-        
-        # Check if link should be deactivated based on usage limit
-        if link.usage_limit and (link.usage_count + 1) >= link.usage_limit:
+        # Insert form; if that fails, give the counted use back
+        try:
+            result = self.forms.insert_one(form_data)
+        except PyMongoError:
             self.form_links.update_one(
-                {'_id': link._id},
+                {'_id': link._id, 'usage_count': {'$gt': 0}},
+                {'$inc': {'usage_count': -1}}
+            )
+            form_link_cache.invalidate(token)
+            return None, "Form could not be saved, please try again"
+        
+        # Deactivate the link once its usage limit is reached
+        usage_limit = used.get('usage_limit')
+        if usage_limit and used['usage_count'] >= usage_limit:
+            deactivated = self.form_links.update_one(
+                {'_id': link._id, 'is_active': True},
                 {'$set': {
                     'is_active': False, 
-                    'deactivated_reason': f'Usage limit ({link.usage_limit}) reached',
-                    'deactivated_at': datetime.utcnow()
+                    'deactivated_reason': f'Usage limit ({usage_limit}) reached',
+                    'deactivated_at': now
                 }}
             )
-            log_activity(
-                str(link.agent_id),
-                'FORM_LINK_DEACTIVATED',
-                f"Form link auto-deactivated after reaching usage limit of {link.usage_limit}",
-                {'link_id': str(link._id), 'token': token}
-            )
+            if deactivated.modified_count:
+                log_activity(
+                    str(link.agent_id),
+                    'FORM_LINK_DEACTIVATED',
+                    f"Form link auto-deactivated after reaching usage limit of {usage_limit}",
+                    {'link_id': str(link._id), 'token': token},
+                    actor=agent
+                )
+        form_link_cache.invalidate(token)
         
         # Log activity
         log_activity(
             str(link.agent_id),
             'FORM_SUBMITTED',
             f"Health insurance form submitted by {form_data.get('name')} (Report Language: {form_data.get('report_language')})",
-            {'form_id': str(result.inserted_id), 'language': form_data.get('language'), 'report_language': form_data.get('report_language')}
+            {'form_id': str(result.inserted_id), 'language': form_data.get('language'), 'report_language': form_data.get('report_language')},
+            actor=agent
         )
         
         return str(result.inserted_id), None
@@ -132,27 +166,14 @@ class HealthInsuranceFormService:
         form_data = self.forms.find_one({'_id': ObjectId(form_id)})
         return HealthInsuranceForm(form_data) if form_data else None
     
-    def get_agent_forms(self, agent_id, page=1, per_page=10):
+    def get_agent_forms(self, agent_id, page=1, per_page=10, cursor=None, exact_total=False, view='list_row'):
         """Get all forms submitted via agent's links"""
         query = {'agent_id': ObjectId(agent_id)}
         
-        # Calculate skip value
-        skip = (page - 1) * per_page
-        
-        # Get total count
-        total = self.forms.count_documents(query)
-        
-        # Get paginated results
-        forms_data = self.forms.find(query).skip(skip).limit(per_page).sort('created_at', -1)
-        forms = [HealthInsuranceForm(data) for data in forms_data]
-        
-        return {
-            'forms': forms,
-            'total': total,
-            'page': page,
-            'per_page': per_page,
-            'total_pages': (total + per_page - 1) // per_page
-        }
+        result = keyset_paginate(raw_collection(self.forms), query, page, per_page, cursor, HealthInsuranceForm.projection(view),
+                                 exact_total=exact_total)
+        result['forms'] = [HealthInsuranceForm(data) for data in result.pop('items')]
+        return result
     
     def toggle_link_status(self, link_id, agent_id):
         """Toggle form link active status"""
@@ -182,6 +203,7 @@ class HealthInsuranceFormService:
             {'_id': ObjectId(link_id)},
             {'$set': update_data}
         )
+        form_link_cache.invalidate(link_data.get('token'))
         
         return True
     
@@ -195,14 +217,13 @@ class HealthInsuranceFormService:
         if str(form.agent_id) != str(agent_id):
             return None, "Unauthorized access", None
         
-        # Get agent details
-        agent = self.users.find_one({'_id': ObjectId(agent_id)})
-        if not agent:
-            return None, "Agent not found", None
+        # Reserve one unit of the agent (and partner) PDF quota up front
+        quota_service = PdfQuotaService()
+        reservation, error = quota_service.reserve(agent_id)
+        if not reservation:
+            return None, error, None
         
-        # Check PDF limit
-        if agent.get('agent_pdf_generated', 0) >= agent.get('agent_pdf_limit', 0):
-            return None, "PDF generation limit reached", None
+        agent = reservation['agent']
         
         try:
             # Import PDF generator
@@ -224,25 +245,13 @@ class HealthInsuranceFormService:
             pdf_stream = pdf_generator.generate_pdf_stream(str(form_id), agent_info, pdf_language)
             
             if pdf_stream:
-                # Increment agent's PDF count
-                self.users.update_one(
-                    {'_id': ObjectId(agent_id)},
-                    {'$inc': {'agent_pdf_generated': 1}}
-                )
-                
-                # Update partner's PDF count
-                if agent.get('partner_id'):
-                    self.users.update_one(
-                        {'_id': agent['partner_id']},
-                        {'$inc': {'pdf_generated': 1}}
-                    )
-                
                 # Log activity
                 log_activity(
                     agent_id,
                     'PDF_GENERATED',
                     f"Generated health insurance PDF for {form.name} in {pdf_language}",
-                    {'form_id': form_id, 'language': pdf_language}
+                    {'form_id': form_id, 'language': pdf_language},
+                    actor=agent
                 )
                 
                 # Generate filename for download
@@ -251,29 +260,17 @@ class HealthInsuranceFormService:
                 
                 return pdf_stream, None, filename
             else:
+                quota_service.release(reservation)
                 return None, "PDF generation failed", None
                 
         except Exception as e:
+            quota_service.release(reservation)
             return None, f"PDF generation error: {str(e)}", None
     
-    def get_form_links(self, agent_id, page=1, per_page=10):
+    def get_form_links(self, agent_id, page=1, per_page=10, cursor=None, exact_total=False):
         """Get all form links created by agent"""
         query = {'agent_id': ObjectId(agent_id), 'form_type': 'health_insurance'}
         
-        # Calculate skip value
-        skip = (page - 1) * per_page
-        
-        # Get total count
-        total = self.form_links.count_documents(query)
-        
-        # Get paginated results
-        links_data = self.form_links.find(query).skip(skip).limit(per_page).sort('created_at', -1)
-        links = [FormLink(data) for data in links_data]
-        
-        return {
-            'links': links,
-            'total': total,
-            'page': page,
-            'per_page': per_page,
-            'total_pages': (total + per_page - 1) // per_page
-        }
\ No newline at end of file
+        result = keyset_paginate(raw_collection(self.form_links), query, page, per_page, cursor, exact_total=exact_total)
+        result['links'] = [FormLink(data) for data in result.pop('items')]
+        return result
\ No newline at end of file
@@ -15,7 +15,7 @@ from reportlab.pdfgen import canvas
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.pdfbase.pdfmetrics import registerFontFamily
-from pymongo import MongoClient
+from models import get_db
 from bson import ObjectId
 from flask import current_app
 import pytz
@@ -323,11 +323,8 @@ class HealthInsurancePDFGenerator:
             return Paragraph(str(text), style)
     
     def _get_mongodb_connection(self):
-        """Get MongoDB connection"""
-        mongo_uri = current_app.config.get('MONGO_URI', 'mongodb://localhost:27017/advisormitra')
-        client = MongoClient(mongo_uri)
-        db_name = mongo_uri.split('/')[-1]
-        return client[db_name]
+        """Get MongoDB database from the shared client registry"""
+        return get_db()
     
     def _mask_email(self, email):
         """Masks an email address for privacy"""
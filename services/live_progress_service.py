@@ -480,13 +480,12 @@ def register_socketio_events(socketio):
                 # Fallback to find agent_id
                 print(f"⚠️ No agent_id in progress data, trying to find from form link...")
                 try:
-                    from models.forms import get_form_links_collection
+                    from services.form_link_cache import form_link_cache
                     
-                    form_links = get_form_links_collection()
-                    link_data = form_links.find_one({'token': token})
+                    link = form_link_cache.get(token)
                     
-                    if link_data and link_data.get('agent_id'):
-                        agent_id = str(link_data['agent_id'])
+                    if link and link.agent_id:
+                        agent_id = str(link.agent_id)
                         print(f"✅ Found agent_id from form link: {agent_id}")
                         
                         # Update the progress data with agent_id
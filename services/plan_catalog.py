@@ -0,0 +1,185 @@
+# services/plan_catalog.py
+# Versioned in-process plan catalog: loaded once per worker, refreshed through a Redis version counter + pub/sub
+
+import logging
+import threading
+import time
+import redis
+from models.connection import mongo_registry
+from models.plan import Plan
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'plan_catalog:version'
+CHANNEL = 'plan_catalog:changed'
+
+
+class _Snapshot:
+    """One immutable load of the plans collection"""
+
+    __slots__ = ('version', 'by_id', 'active', 'loaded_at')
+
+    def __init__(self, version, plans):
+        self.version = version
+        self.by_id = {plan.id: plan for plan in plans}
+        self.active = tuple(plan for plan in plans if plan.is_active)
+        self.loaded_at = time.monotonic()
+
+
+class PlanCatalog:
+    """Every plan held in memory, keyed by id, with the active ones pre-sorted by price.
+
+    Plan writes go through PlanService, which calls invalidate(): that drops
+    this process's snapshot and (with Redis) bumps a shared version counter and
+    publishes it, so other workers drop theirs on their next poll. A worker
+    that misses messages (Redis restart, lost subscription) re-reads the
+    counter when it resubscribes; `ttl` bounds staleness when Redis is not
+    available at all.
+
+    Plans returned from here are shared between requests and must be treated
+    as read-only.
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self.ttl = 300
+        self.poll_interval = 1
+        self.redis_client = None
+        self._uri = None
+        self._snapshot = None
+        # Bumped by every invalidation; a load that started before one is not kept
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.db_loads = 0
+        self.remote_invalidations = 0
+        self.redis_errors = 0
+
+    def init_app(self, app, socketio=None):
+        config = app.config
+        self._uri = config['MONGO_URI']
+        self.enabled = config.get('PLAN_CATALOG_ENABLED', True)
+        self.ttl = config.get('PLAN_CATALOG_TTL', self.ttl)
+        self.poll_interval = config.get('PLAN_CATALOG_POLL_INTERVAL', self.poll_interval)
+
+        if self.enabled and config.get('PLAN_CATALOG_REDIS', False):
+            try:
+                self.redis_client = redis.from_url(config.get('REDIS_URL', 'redis://localhost:6379/0'))
+                self.redis_client.ping()
+            except Exception as e:
+                logger.warning(f"Plan catalog Redis sync disabled: {e}")
+                self.redis_client = None
+
+        if self.redis_client and socketio is not None:
+            socketio.start_background_task(self._listen, socketio)
+
+        app.extensions['plan_catalog'] = self
+
+    def _plans(self):
+        return mongo_registry.get_database(self._uri)['plans']
+
+    def _shared_version(self):
+        if not self.redis_client:
+            return 0
+        try:
+            return int(self.redis_client.get(VERSION_KEY) or 0)
+        except Exception as e:
+            self.redis_errors += 1
+            logger.warning(f"Plan catalog Redis read failed: {e}")
+            return 0
+
+    def _load(self):
+        version = self._shared_version()
+        self.db_loads += 1
+        plans = [Plan(data) for data in self._plans().find().sort('price', 1)]
+        return _Snapshot(version, plans)
+
+    def _current(self):
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() - snapshot.loaded_at < self.ttl:
+            return snapshot
+
+        with self._lock:
+            # Another greenlet may have reloaded while this one waited
+            snapshot = self._snapshot
+            if snapshot is None or time.monotonic() - snapshot.loaded_at >= self.ttl:
+                generation = self._generation
+                snapshot = self._load()
+                # Invalidated mid-load: serve this read, but do not cache what may predate the write
+                if generation == self._generation:
+                    self._snapshot = snapshot
+        return snapshot
+
+    def get(self, plan_id):
+        """Plan by id (any status), or None"""
+        return self._current().by_id.get(str(plan_id))
+
+    def active(self):
+        """Active plans sorted by price"""
+        return list(self._current().active)
+
+    def invalidate(self):
+        """Drop this process's snapshot and tell the other workers to drop theirs"""
+        self._generation += 1
+        self._snapshot = None
+        if not self.redis_client:
+            return
+        try:
+            version = self.redis_client.incr(VERSION_KEY)
+            self.redis_client.publish(CHANNEL, version)
+        except Exception as e:
+            self.redis_errors += 1
+            logger.warning(f"Plan catalog Redis invalidation failed: {e}")
+
+    def _on_version(self, version):
+        snapshot = self._snapshot
+        if snapshot is None:
+            # A load may be in flight from before this version
+            self._generation += 1
+        elif snapshot.version < version:
+            self._generation += 1
+            self._snapshot = None
+            self.remote_invalidations += 1
+
+    def _listen(self, socketio):
+        """Background task: drop the snapshot whenever another worker publishes a newer version"""
+        while True:
+            pubsub = None
+            try:
+                pubsub = self.redis_client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(CHANNEL)
+                # Messages published while unsubscribed are lost; catch up from the counter
+                self._on_version(self._shared_version())
+                while True:
+                    message = pubsub.get_message(timeout=0)
+                    while message:
+                        self._on_version(int(message['data']))
+                        message = pubsub.get_message(timeout=0)
+                    socketio.sleep(self.poll_interval)
+            except Exception as e:
+                self.redis_errors += 1
+                logger.warning(f"Plan catalog subscription lost: {e}")
+                socketio.sleep(max(self.poll_interval, 5))
+            finally:
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
+
+    def stats(self):
+        snapshot = self._snapshot
+        return {
+            'enabled': self.enabled,
+            'redis': self.redis_client is not None,
+            'loaded': snapshot is not None,
+            'version': snapshot.version if snapshot else None,
+            'plans': len(snapshot.by_id) if snapshot else 0,
+            'active_plans': len(snapshot.active) if snapshot else 0,
+            'ttl': self.ttl,
+            'db_loads': self.db_loads,
+            'remote_invalidations': self.remote_invalidations,
+            'redis_errors': self.redis_errors
+        }
+
+
+plan_catalog = PlanCatalog()
@@ -0,0 +1,241 @@
+# services/plan_expiry_service.py
+# Scheduled plan-expiry sweep: closes expired agent plans and queues expiry emails in bulk
+
+import logging
+import os
+import socket
+from datetime import datetime, timedelta
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+from models import get_users_collection, get_activities_collection, get_job_leases_collection
+from services.stats_service import StatsService, EXPIRED_PLAN_STATUS
+from services.user_session_cache import user_session_cache
+
+logger = logging.getLogger(__name__)
+
+EXPIRING_NOTICE = 'EXPIRING'
+
+# Plans that ran out longer ago than this (e.g. before the sweeper was deployed) are
+# marked EXPIRED without an email
+EXPIRED_NOTICE_MAX_AGE_DAYS = 7
+
+LEASE_ID = 'plan_expiry_sweep'
+# Longest a crashed sweep can keep other workers from sweeping; a running sweep
+# extends it after every chunk
+LEASE_SECONDS = 900
+
+# What the counters, activity log and emails need from each agent
+_AGENT_FIELDS = {name: 1 for name in (
+    'role', 'is_active', 'approval_status', 'plan_status', 'partner_id', 'agent_pdf_generated',
+    'username', 'full_name', 'email', 'plan_id', 'plan_expiry_date'
+)}
+
+# Last background sweep, reported by /api/system/metrics
+sweep_status = {'last_run_at': None, 'last_result': None, 'last_error': None}
+
+
+def expired_filter(now):
+    """Agents whose plan has run out but is not yet marked EXPIRED"""
+    return {'plan_expiry_date': {'$lte': now}, 'role': 'AGENT', 'plan_status': {'$ne': EXPIRED_PLAN_STATUS}}
+
+
+def expiring_filter(now, until):
+    """Agents whose plan runs out before `until` and who have not been warned"""
+    return {'plan_expiry_date': {'$gt': now, '$lte': until}, 'role': 'AGENT', 'plan_expiry_notice': None}
+
+
+class PlanExpiryService:
+    def __init__(self):
+        self.users = get_users_collection()
+        self.activities = get_activities_collection()
+        self.leases = get_job_leases_collection()
+        self.stats_service = StatsService()
+        self.holder = f'{socket.gethostname()}:{os.getpid()}'
+
+    def _acquire_lease(self, now):
+        """Only one worker sweeps at a time, so no agent is emailed twice"""
+        try:
+            self.leases.find_one_and_update(
+                {'_id': LEASE_ID, 'expires_at': {'$lte': now}},
+                {'$set': {'holder': self.holder, 'expires_at': now + timedelta(seconds=LEASE_SECONDS)}},
+                upsert=True
+            )
+            return True
+        except DuplicateKeyError:
+            return False
+
+    def _renew_lease(self):
+        """Extend the lease after a chunk; False if it lapsed and another worker may be sweeping"""
+        now = datetime.utcnow()
+        result = self.leases.update_one(
+            {'_id': LEASE_ID, 'holder': self.holder, 'expires_at': {'$gt': now}},
+            {'$set': {'expires_at': now + timedelta(seconds=LEASE_SECONDS)}}
+        )
+        return result.matched_count == 1
+
+    def _release_lease(self):
+        self.leases.update_one(
+            {'_id': LEASE_ID, 'holder': self.holder},
+            {'$set': {'expires_at': datetime.utcnow()}}
+        )
+
+    def sweep(self, warning_days=7, batch_size=500, send_emails=True, now=None):
+        """Mark expired plans EXPIRED and warn agents whose plan expires within `warning_days`.
+
+        Agents are read in plan_expiry_date order, `batch_size` at a time, and
+        each chunk is written with one bulk_write, one counter update and one
+        activity insert. The lease is extended after every chunk; if that fails
+        the sweep stops and `lease_lost` is set in the totals. Returns the
+        totals, or None when another worker holds the sweep lease.
+        """
+        now = now or datetime.utcnow()
+        if not self._acquire_lease(now):
+            return None
+
+        totals = {'expired': 0, 'expiring': 0, 'emails_sent': 0, 'emails_failed': 0, 'lease_lost': False}
+        try:
+            completed = self._process(
+                expired_filter(now),
+                {'plan_status': EXPIRED_PLAN_STATUS, 'plan_expired_at': now,
+                 'plan_expiry_notice': EXPIRED_PLAN_STATUS, 'updated_at': now},
+                'expired', now, batch_size, send_emails, totals
+            )
+            if completed and warning_days:
+                completed = self._process(
+                    expiring_filter(now, now + timedelta(days=warning_days)),
+                    {'plan_expiry_notice': EXPIRING_NOTICE},
+                    'expiring', now, batch_size, send_emails, totals
+                )
+            if not completed:
+                totals['lease_lost'] = True
+                logger.warning("Plan expiry sweep stopped: lease lost")
+        finally:
+            self._release_lease()
+
+        return totals
+
+    def _process(self, query, changes, stage, now, batch_size, send_emails, totals):
+        """Apply `changes` chunk by chunk; False if the lease was lost part way"""
+        while True:
+            agents = list(self.users.find(query, _AGENT_FIELDS).sort('plan_expiry_date', 1).limit(batch_size))
+            if not agents:
+                return True
+
+            # The filter is repeated per agent so a plan renewed since the read is left alone
+            ids = [agent['_id'] for agent in agents]
+            result = self.users.bulk_write(
+                [UpdateOne({**query, '_id': _id}, {'$set': changes}) for _id in ids],
+                ordered=False
+            )
+
+            # Counters, log entries and emails follow only the agents this chunk actually changed
+            changed_ids = set(self.users.distinct('_id', {'_id': {'$in': ids}, **changes}))
+            changed = [agent for agent in agents if agent['_id'] in changed_ids]
+            totals[stage] += len(changed)
+
+            if changed:
+                if stage == 'expired':
+                    self.stats_service.record_user_changes([(agent, {**agent, **changes}) for agent in changed])
+                    user_session_cache.invalidate(*[agent['_id'] for agent in changed])
+
+                self._log(changed, stage, now)
+                if send_emails:
+                    sent, failed = self._notify(changed, stage, now)
+                    totals['emails_sent'] += sent
+                    totals['emails_failed'] += failed
+
+            if not self._renew_lease():
+                return False
+            if len(agents) < batch_size or not result.modified_count:
+                return True
+
+    def _log(self, agents, stage, now):
+        """One activity insert per chunk"""
+        if stage == 'expired':
+            activity_type, description = 'PLAN_EXPIRED', 'Plan expired'
+        else:
+            activity_type, description = 'PLAN_EXPIRY_WARNING', 'Plan expiry reminder sent'
+
+        try:
+            self.activities.insert_many([
+                {
+                    'user_id': agent['_id'],
+                    'username': agent.get('username'),
+                    **({'partner_id': agent['partner_id']} if agent.get('partner_id') else {}),
+                    'activity_type': activity_type,
+                    'description': description,
+                    'metadata': {
+                        'plan_id': str(agent['plan_id']) if agent.get('plan_id') else None,
+                        'plan_expiry_date': agent.get('plan_expiry_date')
+                    },
+                    'ip_address': None,
+                    'user_agent': None,
+                    'created_at': now
+                }
+                for agent in agents
+            ], ordered=False)
+        except Exception as e:
+            logger.warning(f"Plan expiry activity log failed: {e}")
+
+    def _notify(self, agents, stage, now):
+        from services.email_service import EmailService
+        from services.plan_service import PlanService
+
+        recipients = [agent for agent in agents if agent.get('email')]
+        if stage == 'expired':
+            cutoff = now - timedelta(days=EXPIRED_NOTICE_MAX_AGE_DAYS)
+            recipients = [agent for agent in recipients if agent['plan_expiry_date'] > cutoff]
+        if not recipients:
+            return 0, 0
+
+        plan_ids = list({agent['plan_id'] for agent in recipients if agent.get('plan_id')})
+        plan_names = {plan.id: plan.name for plan in PlanService().get_plans_by_ids(plan_ids)}
+
+        return EmailService().send_plan_expiry_notices([
+            {
+                'email': agent['email'],
+                'name': agent.get('full_name') or agent.get('username'),
+                'plan_name': plan_names.get(str(agent.get('plan_id'))),
+                'expiry_date': agent.get('plan_expiry_date'),
+                'stage': EXPIRED_PLAN_STATUS if stage == 'expired' else EXPIRING_NOTICE
+            }
+            for agent in recipients
+        ])
+
+
+def start_plan_expiry_task(app, socketio):
+    """Periodically sweep plan expiry in a SocketIO background task.
+
+    The sweep itself (MongoDB reads/writes and SMTP) runs in eventlet's
+    native thread pool so it never holds up the hub serving requests.
+    """
+    interval = app.config.get('PLAN_EXPIRY_SWEEP_INTERVAL', 3600)
+    if not interval:
+        return
+
+    def sweep():
+        with app.app_context():
+            return PlanExpiryService().sweep(
+                warning_days=app.config.get('PLAN_EXPIRY_WARNING_DAYS', 7),
+                batch_size=app.config.get('PLAN_EXPIRY_BATCH_SIZE', 500),
+                send_emails=app.config.get('PLAN_EXPIRY_EMAILS', True)
+            )
+
+    def run():
+        while True:
+            try:
+                if socketio.async_mode == 'eventlet':
+                    from eventlet import tpool
+                    result = tpool.execute(sweep)
+                else:
+                    result = sweep()
+                sweep_status['last_run_at'] = datetime.utcnow()
+                if result is not None:
+                    sweep_status['last_result'] = result
+                sweep_status['last_error'] = None
+            except Exception as e:
+                sweep_status['last_error'] = str(e)
+                logger.warning(f"Plan expiry sweep failed: {e}")
+            socketio.sleep(interval)
+
+    socketio.start_background_task(run)
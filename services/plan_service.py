@@ -3,40 +3,43 @@ from bson import ObjectId
 from models import get_plans_collection
 from models.plan import Plan
 from utils.helpers import log_activity
+from services.stats_service import StatsService
+from utils.pagination import keyset_paginate
+from models.base import raw_collection
+from services.plan_catalog import plan_catalog
 
 class PlanService:
     def __init__(self):
         self.plans = get_plans_collection()
     
     def get_plan_by_id(self, plan_id):
-        """Get plan by ID"""
+        """Get plan by ID (served from the in-process plan catalog)"""
+        if plan_catalog.enabled:
+            return plan_catalog.get(plan_id)
         plan_data = self.plans.find_one({'_id': ObjectId(plan_id)})
         return Plan(plan_data) if plan_data else None
     
-    def get_all_plans(self, filters=None, page=1, per_page=10):
+    def get_plans_by_ids(self, plan_ids):
+        """Plans for a list of ids (catalog lookups, or one $in query), in the order given"""
+        if not plan_ids:
+            return []
+        if plan_catalog.enabled:
+            plans = (plan_catalog.get(pid) for pid in plan_ids)
+            return [plan for plan in plans if plan]
+        ids = [ObjectId(pid) for pid in plan_ids]
+        by_id = {doc['_id']: doc for doc in self.plans.find({'_id': {'$in': ids}})}
+        return [Plan(by_id[pid]) for pid in ids if pid in by_id]
+    
+    def get_all_plans(self, filters=None, page=1, per_page=10, cursor=None, exact_total=False):
         """Get all plans with pagination"""
-        query = filters or {}
-        
-        # Calculate skip value
-        skip = (page - 1) * per_page
-        
-        # Get total count
-        total = self.plans.count_documents(query)
-        
-        # Get paginated results
-        plans_data = self.plans.find(query).skip(skip).limit(per_page).sort('created_at', -1)
-        plans = [Plan(data) for data in plans_data]
-        
-        return {
-            'plans': plans,
-            'total': total,
-            'page': page,
-            'per_page': per_page,
-            'total_pages': (total + per_page - 1) // per_page
-        }
+        result = keyset_paginate(raw_collection(self.plans), filters, page, per_page, cursor, exact_total=exact_total)
+        result['plans'] = [Plan(data) for data in result.pop('items')]
+        return result
     
     def get_active_plans(self):
-        """Get all active plans"""
+        """Get all active plans, cheapest first (served from the in-process plan catalog)"""
+        if plan_catalog.enabled:
+            return plan_catalog.active()
         plans_data = self.plans.find({'is_active': True}).sort('price', 1)
         return [Plan(data) for data in plans_data]
     
@@ -55,6 +58,8 @@ class PlanService:
         
         # Insert plan
         result = self.plans.insert_one(plan_data)
+        plan_catalog.invalidate()
+        StatsService().record_active_change('active_plans', False, plan_data.get('is_active', True))
         
         # Log activity
         log_activity(
@@ -95,6 +100,7 @@ class PlanService:
         )
         
         if result.modified_count > 0:
+            plan_catalog.invalidate()
             # Log activity
             log_activity(
                 updated_by_id,
@@ -121,6 +127,8 @@ class PlanService:
                 'updated_at': datetime.utcnow()
             }}
         )
+        plan_catalog.invalidate()
+        StatsService().record_active_change('active_plans', not new_status, new_status)
         
         # Log activity
         status_text = "activated" if new_status else "deactivated"
@@ -144,15 +152,18 @@ class PlanService:
             return False, f"Cannot delete plan. It is assigned to {assigned_users} user(s)."
         
         # Soft delete by marking inactive
-        result = self.plans.update_one(
+        before = self.plans.find_one_and_update(
             {'_id': ObjectId(plan_id)},
             {'$set': {
                 'is_active': False,
                 'updated_at': datetime.utcnow()
-            }}
+            }},
+            projection={'is_active': 1}
         )
         
-        if result.modified_count > 0:
+        if before:
+            plan_catalog.invalidate()
+            StatsService().record_active_change('active_plans', before.get('is_active', True), False)
             # Log activity
             log_activity(
                 deleted_by_id,
@@ -0,0 +1,160 @@
+# services/quota_service.py
+# Atomic PDF quota reservation for agents and their partners
+
+from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+from models import get_users_collection
+from services.stats_service import StatsService, EXPIRED_PLAN_STATUS
+from services.user_session_cache import user_session_cache
+
+# Fields returned with a successful agent reservation (used to render the PDF footer)
+_AGENT_RESERVATION_FIELDS = {
+    'role': 1,
+    'partner_id': 1,
+    'username': 1,
+    'full_name': 1,
+    'phone': 1,
+    'agent_pdf_generated': 1,
+    'agent_pdf_limit': 1
+}
+
+
+def _below_limit(used_field, limit_field):
+    """$expr condition: counter is strictly below its limit (missing counts as 0)"""
+    return {'$lt': [{'$ifNull': [f'${used_field}', 0]}, {'$ifNull': [f'${limit_field}', 0]}]}
+
+
+class PdfQuotaService:
+    def __init__(self):
+        self.users = get_users_collection()
+
+    def reserve(self, agent_id):
+        """Reserve one PDF unit against the agent and partner limits.
+
+        Each counter is checked and incremented in a single conditional
+        find_one_and_update, so concurrent downloads cannot overshoot a limit.
+        Returns (reservation, error).
+        """
+        agent = self.users.find_one_and_update(
+            {
+                '_id': ObjectId(agent_id),
+                'role': 'AGENT',
+                'plan_status': {'$ne': EXPIRED_PLAN_STATUS},
+                '$expr': _below_limit('agent_pdf_generated', 'agent_pdf_limit')
+            },
+            {'$inc': {'agent_pdf_generated': 1}},
+            projection=_AGENT_RESERVATION_FIELDS,
+            return_document=ReturnDocument.AFTER
+        )
+
+        if not agent:
+            return None, "PDF generation limit reached or plan expired"
+
+        partner_id = agent.get('partner_id')
+        if partner_id:
+            partner = self.users.find_one_and_update(
+                {
+                    '_id': partner_id,
+                    'role': 'PARTNER',
+                    '$expr': _below_limit('pdf_generated', 'pdf_limit')
+                },
+                {'$inc': {'pdf_generated': 1}},
+                projection={'_id': 1}
+            )
+
+            if not partner:
+                # Give the agent unit back; the partner pool is exhausted
+                self._decrement(agent['_id'], 'agent_pdf_generated')
+                return None, "Partner PDF limit reached"
+
+        StatsService().record_pdf_generated(partner_id, 1)
+        user_session_cache.invalidate(agent['_id'], partner_id)
+
+        return {'agent_id': agent['_id'], 'partner_id': partner_id, 'agent': agent}, None
+
+    def release(self, reservation):
+        """Refund a reservation (e.g. when PDF rendering fails)"""
+        if not reservation:
+            return
+
+        self._decrement(reservation['agent_id'], 'agent_pdf_generated')
+        if reservation.get('partner_id'):
+            self._decrement(reservation['partner_id'], 'pdf_generated')
+
+        StatsService().record_pdf_generated(reservation.get('partner_id'), -1)
+        user_session_cache.invalidate(reservation['agent_id'], reservation.get('partner_id'))
+
+    def _decrement(self, user_id, field):
+        """Decrement a counter without letting it go negative"""
+        self.users.update_one(
+            {'_id': ObjectId(user_id), field: {'$gt': 0}},
+            {'$inc': {field: -1}}
+        )
+
+    def get_agent_quota(self, agent_id):
+        """Get agent PDF usage from the agent document"""
+        agent = self.users.find_one(
+            {'_id': ObjectId(agent_id)},
+            {'agent_pdf_generated': 1, 'agent_pdf_limit': 1}
+        )
+        if not agent:
+            return None
+
+        used = agent.get('agent_pdf_generated', 0)
+        limit = agent.get('agent_pdf_limit', 0)
+        return {'used': used, 'limit': limit, 'remaining': max(0, limit - used)}
+
+    def get_partner_quota(self, partner_id):
+        """Get partner PDF usage from the partner's maintained counter (no agent scan).
+
+        The partner's pdf_generated is the sum of its agents'
+        agent_pdf_generated, kept in step on the write paths: reserve() and
+        release() move both, and a plan assignment that resets an agent's
+        count takes that count off the partner. sync_partner_counters()
+        recomputes it (run it once after upgrading, or after editing agent
+        counters by hand).
+        """
+        partner = self.users.find_one(
+            {'_id': ObjectId(partner_id), 'role': 'PARTNER'},
+            {'pdf_generated': 1, 'pdf_limit': 1}
+        )
+        if not partner:
+            return None
+
+        used = partner.get('pdf_generated', 0)
+        limit = partner.get('pdf_limit', 0)
+        return {'used': used, 'limit': limit, 'remaining': max(0, limit - used)}
+
+    def sync_partner_counters(self, apply=True):
+        """Set each partner's pdf_generated to the sum of its agents' agent_pdf_generated.
+
+        Each write is conditional on the value read, so a partner whose counter
+        moves during the sync is left alone (run the sync again). Returns a
+        list of {'_id', 'stored', 'actual'} for every partner that did not match.
+        """
+        totals = {
+            row['_id']: row['total']
+            for row in self.users.aggregate([
+                {'$match': {'role': 'AGENT', 'partner_id': {'$ne': None}}},
+                {'$group': {'_id': '$partner_id', 'total': {'$sum': {'$ifNull': ['$agent_pdf_generated', 0]}}}}
+            ])
+        }
+
+        drift = []
+        operations = []
+        for partner in self.users.find({'role': 'PARTNER'}, {'pdf_generated': 1}):
+            stored = partner.get('pdf_generated')
+            actual = totals.get(partner['_id'], 0)
+            if (stored or 0) != actual:
+                drift.append({'_id': partner['_id'], 'stored': stored or 0, 'actual': actual})
+                # None also matches a partner without the field
+                operations.append(UpdateOne(
+                    {'_id': partner['_id'], 'pdf_generated': stored},
+                    {'$set': {'pdf_generated': actual}}
+                ))
+
+        if apply and operations:
+            self.users.bulk_write(operations, ordered=False)
+            user_session_cache.invalidate(*[d['_id'] for d in drift])
+
+        return drift
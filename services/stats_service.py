@@ -0,0 +1,321 @@
+# services/stats_service.py
+# Dashboard statistics: incrementally maintained counters in the `stats` collection,
+# with the single-aggregation pipeline used to (re)build them from source data
+
+import logging
+from datetime import datetime
+from bson import ObjectId
+from pymongo import UpdateOne, ReplaceOne
+from models import get_users_collection, get_stats_collection
+
+logger = logging.getLogger(__name__)
+
+PENDING_STATUSES = ['PENDING', 'PARTNER_APPROVED']
+
+# Agents whose plan the expiry sweeper has closed no longer count as active
+EXPIRED_PLAN_STATUS = 'EXPIRED'
+
+PLATFORM_STATS_ID = 'platform'
+
+PLATFORM_COUNTERS = [
+    'total_partners',
+    'active_partners',
+    'total_agents',
+    'active_agents',
+    'pending_approvals',
+    'active_plans',
+    'active_coupons',
+    'total_pdf_limit',
+    'total_pdfs_generated'
+]
+
+PARTNER_COUNTERS = [
+    'total_agents',
+    'active_agents',
+    'pending_agents',
+    'agent_pdf_generated'
+]
+
+_IS_PARTNER = {'$eq': ['$role', 'PARTNER']}
+_IS_AGENT = {'$eq': ['$role', 'AGENT']}
+_IS_ACTIVE = {'$and': [
+    {'$eq': ['$is_active', True]},
+    {'$eq': ['$approval_status', 'APPROVED']},
+    {'$ne': ['$plan_status', EXPIRED_PLAN_STATUS]}
+]}
+_IS_PENDING = {'$in': [{'$ifNull': ['$approval_status', None]}, PENDING_STATUSES]}
+
+
+def _count_if(condition):
+    return {'$sum': {'$cond': [condition, 1, 0]}}
+
+
+def _sum_if(condition, field):
+    return {'$sum': {'$cond': [condition, {'$ifNull': [f'${field}', 0]}, 0]}}
+
+
+def platform_stats_pipeline():
+    """One pass over users (plus active plans/coupons via $unionWith) grouped into every dashboard number"""
+    return [
+        {'$project': {
+            'role': 1,
+            'is_active': 1,
+            'approval_status': 1,
+            'plan_status': 1,
+            'pdf_limit': 1,
+            'agent_pdf_generated': 1
+        }},
+        {'$unionWith': {'coll': 'plans', 'pipeline': [
+            {'$match': {'is_active': True}},
+            {'$project': {'_kind': {'$literal': 'plan'}}}
+        ]}},
+        {'$unionWith': {'coll': 'coupons', 'pipeline': [
+            {'$match': {'is_active': True}},
+            {'$project': {'_kind': {'$literal': 'coupon'}}}
+        ]}},
+        {'$group': {
+            '_id': None,
+            'total_partners': _count_if(_IS_PARTNER),
+            'active_partners': _count_if({'$and': [_IS_PARTNER, _IS_ACTIVE]}),
+            'total_agents': _count_if(_IS_AGENT),
+            'active_agents': _count_if({'$and': [_IS_AGENT, _IS_ACTIVE]}),
+            'pending_approvals': _count_if(_IS_PENDING),
+            'active_plans': _count_if({'$eq': ['$_kind', 'plan']}),
+            'active_coupons': _count_if({'$eq': ['$_kind', 'coupon']}),
+            'total_pdf_limit': _sum_if(_IS_PARTNER, 'pdf_limit'),
+            'total_pdfs_generated': _sum_if(_IS_AGENT, 'agent_pdf_generated')
+        }},
+        {'$project': {'_id': 0}}
+    ]
+
+
+def partner_stats_pipeline():
+    """Per-partner agent counters grouped from the agent documents"""
+    return [
+        {'$match': {'role': 'AGENT', 'partner_id': {'$ne': None}}},
+        {'$group': {
+            '_id': '$partner_id',
+            'total_agents': {'$sum': 1},
+            'active_agents': _count_if(_IS_ACTIVE),
+            'pending_agents': _count_if(_IS_PENDING),
+            'agent_pdf_generated': {'$sum': {'$ifNull': ['$agent_pdf_generated', 0]}}
+        }}
+    ]
+
+
+def partner_stats_id(partner_id):
+    return f'partner:{partner_id}'
+
+
+def _user_contribution(doc):
+    """What one user document adds to the counters: (platform, partner_id, partner)"""
+    if not doc:
+        return {}, None, {}
+
+    role = doc.get('role')
+    active = 1 if (doc.get('is_active') is True and doc.get('approval_status') == 'APPROVED'
+                   and doc.get('plan_status') != EXPIRED_PLAN_STATUS) else 0
+    pending = 1 if doc.get('approval_status') in PENDING_STATUSES else 0
+
+    platform = {'pending_approvals': pending}
+    partner = {}
+    partner_id = None
+
+    if role == 'PARTNER':
+        platform['total_partners'] = 1
+        platform['active_partners'] = active
+        platform['total_pdf_limit'] = doc.get('pdf_limit') or 0
+    elif role == 'AGENT':
+        pdfs = doc.get('agent_pdf_generated') or 0
+        platform['total_agents'] = 1
+        platform['active_agents'] = active
+        platform['total_pdfs_generated'] = pdfs
+
+        partner_id = doc.get('partner_id')
+        if partner_id:
+            partner = {
+                'total_agents': 1,
+                'active_agents': active,
+                'pending_agents': pending,
+                'agent_pdf_generated': pdfs
+            }
+
+    return platform, partner_id, partner
+
+
+def _diff(before, after):
+    """Non-zero per-counter differences between two contributions"""
+    delta = {}
+    for key in set(before) | set(after):
+        value = after.get(key, 0) - before.get(key, 0)
+        if value:
+            delta[key] = value
+    return delta
+
+
+def _merge(total, delta):
+    for key, value in delta.items():
+        total[key] = total.get(key, 0) + value
+
+
+class StatsService:
+    # Set once the platform counters are known to have been built from source data
+    _bootstrapped = False
+
+    def __init__(self):
+        self.users = get_users_collection()
+        self.stats = get_stats_collection()
+
+    # ------------------------------------------------------------------
+    # Write side: $inc on state changes
+    # ------------------------------------------------------------------
+
+    def record_user_change(self, before, after):
+        """Apply the counter delta between two versions of a user document.
+
+        Pass before=None for inserts. Failures are logged, never raised:
+        drift is repaired by 'python manage.py reconcile-stats'.
+        """
+        self.record_user_changes([(before, after)])
+
+    def record_user_changes(self, changes):
+        """record_user_change() for many (before, after) pairs, applied as one bulk write"""
+        platform_delta = {}
+        partner_deltas = {}
+        for before, after in changes:
+            before_platform, before_partner_id, before_partner = _user_contribution(before)
+            after_platform, after_partner_id, after_partner = _user_contribution(after)
+            _merge(platform_delta, _diff(before_platform, after_platform))
+            if before_partner_id == after_partner_id:
+                if after_partner_id:
+                    _merge(partner_deltas.setdefault(after_partner_id, {}), _diff(before_partner, after_partner))
+            else:
+                if before_partner_id:
+                    _merge(partner_deltas.setdefault(before_partner_id, {}), _diff(before_partner, {}))
+                if after_partner_id:
+                    _merge(partner_deltas.setdefault(after_partner_id, {}), _diff({}, after_partner))
+
+        self._apply(platform_delta, partner_deltas)
+
+    def record_pdf_generated(self, partner_id, count=1):
+        """Count generated (or refunded, with a negative count) PDFs"""
+        partner_deltas = {partner_id: {'agent_pdf_generated': count}} if partner_id else {}
+        self._apply({'total_pdfs_generated': count}, partner_deltas)
+
+    def record_active_change(self, counter, was_active, is_active):
+        """Track active plans/coupons (counter is 'active_plans' or 'active_coupons')"""
+        delta = int(bool(is_active)) - int(bool(was_active))
+        if delta:
+            self._apply({counter: delta}, {})
+
+    def record_active_created(self, counter, count):
+        """Track `count` plans/coupons created active in one go"""
+        if count:
+            self._apply({counter: count}, {})
+
+    def _apply(self, platform_delta, partner_deltas):
+        now = datetime.utcnow()
+        operations = []
+
+        if platform_delta:
+            operations.append(UpdateOne(
+                {'_id': PLATFORM_STATS_ID},
+                {'$inc': platform_delta, '$set': {'updated_at': now}},
+                upsert=True
+            ))
+
+        for partner_id, delta in partner_deltas.items():
+            if delta:
+                operations.append(UpdateOne(
+                    {'_id': partner_stats_id(partner_id)},
+                    {'$inc': delta, '$set': {'partner_id': ObjectId(partner_id), 'updated_at': now}},
+                    upsert=True
+                ))
+
+        if not operations:
+            return
+
+        try:
+            self.stats.bulk_write(operations, ordered=False)
+        except Exception as e:
+            logger.warning(f"Stats counter update failed (run reconcile-stats to repair): {e}")
+
+    # ------------------------------------------------------------------
+    # Read side: O(1) lookups
+    # ------------------------------------------------------------------
+
+    def _ensure_bootstrapped(self):
+        """Build the counters from source data the first time they are read"""
+        if StatsService._bootstrapped:
+            return
+
+        platform = self.stats.find_one({'_id': PLATFORM_STATS_ID}, {'reconciled_at': 1})
+        if not platform or not platform.get('reconciled_at'):
+            self.reconcile()
+        StatsService._bootstrapped = True
+
+    def get_platform_statistics(self):
+        """Get super admin dashboard statistics from the platform counter document"""
+        self._ensure_bootstrapped()
+        doc = self.stats.find_one({'_id': PLATFORM_STATS_ID}) or {}
+        return {name: doc.get(name, 0) for name in PLATFORM_COUNTERS}
+
+    def get_partner_counters(self, partner_id):
+        """Get agent counters for one partner"""
+        self._ensure_bootstrapped()
+        doc = self.stats.find_one({'_id': partner_stats_id(partner_id)}) or {}
+        return {name: doc.get(name, 0) for name in PARTNER_COUNTERS}
+
+    # ------------------------------------------------------------------
+    # Rebuild from source data
+    # ------------------------------------------------------------------
+
+    def compute_platform_statistics(self):
+        """Compute platform statistics from source data in a single aggregation"""
+        result = list(self.users.aggregate(platform_stats_pipeline()))
+        stats = {name: 0 for name in PLATFORM_COUNTERS}
+        if result:
+            stats.update(result[0])
+        return stats
+
+    def reconcile(self, apply=True):
+        """Rebuild all counters from source data and report drift.
+
+        Returns a list of {'_id', 'field', 'stored', 'actual'} for every counter
+        that did not match. Increments racing with a rebuild may be lost; run it
+        again (or off-peak) if exact numbers matter.
+        """
+        now = datetime.utcnow()
+
+        expected = {PLATFORM_STATS_ID: self.compute_platform_statistics()}
+        partner_ids = {}
+        for row in self.users.aggregate(partner_stats_pipeline()):
+            doc_id = partner_stats_id(row['_id'])
+            partner_ids[doc_id] = row['_id']
+            expected[doc_id] = {name: row.get(name, 0) for name in PARTNER_COUNTERS}
+
+        # Partner counter documents whose agents are all gone reset to zero
+        for doc in self.stats.find({'partner_id': {'$exists': True}}, {'partner_id': 1}):
+            if doc['_id'] not in expected:
+                partner_ids[doc['_id']] = doc['partner_id']
+                expected[doc['_id']] = {name: 0 for name in PARTNER_COUNTERS}
+
+        stored = {doc['_id']: doc for doc in self.stats.find({'_id': {'$in': list(expected)}})}
+
+        drift = []
+        for doc_id, counters in expected.items():
+            current = stored.get(doc_id, {})
+            for name, actual in counters.items():
+                if current.get(name, 0) != actual:
+                    drift.append({'_id': doc_id, 'field': name, 'stored': current.get(name, 0), 'actual': actual})
+
+        if apply:
+            operations = []
+            for doc_id, counters in expected.items():
+                replacement = dict(counters, updated_at=now, reconciled_at=now)
+                if doc_id in partner_ids:
+                    replacement['partner_id'] = partner_ids[doc_id]
+                operations.append(ReplaceOne({'_id': doc_id}, replacement, upsert=True))
+            self.stats.bulk_write(operations, ordered=False)
+
+        return drift
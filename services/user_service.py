@@ -7,6 +7,11 @@ from models import get_users_collection, get_plans_collection, get_registration_
 from models.user import User
 from models.plan import Plan
 from utils.helpers import log_activity, calculate_plan_expiry, generate_registration_link, check_partner_pdf_limit
+from services.stats_service import StatsService
+from services.user_session_cache import user_session_cache
+from utils.pagination import keyset_paginate
+from models.base import raw_collection
+from pymongo import ReturnDocument
 import secrets
 from flask_login import current_user
 
@@ -15,20 +20,21 @@ class UserService:
         self.users = get_users_collection()
         self.plans = get_plans_collection()
         self.registration_links = get_registration_links_collection()
+        self.stats_service = StatsService()
     
-    def get_user_by_id(self, user_id):
+    def get_user_by_id(self, user_id, view='detail'):
         """Get user by ID"""
-        user_data = self.users.find_one({'_id': ObjectId(user_id)})
+        user_data = self.users.find_one({'_id': ObjectId(user_id)}, User.projection(view))
         return User(user_data) if user_data else None
     
-    def get_user_by_username(self, username):
+    def get_user_by_username(self, username, view='detail'):
         """Get user by username"""
-        user_data = self.users.find_one({'username': username})
+        user_data = self.users.find_one({'username': username}, User.projection(view))
         return User(user_data) if user_data else None
     
-    def get_user_by_email(self, email):
+    def get_user_by_email(self, email, view='detail'):
         """Get user by email"""
-        user_data = self.users.find_one({'email': email})
+        user_data = self.users.find_one({'email': email}, User.projection(view))
         return User(user_data) if user_data else None
     
     def create_partner(self, partner_data, created_by_id):
@@ -70,6 +76,7 @@ class UserService:
         
         # Insert partner
         result = self.users.insert_one(partner_data)
+        self.stats_service.record_user_change(None, partner_data)
         
         # Log activity
         log_activity(
@@ -160,6 +167,7 @@ class UserService:
         
         # Insert agent
         result = self.users.insert_one(agent_data)
+        self.stats_service.record_user_change(None, agent_data)
         
         # Mark link as used
         self.registration_links.update_one(
@@ -178,7 +186,8 @@ class UserService:
             str(result.inserted_id),
             'AGENT_REGISTERED',
             f"Agent {agent_data['username']} registered via link",
-            {'partner_id': str(link['partner_id'])}
+            {'partner_id': str(link['partner_id'])},
+            actor=agent_data
         )
         
         return str(result.inserted_id), None
@@ -252,6 +261,9 @@ class UserService:
                 return False, "User is already approved"
             return False, "Failed to update user status"
         
+        self.stats_service.record_user_change(user_data, {**user_data, **update_data})
+        user_session_cache.invalidate(user_data['_id'])
+        
         # Log activity
         log_activity(
             approver_id,
@@ -277,18 +289,25 @@ class UserService:
         elif rejector_role != 'SUPER_ADMIN':
             return False, "Insufficient permissions"
         
-        # Update user
-        self.users.update_one(
-            {'_id': ObjectId(user_id)},
-            {
-                '$set': {
-                    'approval_status': 'REJECTED',
-                    'rejection_reason': reason,
-                    'updated_at': datetime.utcnow(),
-                    'is_active': False
-                }
-            }
+        if user.approval_status == 'REJECTED':
+            return False, "User is already rejected"
+        
+        # Update user, only from the status that was read, so counters move once
+        update_data = {
+            'approval_status': 'REJECTED',
+            'rejection_reason': reason,
+            'updated_at': datetime.utcnow(),
+            'is_active': False
+        }
+        result = self.users.update_one(
+            {'_id': user_data['_id'], 'approval_status': user_data.get('approval_status')},
+            {'$set': update_data}
         )
+        if result.modified_count != 1:
+            return False, "User status changed, please try again"
+        
+        self.stats_service.record_user_change(user_data, {**user_data, **update_data})
+        user_session_cache.invalidate(user_data['_id'])
         
         # Log activity
         log_activity(
@@ -300,131 +319,177 @@ class UserService:
         
         return True, "User rejected"
     
-    def get_partner_agents(self, partner_id, filters=None, page=1, per_page=10):
-        """Get agents belonging to a partner"""
-        query = {'role': 'AGENT', 'partner_id': ObjectId(partner_id)}
-        if filters:
-            query.update(filters)
+    def toggle_user_status(self, user_id, updated_by_id):
+        """Toggle user active status"""
+        user_data = self.users.find_one({'_id': ObjectId(user_id)})
+        if not user_data:
+            return False, "User not found"
         
-        # Calculate skip value
-        skip = (page - 1) * per_page
+        new_status = not user_data.get('is_active', True)
+        update_data = {
+            'is_active': new_status,
+            'updated_at': datetime.utcnow()
+        }
         
-        # Get total count
-        total = self.users.count_documents(query)
+        # Only from the status that was read, so a concurrent toggle cannot move the counters twice
+        before = self.users.find_one_and_update(
+            {'_id': user_data['_id'], 'is_active': user_data.get('is_active')},
+            {'$set': update_data},
+            return_document=ReturnDocument.BEFORE
+        )
+        if not before:
+            return False, "User status changed, please try again"
         
-        # Get paginated results
-        users_data = self.users.find(query).skip(skip).limit(per_page).sort('created_at', -1)
-        users = [User(data) for data in users_data]
+        self.stats_service.record_user_change(before, {**before, **update_data})
+        user_session_cache.invalidate(user_data['_id'])
         
-        # Get plan details for agents
-        for user in users:
-            if user.plan_id:
-                plan_data = self.plans.find_one({'_id': user.plan_id})
-                if plan_data:
-                    user.plan = Plan(plan_data)
+        # Log activity
+        status_text = "activated" if new_status else "deactivated"
+        log_activity(
+            updated_by_id,
+            'USER_STATUS_CHANGE',
+            f"User {user_data.get('username')} {status_text}",
+            {'user_id': user_id, 'new_status': new_status}
+        )
         
-        return {
-            'users': users,
-            'total': total,
-            'page': page,
-            'per_page': per_page,
-            'total_pages': (total + per_page - 1) // per_page
-        }
+        return True, f"User {status_text} successfully."
     
-    def get_all_users_with_partners(self, filters=None, page=1, per_page=10):
-        """Get all users with partner information (for super admin)"""
-        query = filters or {}
+    def get_partner_agents(self, partner_id, filters=None, page=1, per_page=10, cursor=None, exact_total=False,
+                           view='list_row'):
+        """Get agents belonging to a partner"""
+        query = {'role': 'AGENT', 'partner_id': ObjectId(partner_id)}
+        if filters:
+            query.update(filters)
         
-        # Calculate skip value
-        skip = (page - 1) * per_page
+        result = keyset_paginate(raw_collection(self.users), query, page, per_page, cursor, User.projection(view),
+                                 exact_total=exact_total)
+        users = [User(data) for data in result.pop('items')]
         
-        # Get total count
-        total = self.users.count_documents(query)
+        # Get plan details for agents (one batched query)
+        self._attach_related(users, partners=False)
         
-        # Get paginated results
-        users_data = self.users.find(query).skip(skip).limit(per_page).sort('created_at', -1)
-        users = []
+        result['users'] = users
+        return result
+    
+    def get_all_users_with_partners(self, filters=None, page=1, per_page=10, cursor=None, exact_total=False,
+                                    view='list_row'):
+        """Get all users with partner information (for super admin)"""
+        result = keyset_paginate(raw_collection(self.users), filters, page, per_page, cursor, User.projection(view),
+                                 exact_total=exact_total)
+        users = [User(data) for data in result.pop('items')]
         
-        for data in users_data:
-            user = User(data)
-            
-            # Get partner info for agents
-            if user.role == 'AGENT' and user.partner_id:
-                partner_data = self.users.find_one({'_id': user.partner_id})
-                if partner_data:
-                    user.partner = User(partner_data)
-            
-            # Get plan details for agents
-            if user.role == 'AGENT' and user.plan_id:
-                plan_data = self.plans.find_one({'_id': user.plan_id})
-                if plan_data:
-                    user.plan = Plan(plan_data)
-            
-            users.append(user)
+        # Get partner info and plan details for agents (one batched query each)
+        self._attach_related(users)
         
-        return {
-            'users': users,
-            'total': total,
-            'page': page,
-            'per_page': per_page,
-            'total_pages': (total + per_page - 1) // per_page
-        }
+        result['users'] = users
+        return result
+    
+    def _attach_related(self, users, partners=True, plans=True):
+        """Attach partner (User) and plan (Plan) objects to agents with one $in query per collection"""
+        agents = [user for user in users if user.role == 'AGENT']
+        
+        if partners:
+            partner_ids = {user.partner_id for user in agents if user.partner_id}
+            if partner_ids:
+                partners_by_id = {
+                    data['_id']: User(data)
+                    for data in raw_collection(self.users).find(
+                        {'_id': {'$in': list(partner_ids)}}, User.projection('ref')
+                    )
+                }
+                for user in agents:
+                    partner = partners_by_id.get(user.partner_id)
+                    if partner:
+                        user.partner = partner
+        
+        if plans:
+            plan_ids = {user.plan_id for user in agents if user.plan_id}
+            if plan_ids:
+                plans_by_id = {
+                    data['_id']: Plan(data)
+                    for data in raw_collection(self.plans).find({'_id': {'$in': list(plan_ids)}})
+                }
+                for user in agents:
+                    plan = plans_by_id.get(user.plan_id)
+                    if plan:
+                        user.plan = plan
     
     def update_partner_limits(self, partner_id, pdf_limit, updated_by_id):
         """Update partner PDF limits"""
-        result = self.users.update_one(
+        update_data = {
+            'pdf_limit': pdf_limit,
+            'updated_at': datetime.utcnow()
+        }
+        if not ObjectId.is_valid(partner_id):
+            return False, "Partner not found"
+        
+        # The document before the write: None means no partner matched
+        before = self.users.find_one_and_update(
             {'_id': ObjectId(partner_id), 'role': 'PARTNER'},
-            {
-                '$set': {
-                    'pdf_limit': pdf_limit,
-                    'updated_at': datetime.utcnow()
-                }
-            }
+            {'$set': update_data},
+            return_document=ReturnDocument.BEFORE
         )
+        if not before:
+            return False, "Partner not found"
         
-        if result.modified_count > 0:
-            log_activity(
-                updated_by_id,
-                'PARTNER_LIMITS_UPDATED',
-                f"Updated partner PDF limit to {pdf_limit}",
-                {'partner_id': partner_id}
-            )
-            return True, "Partner limits updated successfully"
-        
-        return False, "Failed to update partner limits"
+        self.stats_service.record_user_change(before, {**before, **update_data})
+        user_session_cache.invalidate(before['_id'])
+        log_activity(
+            updated_by_id,
+            'PARTNER_LIMITS_UPDATED',
+            f"Updated partner PDF limit to {pdf_limit}",
+            {'partner_id': partner_id}
+        )
+        return True, "Partner limits updated successfully"
     
     def get_partner_statistics(self, partner_id):
-        """Get statistics for a partner"""
-        # Get partner data
-        partner = self.users.find_one({'_id': ObjectId(partner_id), 'role': 'PARTNER'})
+        """Get statistics for a partner from maintained counters"""
+        # PDF limit and usage from the partner counter the quota is enforced against
+        partner = self.users.find_one(
+            {'_id': ObjectId(partner_id), 'role': 'PARTNER'},
+            {'pdf_limit': 1, 'pdf_generated': 1}
+        )
         if not partner:
             return None
         
-        # Count agents
-        total_agents = self.users.count_documents({'partner_id': ObjectId(partner_id), 'role': 'AGENT'})
-        active_agents = self.users.count_documents({
-            'partner_id': ObjectId(partner_id), 
-            'role': 'AGENT',
-            'is_active': True,
-            'approval_status': 'APPROVED'
-        })
-        pending_agents = self.users.count_documents({
-            'partner_id': ObjectId(partner_id), 
-            'role': 'AGENT',
-            'approval_status': {'$in': ['PENDING', 'PARTNER_APPROVED']}
-        })
+        # Agent counts from the partner's counter document
+        counters = self.stats_service.get_partner_counters(partner_id)
+        pdf_limit = partner.get('pdf_limit', 0)
+        pdf_generated = partner.get('pdf_generated', 0)
         
-        # Calculate PDF usage
-        agents = self.users.find({'partner_id': ObjectId(partner_id), 'role': 'AGENT'})
-        total_pdfs_generated = sum(agent.get('agent_pdf_generated', 0) for agent in agents)
+        return {
+            'total_agents': counters['total_agents'],
+            'active_agents': counters['active_agents'],
+            'pending_agents': counters['pending_agents'],
+            'pdf_limit': pdf_limit,
+            'pdf_generated': pdf_generated,
+            'pdf_remaining': max(0, pdf_limit - pdf_generated)
+        }
+    
+    def get_partner_resources(self, partner):
+        """Plans and coupons assigned to a partner, with coupon usage and PDF usage.
+
+        A fixed number of reads however many resources are assigned: plans come
+        from the plan catalog ($in when it is disabled), coupons and this
+        partner's coupon limits are one $in query each, and PDF usage is the
+        partner's own maintained counter.
+        """
+        from services.plan_service import PlanService
+        from services.coupon_service import CouponService
+        coupon_service = CouponService()
+        
+        plans = PlanService().get_plans_by_ids(partner.assigned_plans or [])
+        coupons = coupon_service.get_coupons_by_ids(partner.assigned_coupons or [])
+        usage = coupon_service.get_partner_coupon_usage(partner.id, [c.id for c in coupons])
+        for coupon in coupons:
+            if coupon.id in usage:
+                coupon.usage_stats = usage[coupon.id]
         
         return {
-            'total_agents': total_agents,
-            'active_agents': active_agents,
-            'pending_agents': pending_agents,
-            'pdf_limit': partner.get('pdf_limit', 0),
-            'pdf_generated': total_pdfs_generated,
-            'pdf_remaining': max(0, partner.get('pdf_limit', 0) - total_pdfs_generated)
+            'plans': plans,
+            'coupons': coupons,
+            'pdf_used': partner.pdf_generated or 0,
+            'pdf_limit': partner.pdf_limit or 0
         }
     
     def update_user(self, user_id, update_data, updated_by_id):
@@ -459,12 +524,16 @@ class UserService:
         update_data['updated_at'] = datetime.utcnow()
         
         # Update user
-        result = self.users.update_one(
+        before = self.users.find_one_and_update(
             {'_id': ObjectId(user_id)},
-            {'$set': update_data}
+            {'$set': update_data},
+            return_document=ReturnDocument.BEFORE
         )
         
-        if result.modified_count > 0:
+        if before:
+            self.stats_service.record_user_change(before, {**before, **update_data})
+            user_session_cache.invalidate(before['_id'])
+            
             # Log activity
             log_activity(
                 updated_by_id,
@@ -537,7 +606,9 @@ class UserService:
                 coupon_code,
                 plan.price,
                 plan_id,
-                validator_id
+                validator_id,
+                agent_id=agent_id,
+                redeemed_by=assigned_by_id
             )
             
             if success:
@@ -550,6 +621,7 @@ class UserService:
             'plan_id': ObjectId(plan_id),
             'plan_start_date': datetime.utcnow(),
             'plan_expiry_date': plan_expiry,
+            'plan_status': 'ACTIVE',
             'agent_pdf_limit': plan.pdf_limit,
             'agent_pdf_generated': 0,  # Reset PDF count
             'plan_price_paid': final_price,
@@ -566,10 +638,31 @@ class UserService:
             update_data['payment_method'] = payment_data.get('payment_method')
             update_data['payment_reference'] = payment_data.get('payment_reference')
         
-        self.users.update_one(
-            {'_id': ObjectId(agent_id)},
-            {'$set': update_data}
+        # Only while the agent still has no active plan, so concurrent assignments apply once
+        before = self.users.find_one_and_update(
+            {
+                '_id': agent_data['_id'],
+                'role': 'AGENT',
+                '$nor': [{'plan_id': {'$ne': None}, 'plan_expiry_date': {'$gt': datetime.utcnow()}}]
+            },
+            {'$set': update_data, '$unset': {'plan_expired_at': '', 'plan_expiry_notice': ''}},
+            return_document=ReturnDocument.BEFORE
         )
+        if not before:
+            return False, "Agent already has an active plan"
+        
+        self.stats_service.record_user_change(before, {**before, **update_data})
+        
+        # The reset agent count leaves the partner's quota counter too (it is the sum of its agents')
+        previous_pdfs = before.get('agent_pdf_generated') or 0
+        if previous_pdfs and before.get('partner_id'):
+            self.users.update_one(
+                {'_id': before['partner_id'], 'role': 'PARTNER'},
+                [{'$set': {'pdf_generated': {
+                    '$max': [0, {'$subtract': [{'$ifNull': ['$pdf_generated', 0]}, previous_pdfs]}]
+                }}}]
+            )
+        user_session_cache.invalidate(before['_id'], before.get('partner_id'))
         
         # Log activity
         log_activity(
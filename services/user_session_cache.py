@@ -0,0 +1,144 @@
+# services/user_session_cache.py
+# Cached user loader for Flask-Login: in-process LRU+TTL with an optional Redis tier
+
+import logging
+import redis
+from bson import ObjectId, json_util
+from models.connection import mongo_registry
+from models.user import User
+from utils.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+class UserSessionCache:
+    """Resolve the logged-in user without a database read on every request.
+
+    The password hash is never cached (the 'session' projection excludes it);
+    login and change-password read it from the database.
+
+    Entries are keyed by user id and a version stamp. Invalidating a user bumps
+    its version (in Redis when configured, so every worker sees it) and drops
+    the local entry; stale versions simply stop being read. Without Redis each
+    process relies on its own invalidations plus the local TTL.
+    """
+
+    def __init__(self):
+        self.local = TTLCache(maxsize=5000, ttl=60)
+        self.redis_client = None
+        self.redis_ttl = 300
+        self.enabled = True
+        self._uri = None
+        self.redis_hits = 0
+        self.redis_errors = 0
+        self.db_loads = 0
+
+    def init_app(self, app):
+        config = app.config
+        self._uri = config['MONGO_URI']
+        self.enabled = config.get('USER_CACHE_ENABLED', True)
+        self.local.maxsize = config.get('USER_CACHE_MAX_ENTRIES', self.local.maxsize)
+        self.local.ttl = config.get('USER_CACHE_TTL', self.local.ttl)
+        self.redis_ttl = config.get('USER_CACHE_REDIS_TTL', self.redis_ttl)
+
+        if config.get('USER_CACHE_REDIS', False):
+            try:
+                self.redis_client = redis.from_url(config.get('REDIS_URL', 'redis://localhost:6379/0'))
+                self.redis_client.ping()
+            except Exception as e:
+                logger.warning(f"User cache Redis tier disabled: {e}")
+                self.redis_client = None
+
+        app.extensions['user_session_cache'] = self
+
+    def _users(self):
+        return mongo_registry.get_database(self._uri)['users']
+
+    @staticmethod
+    def _version_key(user_id):
+        return f'user_session:ver:{user_id}'
+
+    @staticmethod
+    def _data_key(user_id, version):
+        return f'user_session:{user_id}:{version}'
+
+    def _redis_version(self, user_id):
+        try:
+            return int(self.redis_client.get(self._version_key(user_id)) or 0)
+        except Exception as e:
+            self.redis_errors += 1
+            logger.warning(f"User cache Redis read failed: {e}")
+            return None
+
+    def get(self, user_id):
+        """Return the user document (without password) or None if it does not exist"""
+        user_id = str(user_id)
+        if not self.enabled:
+            return self._load(user_id)
+
+        version = self._redis_version(user_id) if self.redis_client else 0
+        if version is None:
+            # Redis unavailable: fall back to the database, no caching
+            return self._load(user_id)
+
+        cached = self.local.get(user_id)
+        if cached and cached[0] == version:
+            return cached[1]
+
+        if self.redis_client:
+            try:
+                raw = self.redis_client.get(self._data_key(user_id, version))
+            except Exception as e:
+                self.redis_errors += 1
+                logger.warning(f"User cache Redis read failed: {e}")
+                raw = None
+            if raw:
+                self.redis_hits += 1
+                data = json_util.loads(raw)
+                self.local.set(user_id, (version, data))
+                return data
+
+        data = self._load(user_id)
+        if data:
+            self.local.set(user_id, (version, data))
+            if self.redis_client:
+                try:
+                    self.redis_client.setex(self._data_key(user_id, version), self.redis_ttl, json_util.dumps(data))
+                except Exception as e:
+                    self.redis_errors += 1
+                    logger.warning(f"User cache Redis write failed: {e}")
+        return data
+
+    def _load(self, user_id):
+        if not ObjectId.is_valid(user_id):
+            return None
+        self.db_loads += 1
+        return self._users().find_one({'_id': ObjectId(user_id)}, User.projection('session'))
+
+    def invalidate(self, *user_ids):
+        """Drop cached copies of users whose document changed"""
+        for user_id in user_ids:
+            if not user_id:
+                continue
+            user_id = str(user_id)
+            self.local.delete(user_id)
+            if self.redis_client:
+                try:
+                    self.redis_client.incr(self._version_key(user_id))
+                except Exception as e:
+                    self.redis_errors += 1
+                    logger.warning(f"User cache Redis invalidation failed: {e}")
+
+    def stats(self):
+        stats = self.local.stats()
+        stats.update({
+            'enabled': self.enabled,
+            'redis': self.redis_client is not None,
+            'redis_hits': self.redis_hits,
+            'redis_errors': self.redis_errors,
+            'db_loads': self.db_loads
+        })
+        return stats
+
+
+user_session_cache = UserSessionCache()
@@ -51,13 +51,27 @@ def generate_registration_link():
     """Generate unique registration link token"""
     return secrets.token_urlsafe(32)
 
-def log_activity(user_id, activity_type, description, metadata=None):
-    """Log user activity"""
+def log_activity(user_id, activity_type, description, metadata=None, actor=None):
+    """Log user activity (buffered by the activity writer when it is running).
+
+    Pass the acting user's document or User as `actor` when it is at hand
+    and is not the logged-in user, so the username and partner are not
+    looked up again.
+    """
     from models import get_activities_collection
+    from services.activity_writer import activity_writer
+    from services.activity_service import activity_actor
     from bson import ObjectId
     
+    user_id = ObjectId(user_id) if isinstance(user_id, str) else user_id
+    username, partner_id = activity_actor(user_id, actor)
+    if not partner_id and metadata and metadata.get('partner_id'):
+        # e.g. a super admin acting on a partner's records
+        partner_id = ObjectId(metadata['partner_id']) if ObjectId.is_valid(str(metadata['partner_id'])) else None
+    
     activity = {
-        'user_id': ObjectId(user_id) if isinstance(user_id, str) else user_id,
+        'user_id': user_id,
+        'username': username,
         'activity_type': activity_type,
         'description': description,
         'metadata': metadata or {},
@@ -65,8 +79,12 @@ def log_activity(user_id, activity_type, description, metadata=None):
         'user_agent': None,  # Can be enhanced to capture user agent
         'created_at': datetime.utcnow()
     }
+    # Left out rather than null so the sparse partner_created_at index only holds partner activity
+    if partner_id:
+        activity['partner_id'] = partner_id
     
-    get_activities_collection().insert_one(activity)
+    if not activity_writer.enqueue(activity):
+        get_activities_collection().insert_one(activity)
 
 def format_datetime(dt):
     """Format datetime for display"""
@@ -80,40 +98,24 @@ def format_date(dt):
         return ''
     return dt.strftime('%Y-%m-%d')
 
-def paginate_query(collection, query, page, per_page):
-    """Paginate MongoDB query results"""
-    total = collection.count_documents(query)
-    skip = (page - 1) * per_page
-    items = list(collection.find(query).skip(skip).limit(per_page))
+def paginate_query(collection, query, page, per_page, cursor=None, exact_total=False):
+    """Paginate MongoDB query results (newest first, cursor-aware)"""
+    from utils.pagination import keyset_paginate
     
-    return {
-        'items': items,
-        'total': total,
-        'page': page,
-        'per_page': per_page,
-        'total_pages': (total + per_page - 1) // per_page
-    }
+    return keyset_paginate(collection, query, page, per_page, cursor, exact_total=exact_total)
 
 def check_partner_pdf_limit(partner_id):
-    """Check if partner has reached PDF limit"""
-    from models import get_users_collection
-    from bson import ObjectId
-    
-    users = get_users_collection()
+    """Check if partner has reached PDF limit (reads the partner's maintained counter)"""
+    from services.quota_service import PdfQuotaService
     
-    # Get partner data
-    partner = users.find_one({'_id': ObjectId(partner_id), 'role': 'PARTNER'})
-    if not partner:
+    quota = PdfQuotaService().get_partner_quota(partner_id)
+    if not quota:
         return False, "Partner not found"
     
-    # Calculate total PDFs generated by partner's agents
-    agents = users.find({'partner_id': ObjectId(partner_id), 'role': 'AGENT'})
-    total_pdfs = sum(agent.get('agent_pdf_generated', 0) for agent in agents)
-    
-    if total_pdfs >= partner.get('pdf_limit', 0):
+    if quota['remaining'] <= 0:
         return False, "Partner PDF limit reached"
     
-    return True, partner.get('pdf_limit', 0) - total_pdfs
+    return True, quota['remaining']
 # utils/helpers.py - Add these functions after the existing helper functions
 
 def allowed_payment_file(filename):
@@ -0,0 +1,98 @@
+# utils/pagination.py
+# Keyset (cursor) pagination on (created_at, _id) with a bounded page-number fallback
+
+import base64
+import json
+from datetime import datetime
+from bson import ObjectId
+from bson.errors import InvalidId
+from flask import current_app
+from models.count_cache import count_cache
+
+# Every paginated listing is ordered newest first; _id breaks created_at ties
+SORT_ORDER = [('created_at', -1), ('_id', -1)]
+
+DEFAULT_MAX_SKIP = 5000
+
+
+def encode_cursor(doc):
+    """Opaque token pointing just past the given document"""
+    created_at = doc.get('created_at')
+    payload = {
+        't': created_at.isoformat() if isinstance(created_at, datetime) else None,
+        'i': str(doc['_id'])
+    }
+    raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token):
+    """Decode a cursor token into (created_at, _id), or None if it is malformed"""
+    if not token:
+        return None
+
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        payload = json.loads(raw)
+        created_at = datetime.fromisoformat(payload['t']) if payload.get('t') else None
+        return created_at, ObjectId(payload['i'])
+    except (ValueError, TypeError, KeyError, InvalidId):
+        return None
+
+
+def _after(created_at, last_id):
+    """Filter for documents sorted after (created_at, _id) in SORT_ORDER"""
+    if created_at is None:
+        # Documents without created_at sort last; only _id orders them
+        return {'created_at': None, '_id': {'$lt': last_id}}
+
+    return {'$or': [
+        {'created_at': {'$lt': created_at}},
+        {'created_at': created_at, '_id': {'$lt': last_id}},
+        {'created_at': None}
+    ]}
+
+
+def _max_skip():
+    try:
+        return current_app.config.get('PAGINATION_MAX_SKIP', DEFAULT_MAX_SKIP)
+    except RuntimeError:
+        return DEFAULT_MAX_SKIP
+
+
+def keyset_paginate(collection, query, page=1, per_page=10, cursor=None, projection=None, exact_total=False):
+    """Paginate a query newest-first.
+
+    With a valid cursor the page is read with a range filter on the
+    (created_at, _id) index, so its cost does not depend on depth. Without
+    one, page numbers fall back to skip(), clamped to PAGINATION_MAX_SKIP.
+    The total comes from the count cache unless exact_total is set.
+    Returns items, total, page, per_page, total_pages and next_cursor.
+    """
+    query = query or {}
+    page = max(page or 1, 1)
+    total = count_cache.count(collection, query, exact=exact_total)
+
+    position = decode_cursor(cursor)
+    if position:
+        find_query = {'$and': [query, _after(*position)]} if query else _after(*position)
+        documents = collection.find(find_query, projection).sort(SORT_ORDER).limit(per_page + 1)
+    else:
+        max_page = _max_skip() // per_page + 1
+        page = min(page, max_page)
+        documents = collection.find(query, projection).sort(SORT_ORDER).skip((page - 1) * per_page).limit(per_page + 1)
+
+    items = list(documents)
+    next_cursor = None
+    if len(items) > per_page:
+        items = items[:per_page]
+        next_cursor = encode_cursor(items[-1])
+
+    return {
+        'items': items,
+        'total': total,
+        'page': page,
+        'per_page': per_page,
+        'total_pages': (total + per_page - 1) // per_page,
+        'next_cursor': next_cursor
+    }
@@ -0,0 +1,99 @@
+# utils/passwords.py
+# bcrypt hashing and verification, run off the eventlet hub in a bounded native thread pool
+
+import os
+import time
+import bcrypt
+
+# bcrypt's own default cost; BCRYPT_ROUNDS overrides it (see 'manage.py calibrate-bcrypt')
+DEFAULT_ROUNDS = 12
+MIN_ROUNDS = 4
+MAX_ROUNDS = 31
+
+# Set by init_app; scripts that never call it hash inline at the default cost
+_offload = False
+_rounds = DEFAULT_ROUNDS
+
+
+def init_app(app):
+    """Enable thread-pool offload for the web process.
+
+    bcrypt releases the GIL, so a small pool of native threads hashes in
+    parallel while the hub keeps serving other greenlets.
+    """
+    global _offload, _rounds
+    _rounds = app.config.get('BCRYPT_ROUNDS') or DEFAULT_ROUNDS
+    _offload = app.config.get('PASSWORD_HASH_OFFLOAD', True)
+    if _offload:
+        from eventlet import tpool
+        # Takes effect when the pool starts (on its first use)
+        tpool.set_num_threads(app.config.get('PASSWORD_HASH_THREADS') or os.cpu_count() or 4)
+
+
+def _run(func, *args):
+    if _offload:
+        from eventlet import tpool
+        return tpool.execute(func, *args)
+    return func(*args)
+
+
+def hash_password(password, rounds=None):
+    """bcrypt hash of a password (bytes) at the configured cost"""
+    return _run(_hash, password.encode('utf-8'), rounds or _rounds)
+
+
+def verify_password(password, hashed):
+    """Check a password against a bcrypt hash"""
+    if not hashed:
+        return False
+    if isinstance(hashed, str):
+        hashed = hashed.encode('utf-8')
+    return _run(bcrypt.checkpw, password.encode('utf-8'), hashed)
+
+
+def _hash(password_bytes, rounds):
+    return bcrypt.hashpw(password_bytes, bcrypt.gensalt(rounds))
+
+
+def hash_rounds(hashed):
+    """Cost factor stored in a bcrypt hash ($2b$<cost>$...), or None if unreadable"""
+    if isinstance(hashed, bytes):
+        hashed = hashed.decode('utf-8', 'replace')
+    parts = (hashed or '').split('$')
+    try:
+        return int(parts[2])
+    except (IndexError, ValueError):
+        return None
+
+
+def needs_rehash(hashed):
+    """True when a stored hash was made with a different cost than the configured one"""
+    return hash_rounds(hashed) != _rounds
+
+
+def calibrate(target_ms, min_rounds=10, max_rounds=16, samples=3):
+    """Pick the highest cost whose hash time stays within target_ms on this host.
+
+    Returns (rounds, timings) where timings maps each measured cost to its
+    median hash time in milliseconds. Each extra round doubles the work, so
+    measuring stops at the first cost over the target.
+    """
+    min_rounds = max(min_rounds, MIN_ROUNDS)
+    max_rounds = min(max_rounds, MAX_ROUNDS)
+    password = b'calibration-password'
+    timings = {}
+    chosen = min_rounds
+
+    for rounds in range(min_rounds, max_rounds + 1):
+        durations = []
+        for _ in range(samples):
+            started = time.perf_counter()
+            bcrypt.hashpw(password, bcrypt.gensalt(rounds))
+            durations.append((time.perf_counter() - started) * 1000)
+        timings[rounds] = sorted(durations)[len(durations) // 2]
+
+        if timings[rounds] > target_ms:
+            break
+        chosen = rounds
+
+    return chosen, timings
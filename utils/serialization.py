@@ -0,0 +1,110 @@
+# utils/serialization.py
+# Shared JSON encoding for API responses: orjson when installed, stdlib json otherwise.
+# ObjectId, datetime and models (via their JSON_VIEWS field specs) are encoded natively.
+
+import json
+from collections.abc import Mapping
+from datetime import date, datetime
+from operator import attrgetter
+from bson import ObjectId
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+# Returned by a JSON_VIEWS getter to leave the key out of the output
+OMIT = object()
+
+_compiled_views = {}
+
+
+def _compile(cls, view):
+    """(key, getter) pairs for a model view; plain names read the attribute of the same name"""
+    compiled = []
+    for entry in cls.JSON_VIEWS[view]:
+        if isinstance(entry, str):
+            compiled.append((entry, attrgetter(entry)))
+        else:
+            compiled.append(entry)
+    return tuple(compiled)
+
+
+def _view(cls, view):
+    spec = _compiled_views.get((cls, view))
+    if spec is None:
+        spec = _compiled_views[(cls, view)] = _compile(cls, view)
+    return spec
+
+
+def serialize(obj, view='default'):
+    """A model (or a page of models of one class) as dicts of JSON-ready values for the named view"""
+    if isinstance(obj, (list, tuple)):
+        if not obj:
+            return []
+        spec = _view(type(obj[0]), view)
+        return [
+            {key: value for key, getter in spec if (value := getter(item)) is not OMIT}
+            for item in obj
+        ]
+
+    spec = _view(type(obj), view)
+    return {key: value for key, getter in spec if (value := getter(obj)) is not OMIT}
+
+
+def _default(obj):
+    """Encode the types neither encoder knows about"""
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if hasattr(type(obj), 'JSON_VIEWS'):
+        return serialize(obj)
+    if isinstance(obj, Mapping):
+        # RawBSONDocument and other non-dict mappings
+        return dict(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+    def dumps(obj):
+        """Encode to UTF-8 JSON bytes"""
+        return orjson.dumps(obj, default=_default, option=_ORJSON_OPTIONS)
+
+    loads = orjson.loads
+else:
+    def dumps(obj):
+        """Encode to UTF-8 JSON bytes"""
+        return json.dumps(obj, default=_default, separators=(',', ':')).encode('utf-8')
+
+    loads = json.loads
+
+
+class JSONProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by dumps() so jsonify() and tojson share the fast path"""
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            # Callers asking for stdlib options (indent, sort_keys, ...) get stdlib json
+            kwargs.setdefault('default', _default)
+            return json.dumps(obj, **kwargs)
+        return dumps(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return json.loads(s, **kwargs)
+        return loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps(obj), mimetype=self.mimetype)
+
+
+def init_app(app):
+    """Install the JSON provider on the app"""
+    app.json = JSONProvider(app)